@@ -19,6 +19,7 @@ progress_lock = threading.Lock()
 
 import json
 import os
+import hashlib
 
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
@@ -30,11 +31,14 @@ from typing import List, Dict, Any, Optional, Union
 from minirag import MiniRAG, QueryParam
 from minirag.api import __api_version__
 
-from minirag.utils import EmbeddingFunc
+from minirag.utils import EmbeddingFunc, clean_text, compute_mdhash_id
 from enum import Enum
 from pathlib import Path
 import shutil
+import tempfile
+import asyncio
 import aiofiles
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from ascii_colors import trace_exception, ASCIIColors
 import sys
 import configparser
@@ -225,6 +229,10 @@ def display_splash_screen(args: argparse.Namespace) -> None:
     ASCIIColors.yellow(f"{args.max_async}")
     ASCIIColors.white("    ├─ Max Tokens: ", end="")
     ASCIIColors.yellow(f"{args.max_tokens}")
+    ASCIIColors.white("    ├─ Parse Workers: ", end="")
+    ASCIIColors.yellow(f"{args.parse_workers}")
+    ASCIIColors.white("    ├─ Max Insert Chars: ", end="")
+    ASCIIColors.yellow(f"{args.max_insert_chars}")
     ASCIIColors.white("    ├─ Max Embed Tokens: ", end="")
     ASCIIColors.yellow(f"{args.max_embed_tokens}")
     ASCIIColors.white("    ├─ Chunk Size: ", end="")
@@ -453,6 +461,18 @@ def parse_args() -> argparse.Namespace:
         default=get_env_value("MAX_TOKENS", 32768, int),
         help="Maximum token size (default: from env or 32768)",
     )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=get_env_value("PARSE_WORKERS", 4, int),
+        help="Number of workers used to extract text from uploaded/scanned files (default: from env or 4)",
+    )
+    parser.add_argument(
+        "--max-insert-chars",
+        type=int,
+        default=get_env_value("MAX_INSERT_CHARS", 4_000_000, int),
+        help="Parsed text collected before each insert when indexing many files (default: from env or 4000000)",
+    )
     parser.add_argument(
         "--embedding-dim",
         type=int,
@@ -543,28 +563,114 @@ def parse_args() -> argparse.Namespace:
 
 
 class DocumentManager:
-    """Handles document operations and tracking"""
+    """Handles document operations and tracking
+
+    Indexed files are recorded in a manifest of (size, mtime, content hash,
+    doc id) keyed by their path relative to input_dir. When manifest_file is
+    given the manifest survives restarts, so a scan only has to parse files
+    that were added or changed since the last run.
+    """
 
     def __init__(
         self,
         input_dir: str,
         supported_extensions: tuple = (".txt", ".md", ".pdf", ".docx", ".pptx"),
+        manifest_file: Optional[str] = None,
     ):
         self.input_dir = Path(input_dir)
         self.supported_extensions = supported_extensions
-        self.indexed_files = set()
+        self.manifest_file = Path(manifest_file) if manifest_file else None
+        self.manifest: Dict[str, dict] = self._load_manifest()
+        self.indexed_files = {self.input_dir / key for key in self.manifest}
 
         # Create input directory if it doesn't exist
         self.input_dir.mkdir(parents=True, exist_ok=True)
 
+    def _load_manifest(self) -> Dict[str, dict]:
+        if self.manifest_file is None or not self.manifest_file.exists():
+            return {}
+        try:
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable manifest {self.manifest_file}: {e}")
+            return {}
+
+    def save_manifest(self):
+        """Atomically write the manifest to disk"""
+        if self.manifest_file is None:
+            return
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.manifest_file)
+
+    def manifest_key(self, file_path: Union[str, Path]) -> str:
+        file_path = Path(file_path)
+        try:
+            return file_path.resolve().relative_to(self.input_dir.resolve()).as_posix()
+        except ValueError:
+            return str(file_path)
+
+    @staticmethod
+    def file_hash(file_path: Union[str, Path], block_size: int = 1 << 20) -> str:
+        h = hashlib.md5()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    def fingerprint(self, file_path: Union[str, Path]) -> dict:
+        """Size, mtime and content hash of a file, as stored in the manifest"""
+        st = os.stat(file_path)
+        return {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "hash": self.file_hash(file_path),
+        }
+
+    def scan_for_changes(self) -> tuple[List[Path], List[str]]:
+        """Compare input_dir with the manifest
+
+        Files whose size and mtime match the manifest are skipped without
+        being read; a file with a new mtime but the same size is only hashed.
+
+        Returns:
+            New or modified files, and manifest keys of files that were deleted
+        """
+        changed = []
+        seen = set()
+        touched = False
+        for root, _, filenames in os.walk(self.input_dir):
+            for filename in filenames:
+                if not self.is_supported_file(filename):
+                    continue
+                file_path = Path(root) / filename
+                key = self.manifest_key(file_path)
+                seen.add(key)
+                entry = self.manifest.get(key)
+                if entry is None:
+                    changed.append(file_path)
+                    continue
+                st = file_path.stat()
+                if st.st_size != entry["size"]:
+                    changed.append(file_path)
+                elif st.st_mtime_ns != entry["mtime_ns"]:
+                    if self.file_hash(file_path) == entry["hash"]:
+                        # only touched, remember the new mtime
+                        entry["mtime_ns"] = st.st_mtime_ns
+                        touched = True
+                    else:
+                        changed.append(file_path)
+        if touched:
+            self.save_manifest()
+        deleted = [key for key in self.manifest if key not in seen]
+        return changed, deleted
+
     def scan_directory_for_new_files(self) -> List[Path]:
-        """Scan input directory for new files"""
-        new_files = []
-        for ext in self.supported_extensions:
-            for file_path in self.input_dir.rglob(f"*{ext}"):
-                if file_path not in self.indexed_files:
-                    new_files.append(file_path)
-        return new_files
+        """Scan input directory for new or modified files"""
+        return self.scan_for_changes()[0]
 
     def scan_directory(self) -> List[Path]:
         """Scan input directory for new files"""
@@ -574,15 +680,98 @@ class DocumentManager:
                 new_files.append(file_path)
         return new_files
 
-    def mark_as_indexed(self, file_path: Path):
-        """Mark a file as indexed"""
+    def mark_as_indexed(
+        self,
+        file_path: Path,
+        fingerprint: Optional[dict] = None,
+        doc_id: Optional[str] = None,
+    ):
+        """Mark a file as indexed, recording it in the manifest if fingerprinted"""
         self.indexed_files.add(file_path)
+        if fingerprint is not None:
+            self.manifest[self.manifest_key(file_path)] = {
+                **fingerprint,
+                "doc_id": doc_id,
+            }
+
+    def forget(self, key: str) -> Optional[dict]:
+        """Drop a file from the manifest and return its entry"""
+        self.indexed_files.discard(self.input_dir / key)
+        return self.manifest.pop(key, None)
+
+    def is_doc_referenced(self, doc_id: str, except_key: Optional[str] = None) -> bool:
+        """Whether another file in the manifest produced the same document"""
+        return any(
+            entry.get("doc_id") == doc_id
+            for key, entry in self.manifest.items()
+            if key != except_key
+        )
 
     def is_supported_file(self, filename: str) -> bool:
         """Check if file type is supported"""
         return any(filename.lower().endswith(ext) for ext in self.supported_extensions)
 
 
+# PDF parsing is pure Python and CPU bound, so it runs in worker processes;
+# the other formats are parsed in threads. PDFs are extracted this many pages per worker call, so neither a worker nor
+# the pipe back to the server holds more than one window of text
+PDF_PAGE_WINDOW = 32
+
+
+def extract_pdf_pages(path: str, start: int, stop: int) -> tuple[List[str], int]:
+    """Extract the text of pages [start, stop) of a PDF.
+
+    Kept at module level so it can be sent to a process pool worker.
+
+    Returns:
+        The text of each page and the page count of the document
+    """
+    if not pm.is_installed("pypdf2"):
+        pm.install("pypdf2")
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    pages = reader.pages
+    return [
+        pages[i].extract_text() + "\n" for i in range(start, min(stop, len(pages)))
+    ], len(pages)
+
+
+def extract_text(ext: str, path: str) -> str:
+    """Extract the text of a DOCX or PPTX document.
+
+    These formats are zipped XML that their libraries load whole, so they
+    are extracted in one call.
+
+    Raises:
+        ValueError: If file format is not supported
+    """
+    match ext:
+        case ".docx":
+            if not pm.is_installed("python-docx"):
+                pm.install("python-docx")
+            from docx import Document
+
+            doc = Document(path)
+            return "\n".join(paragraph.text for paragraph in doc.paragraphs)
+
+        case ".pptx":
+            if not pm.is_installed("pptx"):
+                pm.install("pptx")
+            from pptx import Presentation  # type: ignore
+
+            prs = Presentation(path)
+            return "".join(
+                shape.text + "\n"
+                for slide in prs.slides
+                for shape in slide.shapes
+                if hasattr(shape, "text")
+            )
+
+        case _:
+            raise ValueError(f"Unsupported file format: {ext}")
+
+
 # Pydantic models
 class SearchMode(str, Enum):
     light = "light"
@@ -747,7 +936,14 @@ def create_app(args):
     api_key = os.getenv("LIGHTRAG_API_KEY") or args.key
 
     # Initialize document manager
-    doc_manager = DocumentManager(args.input_dir)
+    doc_manager = DocumentManager(
+        args.input_dir,
+        manifest_file=os.path.join(args.working_dir, "input_manifest.json"),
+    )
+
+    # Worker pools for text extraction, so parsing never blocks the event loop
+    parse_thread_pool = ThreadPoolExecutor(max_workers=args.parse_workers)
+    parse_process_pool = ProcessPoolExecutor(max_workers=args.parse_workers)
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
@@ -755,22 +951,27 @@ def create_app(args):
         # Startup logic
         if args.auto_scan_at_startup:
             try:
-                new_files = doc_manager.scan_directory_for_new_files()
-                for file_path in new_files:
-                    try:
-                        await index_file(file_path)
-                    except Exception as e:
-                        trace_exception(e)
-                        logging.error(f"Error indexing file {file_path}: {str(e)}")
+                new_files, deleted = await asyncio.to_thread(
+                    doc_manager.scan_for_changes
+                )
+                deleted = await retract_files(deleted)
+                indexed, failed = await index_files(new_files)
+                for file_path, error in failed:
+                    logging.error(
+                        f"Error indexing file {file_path}: {error or 'no content extracted'}"
+                    )
 
                 ASCIIColors.info(
-                    f"Indexed {len(new_files)} documents from {args.input_dir}"
+                    f"Indexed {len(indexed)} documents from {args.input_dir}"
+                    + (f", retracted {len(deleted)} deleted files" if deleted else "")
                 )
             except Exception as e:
+                trace_exception(e)
                 logging.error(f"Error during startup indexing: {str(e)}")
         yield
-        # Cleanup logic (if needed)
-        pass
+        # Cleanup logic
+        parse_thread_pool.shutdown(wait=False, cancel_futures=True)
+        parse_process_pool.shutdown(wait=False, cancel_futures=True)
 
     # Initialize FastAPI
     app = FastAPI(
@@ -933,8 +1134,200 @@ def create_app(args):
             },
         )
 
+    async def parse_document(ext: str, path: Union[str, Path]) -> str:
+        """Extract text in a worker pool (processes for PDF, threads otherwise)
+
+        PDF pages are requested one window at a time, and the text is joined
+        once at the end.
+
+        Args:
+            ext: Lower-case file extension, including the dot
+            path: Path of the file
+
+        Raises:
+            ValueError: If file format is not supported
+        """
+        if not doc_manager.is_supported_file(ext):
+            raise ValueError(f"Unsupported file format: {ext}")
+        path = str(path)
+        loop = asyncio.get_running_loop()
+        if ext in (".txt", ".md"):
+            async with aiofiles.open(path, "r", encoding="utf-8") as f:
+                return await f.read()
+        if ext != ".pdf":
+            return await loop.run_in_executor(parse_thread_pool, extract_text, ext, path)
+        pages, page_count = [], None
+        while page_count is None or len(pages) < page_count:
+            window, page_count = await loop.run_in_executor(
+                parse_process_pool,
+                extract_pdf_pages,
+                path,
+                len(pages),
+                len(pages) + PDF_PAGE_WINDOW,
+            )
+            pages.extend(window)
+        return "".join(pages)
+
+    async def parse_upload(file: UploadFile, ext: str) -> str:
+        """Copy an upload to a temporary file in chunks and parse it from disk"""
+        fd, tmp_path = tempfile.mkstemp(suffix=ext)
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                while chunk := await file.read(1 << 20):
+                    await asyncio.to_thread(tmp_file.write, chunk)
+            return await parse_document(ext, tmp_path)
+        finally:
+            os.remove(tmp_path)
+
+    async def parse_in_batches(items: list, parse, insert_batch) -> list:
+        """Parse items in the worker pools and insert their text in batches
+
+        At most twice the number of parse workers are parsed at a time, and
+        insert_batch is awaited each time the parsed text reaches
+        max_insert_chars, so memory stays bounded however many items there are.
+
+        Args:
+            items: What to parse, passed to parse one at a time
+            parse: Coroutine function returning (metadata, text) for an item
+            insert_batch: Coroutine function called with a list of
+                (item, metadata, text)
+
+        Returns:
+            A list of (item, error) for the items that failed; error is None
+            when no content could be extracted
+        """
+        pending = iter(items)
+        running: Dict[asyncio.Task, Any] = {}
+        batch, batch_chars, failed = [], 0, []
+
+        def _fill():
+            for item in pending:
+                running[asyncio.create_task(parse(item))] = item
+                if len(running) >= 2 * args.parse_workers:
+                    break
+
+        try:
+            _fill()
+            while running:
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    item = running.pop(task)
+                    try:
+                        metadata, text = task.result()
+                    except Exception as e:
+                        failed.append((item, e))
+                        continue
+                    if not text:
+                        failed.append((item, None))
+                        continue
+                    batch.append((item, metadata, text))
+                    batch_chars += len(text)
+                if batch_chars >= args.max_insert_chars:
+                    await insert_batch(batch)
+                    batch, batch_chars = [], 0
+                _fill()
+            if batch:
+                await insert_batch(batch)
+        finally:
+            for task in running:
+                task.cancel()
+        return failed
+
+    async def retract_files(keys: List[str]) -> List[str]:
+        """Remove files from the manifest and their documents from RAG
+
+        A file whose document could not be deleted stays in the manifest, so
+        the next scan retries it.
+
+        Returns:
+            The keys that were retracted
+        """
+        retracted = []
+        for key in keys:
+            entry = doc_manager.manifest.get(key)
+            doc_id = entry.get("doc_id") if entry else None
+            if doc_id and not doc_manager.is_doc_referenced(doc_id, except_key=key):
+                try:
+                    await rag.adelete_by_doc_id(doc_id)
+                    logging.info(f"Retracted file: {key}")
+                except Exception as e:
+                    logging.error(f"Error retracting file {key}: {str(e)}")
+                    continue
+            doc_manager.forget(key)
+            retracted.append(key)
+        if retracted:
+            doc_manager.save_manifest()
+        return retracted
+
+    async def index_files(
+        file_paths: List[Union[str, Path]], on_parsed=None
+    ) -> tuple[List[Path], List[tuple[Path, Optional[Exception]]]]:
+        """Parse files concurrently and insert them in batches of ainsert calls
+
+        Modified files have their previous version retracted first, and every
+        indexed file is recorded in the manifest.
+
+        Args:
+            file_paths: Paths of the files to be indexed
+            on_parsed: Optional callback called with each path once it is parsed
+
+        Returns:
+            The indexed paths and a list of (path, error) for files that failed;
+            error is None when no content could be extracted
+        """
+        indexed, failed = [], []
+
+        async def _parse(file_path: Path) -> tuple[dict, str]:
+            try:
+                if not file_path.exists():
+                    raise FileNotFoundError(f"File not found: {file_path}")
+                fingerprint = await asyncio.to_thread(
+                    doc_manager.fingerprint, file_path
+                )
+                content = await parse_document(file_path.suffix.lower(), file_path)
+                return fingerprint, content
+            finally:
+                if on_parsed is not None:
+                    on_parsed(file_path)
+
+        async def _insert(batch: List[tuple[Path, dict, str]]):
+            # Retract the previous version of modified files before inserting them,
+            # a file whose old version is still indexed is not inserted again
+            kept = []
+            for file_path, fingerprint, content in batch:
+                key = doc_manager.manifest_key(file_path)
+                if key in doc_manager.manifest and not await retract_files([key]):
+                    failed.append(
+                        (file_path, RuntimeError("previous version could not be retracted"))
+                    )
+                    continue
+                kept.append((file_path, fingerprint, content))
+            if not kept:
+                return
+
+            await rag.ainsert([content for _, _, content in kept])
+            for file_path, fingerprint, content in kept:
+                doc_manager.mark_as_indexed(
+                    file_path,
+                    fingerprint,
+                    compute_mdhash_id(clean_text(content), prefix="doc-"),
+                )
+                indexed.append(file_path)
+                logging.info(f"Successfully indexed file: {file_path}")
+            doc_manager.save_manifest()
+
+        for file_path, error in await parse_in_batches(
+            [Path(file_path) for file_path in file_paths], _parse, _insert
+        ):
+            if error is None:
+                logging.warning(f"No content extracted from file: {file_path}")
+            failed.append((file_path, error))
+        return indexed, failed
+
     async def index_file(file_path: Union[str, Path]) -> None:
-        """Index all files inside the folder with support for multiple file formats
+        """Index a single file with support for multiple file formats
 
         Args:
             file_path: Path to the file to be indexed (str or Path object)
@@ -943,69 +1336,9 @@ def create_app(args):
             ValueError: If file format is not supported
             FileNotFoundError: If file doesn't exist
         """
-        if not pm.is_installed("aiofiles"):
-            pm.install("aiofiles")
-
-        # Convert to Path object if string
-        file_path = Path(file_path)
-
-        # Check if file exists
-        if not file_path.exists():
-            raise FileNotFoundError(f"File not found: {file_path}")
-
-        content = ""
-        # Get file extension in lowercase
-        ext = file_path.suffix.lower()
-
-        match ext:
-            case ".txt" | ".md":
-                # Text files handling
-                async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-                    content = await f.read()
-
-            case ".pdf":
-                if not pm.is_installed("pypdf2"):
-                    pm.install("pypdf2")
-                from PyPDF2 import PdfReader
-
-                # PDF handling
-                reader = PdfReader(str(file_path))
-                content = ""
-                for page in reader.pages:
-                    content += page.extract_text() + "\n"
-
-            case ".docx":
-                if not pm.is_installed("python-docx"):
-                    pm.install("python-docx")
-                from docx import Document
-
-                # Word document handling
-                doc = Document(file_path)
-                content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-
-            case ".pptx":
-                if not pm.is_installed("pptx"):
-                    pm.install("pptx")
-                from pptx import Presentation  # type: ignore
-
-                # PowerPoint handling
-                prs = Presentation(file_path)
-                content = ""
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text"):
-                            content += shape.text + "\n"
-
-            case _:
-                raise ValueError(f"Unsupported file format: {ext}")
-
-        # Insert content into RAG system
-        if content:
-            await rag.ainsert(content)
-            doc_manager.mark_as_indexed(file_path)
-            logging.info(f"Successfully indexed file: {file_path}")
-        else:
-            logging.warning(f"No content extracted from file: {file_path}")
+        _, failed = await index_files([file_path])
+        if failed and failed[0][1] is not None:
+            raise failed[0][1]
 
     @app.post("/documents/scan", dependencies=[Depends(optional_api_key)])
     async def scan_for_new_documents():
@@ -1021,29 +1354,33 @@ def create_app(args):
                 scan_progress["indexed_count"] = 0
                 scan_progress["progress"] = 0
 
-            new_files = doc_manager.scan_directory_for_new_files()
+            new_files, deleted = await asyncio.to_thread(doc_manager.scan_for_changes)
+            deleted = await retract_files(deleted)
             scan_progress["total_files"] = len(new_files)
+            parsed_count = 0
+
+            def on_parsed(file_path: Path):
+                nonlocal parsed_count
+                parsed_count += 1
+                with progress_lock:
+                    scan_progress["current_file"] = os.path.basename(file_path)
+                    scan_progress["progress"] = (
+                        parsed_count / scan_progress["total_files"]
+                    ) * 100
+
+            indexed, failed = await index_files(new_files, on_parsed=on_parsed)
+            for file_path, error in failed:
+                logging.error(
+                    f"Error indexing file {file_path}: {error or 'no content extracted'}"
+                )
 
-            for file_path in new_files:
-                try:
-                    with progress_lock:
-                        scan_progress["current_file"] = os.path.basename(file_path)
-
-                    await index_file(file_path)
-
-                    with progress_lock:
-                        scan_progress["indexed_count"] += 1
-                        scan_progress["progress"] = (
-                            scan_progress["indexed_count"]
-                            / scan_progress["total_files"]
-                        ) * 100
-
-                except Exception as e:
-                    logging.error(f"Error indexing file {file_path}: {str(e)}")
+            with progress_lock:
+                scan_progress["indexed_count"] = len(indexed)
 
             return {
                 "status": "success",
                 "indexed_count": scan_progress["indexed_count"],
+                "retracted_count": len(deleted),
                 "total_documents": len(doc_manager.indexed_files),
             }
         except Exception as e:
@@ -1258,65 +1595,15 @@ def create_app(args):
             HTTPException: For unsupported file types or processing errors
         """
         try:
-            content = ""
             # Get file extension in lowercase
             ext = Path(file.filename).suffix.lower()
+            if not doc_manager.is_supported_file(ext):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unsupported file type. Supported types: {doc_manager.supported_extensions}",
+                )
 
-            match ext:
-                case ".txt" | ".md":
-                    # Text files handling
-                    text_content = await file.read()
-                    content = text_content.decode("utf-8")
-
-                case ".pdf":
-                    if not pm.is_installed("pypdf2"):
-                        pm.install("pypdf2")
-                    from PyPDF2 import PdfReader
-                    from io import BytesIO
-
-                    # Read PDF from memory
-                    pdf_content = await file.read()
-                    pdf_file = BytesIO(pdf_content)
-                    reader = PdfReader(pdf_file)
-                    content = ""
-                    for page in reader.pages:
-                        content += page.extract_text() + "\n"
-
-                case ".docx":
-                    if not pm.is_installed("python-docx"):
-                        pm.install("python-docx")
-                    from docx import Document
-                    from io import BytesIO
-
-                    # Read DOCX from memory
-                    docx_content = await file.read()
-                    docx_file = BytesIO(docx_content)
-                    doc = Document(docx_file)
-                    content = "\n".join(
-                        [paragraph.text for paragraph in doc.paragraphs]
-                    )
-
-                case ".pptx":
-                    if not pm.is_installed("pptx"):
-                        pm.install("pptx")
-                    from pptx import Presentation  # type: ignore
-                    from io import BytesIO
-
-                    # Read PPTX from memory
-                    pptx_content = await file.read()
-                    pptx_file = BytesIO(pptx_content)
-                    prs = Presentation(pptx_file)
-                    content = ""
-                    for slide in prs.slides:
-                        for shape in slide.shapes:
-                            if hasattr(shape, "text"):
-                                content += shape.text + "\n"
-
-                case _:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Unsupported file type. Supported types: {doc_manager.supported_extensions}",
-                    )
+            content = await parse_upload(file, ext)
 
             # Insert content into RAG system
             if content:
@@ -1362,74 +1649,32 @@ def create_app(args):
             HTTPException: For processing errors
         """
         try:
-            inserted_count = 0
             failed_files = []
+            inserted_count = 0
 
-            for file in files:
-                try:
-                    content = ""
-                    ext = Path(file.filename).suffix.lower()
-
-                    match ext:
-                        case ".txt" | ".md":
-                            text_content = await file.read()
-                            content = text_content.decode("utf-8")
-
-                        case ".pdf":
-                            if not pm.is_installed("pypdf2"):
-                                pm.install("pypdf2")
-                            from PyPDF2 import PdfReader
-                            from io import BytesIO
-
-                            pdf_content = await file.read()
-                            pdf_file = BytesIO(pdf_content)
-                            reader = PdfReader(pdf_file)
-                            for page in reader.pages:
-                                content += page.extract_text() + "\n"
-
-                        case ".docx":
-                            if not pm.is_installed("docx"):
-                                pm.install("docx")
-                            from docx import Document
-                            from io import BytesIO
-
-                            docx_content = await file.read()
-                            docx_file = BytesIO(docx_content)
-                            doc = Document(docx_file)
-                            content = "\n".join(
-                                [paragraph.text for paragraph in doc.paragraphs]
-                            )
-
-                        case ".pptx":
-                            if not pm.is_installed("pptx"):
-                                pm.install("pptx")
-                            from pptx import Presentation  # type: ignore
-                            from io import BytesIO
-
-                            pptx_content = await file.read()
-                            pptx_file = BytesIO(pptx_content)
-                            prs = Presentation(pptx_file)
-                            for slide in prs.slides:
-                                for shape in slide.shapes:
-                                    if hasattr(shape, "text"):
-                                        content += shape.text + "\n"
-
-                        case _:
-                            failed_files.append(f"{file.filename} (unsupported type)")
-                            continue
-
-                    if content:
-                        await rag.ainsert(content)
-                        inserted_count += 1
-                        logging.info(f"Successfully indexed file: {file.filename}")
-                    else:
-                        failed_files.append(f"{file.filename} (no content extracted)")
-
-                except UnicodeDecodeError:
-                    failed_files.append(f"{file.filename} (encoding error)")
-                except Exception as e:
-                    failed_files.append(f"{file.filename} ({str(e)})")
-                    logging.error(f"Error processing file {file.filename}: {str(e)}")
+            async def _parse_upload(file: UploadFile) -> tuple[None, str]:
+                ext = Path(file.filename).suffix.lower()
+                if not doc_manager.is_supported_file(ext):
+                    raise ValueError("unsupported type")
+                return None, await parse_upload(file, ext)
+
+            async def _insert(batch: List[tuple[UploadFile, None, str]]):
+                nonlocal inserted_count
+                await rag.ainsert([content for _, _, content in batch])
+                inserted_count += len(batch)
+                logging.info(f"Successfully indexed {len(batch)} files")
+
+            # Files are parsed concurrently in the worker pools, then inserted
+            # in ainsert calls of about max_insert_chars each
+            for file, error in await parse_in_batches(files, _parse_upload, _insert):
+                if error is None:
+                    reason = "no content extracted"
+                elif isinstance(error, UnicodeDecodeError):
+                    reason = "encoding error"
+                else:
+                    reason = str(error)
+                    logging.error(f"Error processing file {file.filename}: {reason}")
+                failed_files.append(f"{file.filename} ({reason})")
 
             # Prepare status message
             if inserted_count == len(files):
@@ -2,9 +2,10 @@ from abc import abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Any, TypedDict, Optional, Union, Literal, Generic, TypeVar
+import asyncio
 import os
 import numpy as np
-from .utils import EmbeddingFunc
+from .utils import EmbeddingFunc, list_of_list_to_csv
 
 TextChunkSchema = TypedDict(
     "TextChunkSchema",
@@ -45,6 +46,85 @@ class QueryParam:
     )
 
 
+@dataclass
+class ContextEntity:
+    entity_name: str
+    entity_type: str = "UNKNOWN"
+    description: str = "UNKNOWN"
+    rank: int = 0
+    # description_tokens stored on the node, counted when missing
+    tokens: Optional[int] = None
+
+
+@dataclass
+class ContextRelation:
+    src_id: str
+    tgt_id: str
+    description: str = ""
+    keywords: str = ""
+    weight: float = 0.0
+    rank: int = 0
+    tokens: Optional[int] = None
+
+    @property
+    def key(self) -> tuple[str, str]:
+        # the graph is undirected, A->B and B->A are the same relation
+        return tuple(sorted((self.src_id, self.tgt_id)))
+
+
+@dataclass
+class ContextSource:
+    id: str
+    content: str
+    tokens: Optional[int] = None
+
+
+@dataclass
+class QueryContext:
+    """Entities, relations and source chunks retrieved for a query.
+
+    The local/global context builders fill it, hybrid mode merges two of them,
+    and it is turned into prompt text once, by render().
+    """
+
+    entities: list[ContextEntity] = field(default_factory=list)
+    relations: list[ContextRelation] = field(default_factory=list)
+    sources: list[ContextSource] = field(default_factory=list)
+
+    def render(self) -> str:
+        entities_context = list_of_list_to_csv(
+            [["id", "entity", "type", "description", "rank"]]
+            + [
+                [i, e.entity_name, e.entity_type, e.description, e.rank]
+                for i, e in enumerate(self.entities)
+            ]
+        )
+        relations_context = list_of_list_to_csv(
+            [["id", "source", "target", "description", "keywords", "weight", "rank"]]
+            + [
+                [i, r.src_id, r.tgt_id, r.description, r.keywords, r.weight, r.rank]
+                for i, r in enumerate(self.relations)
+            ]
+        )
+        text_units_context = list_of_list_to_csv(
+            [["id", "content"]] + [[i, s.content] for i, s in enumerate(self.sources)]
+        )
+        return f"""
+-----Entities-----
+```csv
+{entities_context}
+```
+-----Relationships-----
+```csv
+{relations_context}
+```
+-----Sources-----
+```csv
+{text_units_context}
+```
+"""
+
+
 @dataclass
 class StorageNameSpace:
     namespace: str
@@ -73,6 +153,9 @@ class BaseVectorStorage(StorageNameSpace):
         """
         raise NotImplementedError
 
+    async def delete(self, ids: list[str]):
+        raise NotImplementedError
+
 
 @dataclass
 class BaseKVStorage(Generic[T], StorageNameSpace):
@@ -96,6 +179,13 @@ class BaseKVStorage(Generic[T], StorageNameSpace):
     async def upsert(self, data: dict[str, T]):
         raise NotImplementedError
 
+    async def replace(self, data: dict[str, T]):
+        """Insert or overwrite, storages whose upsert keeps existing keys override this"""
+        await self.upsert(data)
+
+    async def delete(self, ids: list[str]):
+        raise NotImplementedError
+
     async def drop(self):
         raise NotImplementedError
 
@@ -144,6 +234,85 @@ class BaseGraphStorage(StorageNameSpace):
     async def delete_node(self, node_id: str):
         raise NotImplementedError
 
+    async def delete_edge(self, source_node_id: str, target_node_id: str):
+        raise NotImplementedError
+
+    async def get_nodes_bulk(self, node_ids: list[str]) -> dict[str, dict]:
+        """Fetch several nodes at once, missing nodes are left out of the result.
+
+        Backends that can read many nodes in one round trip should override this.
+        """
+        node_datas = await asyncio.gather(*[self.get_node(n) for n in node_ids])
+        return {k: v for k, v in zip(node_ids, node_datas) if v is not None}
+
+    async def node_degrees(self, node_ids: list[str]) -> dict[str, int]:
+        """Degree of every node in node_ids, missing nodes count as 0.
+
+        Backends that can compute many degrees in one round trip should override this.
+        """
+        node_ids = list(dict.fromkeys(node_ids))
+        degrees = await asyncio.gather(*[self.node_degree(n) for n in node_ids])
+        return {k: int(d or 0) for k, d in zip(node_ids, degrees)}
+
+    async def get_edges(
+        self, pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        """Fetch several ``(source_id, target_id)`` edges at once, missing edges are left out."""
+        pairs = list(dict.fromkeys(tuple(p) for p in pairs))
+        edge_datas = await asyncio.gather(*[self.get_edge(s, t) for s, t in pairs])
+        return {k: v for k, v in zip(pairs, edge_datas) if v is not None}
+
+    async def edge_degrees(
+        self, pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], int]:
+        """Degree of every ``(source_id, target_id)`` edge, i.e. the sum of its endpoint degrees.
+
+        Built on node_degrees, so each endpoint is looked up once per call.
+        """
+        pairs = list(dict.fromkeys(tuple(p) for p in pairs))
+        degrees = await self.node_degrees([n for pair in pairs for n in pair])
+        return {(s, t): degrees.get(s, 0) + degrees.get(t, 0) for s, t in pairs}
+
+    async def get_node_neighbourhoods(self, node_ids: list[str]) -> dict[str, dict]:
+        """Node data, degree and incident edges of several nodes at once.
+
+        Returns ``{node_id: {"node": dict, "degree": int, "edges": [(node_id, neighbour), ...]}}``,
+        missing nodes are left out. Backends that can answer this in one round trip should override this.
+        """
+        node_ids = list(dict.fromkeys(node_ids))
+        nodes, degrees, edges = await asyncio.gather(
+            self.get_nodes_bulk(node_ids),
+            self.node_degrees(node_ids),
+            asyncio.gather(*[self.get_node_edges(n) for n in node_ids]),
+        )
+        return {
+            n: {"node": nodes[n], "degree": degrees.get(n, 0), "edges": list(e or [])}
+            for n, e in zip(node_ids, edges)
+            if n in nodes
+        }
+
+    async def get_neighbors_within_k_hops_bulk(
+        self, node_ids: list[str], k: int
+    ) -> dict[str, list[tuple]]:
+        """``{node_id: get_neighbors_within_k_hops(node_id, k)}`` for several start nodes."""
+        node_ids = list(dict.fromkeys(node_ids))
+        paths = await asyncio.gather(
+            *[self.get_neighbors_within_k_hops(n, k) for n in node_ids]
+        )
+        return dict(zip(node_ids, paths))
+
+    async def upsert_nodes_bulk(self, nodes: dict[str, dict[str, str]]):
+        """Upsert ``{node_id: node_data}`` in as few round trips as the backend allows."""
+        await asyncio.gather(
+            *[self.upsert_node(k, node_data=v) for k, v in nodes.items()]
+        )
+
+    async def upsert_edges_bulk(self, edges: list[tuple[str, str, dict[str, str]]]):
+        """Upsert ``(source_id, target_id, edge_data)`` triples in as few round trips as possible."""
+        await asyncio.gather(
+            *[self.upsert_edge(s, t, edge_data=d) for s, t, d in edges]
+        )
+
     async def embed_nodes(self, algorithm: str) -> tuple[np.ndarray, list[str]]:
         raise NotImplementedError("Node embedding is not used in minirag.")
 
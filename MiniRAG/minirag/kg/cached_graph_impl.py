@@ -0,0 +1,347 @@
+"""
+Read-through cache in front of any graph storage.
+
+Hot entities are read on nearly every query, which costs a round trip (and a
+session setup) per lookup on remote backends such as Neo4j or PostgreSQL/AGE.
+CachedGraphStorage keeps nodes, edges, adjacency lists and degrees in an
+in-process LRU with a TTL, and invalidates them on every write that goes
+through it.
+
+Usage:
+    rag = MiniRAG(
+        graph_storage="CachedGraphStorage",
+        graph_cache_params={"storage": "Neo4JStorage", "max_size": 50000, "ttl": 300},
+    )
+
+The TTL bounds how stale an entry can get when another process writes to the
+same graph; "ttl": None keeps entries until they are evicted or invalidated,
+and "ttl": 0 disables the cache.
+"""
+
+import importlib
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Union
+
+from minirag.utils import logger
+from ..base import BaseGraphStorage
+
+_MISSING = object()
+
+
+class _LRUCache:
+    """OrderedDict based LRU with a per-entry TTL (seconds, None = no expiry,
+    0 = nothing is cached)"""
+
+    def __init__(self, max_size: int, ttl: Union[float, None]):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return _MISSING
+        value, expires_at = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        if self.ttl is not None and self.ttl <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+@dataclass
+class CachedGraphStorage(BaseGraphStorage):
+    # wrapped storage, built from graph_cache_params["storage"] when not given
+    storage: BaseGraphStorage = None
+
+    def __post_init__(self):
+        params = self.global_config.get("graph_cache_params", {})
+        if self.storage is None:
+            self.storage = self._create_storage(params.get("storage", "NetworkXStorage"))
+        self._cache = _LRUCache(
+            max_size=int(params.get("max_size", 10000)),
+            ttl=params.get("ttl", 300),
+        )
+        # edge degrees depend on both endpoints, remember which keys to drop
+        # when the degree of a node changes
+        self._edge_degree_keys: dict[str, set] = defaultdict(set)
+        self._hits: dict[str, int] = defaultdict(int)
+        self._misses: dict[str, int] = defaultdict(int)
+        logger.info(
+            f"Graph cache enabled for {type(self.storage).__name__}: "
+            f"max_size={self._cache.max_size}, ttl={self._cache.ttl}"
+        )
+
+    def _create_storage(self, storage_name: str) -> BaseGraphStorage:
+        from ..minirag import STORAGES
+
+        if storage_name == type(self).__name__:
+            raise ValueError("CachedGraphStorage cannot wrap itself")
+        module = importlib.import_module(
+            STORAGES[storage_name], package=__package__.rsplit(".", 1)[0]
+        )
+        return getattr(module, storage_name)(
+            namespace=self.namespace,
+            global_config=self.global_config,
+            embedding_func=self.embedding_func,
+        )
+
+    def __getattr__(self, name: str):
+        # backend specific extras (get_node_from_types, get_knowledge_graph, ...)
+        if name.startswith("_") or name == "storage":
+            raise AttributeError(name)
+        return getattr(self.storage, name)
+
+    # ------------------------------------------------------------------
+    # metrics
+    # ------------------------------------------------------------------
+
+    def cache_stats(self) -> dict[str, Any]:
+        """Hits, misses and hit rate per lookup kind"""
+        stats = {}
+        for kind in sorted(set(self._hits) | set(self._misses)):
+            hits, misses = self._hits[kind], self._misses[kind]
+            stats[kind] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            }
+        total_hits = sum(self._hits.values())
+        total = total_hits + sum(self._misses.values())
+        stats["total"] = {
+            "hits": total_hits,
+            "misses": total - total_hits,
+            "hit_rate": total_hits / total if total else 0.0,
+            "size": len(self._cache),
+        }
+        return stats
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._edge_degree_keys.clear()
+
+    # ------------------------------------------------------------------
+    # cache helpers
+    # ------------------------------------------------------------------
+
+    def _lookup(self, key: tuple):
+        value = self._cache.get(key)
+        if value is _MISSING:
+            self._misses[key[0]] += 1
+        else:
+            self._hits[key[0]] += 1
+        return value
+
+    def _store(self, key: tuple, value):
+        # in-process backends (NetworkX) return their live attribute dicts
+        self._cache.set(key, self._copy(value))
+        if key[0] == "edge_degree":
+            self._edge_degree_keys[key[1]].add(key)
+            self._edge_degree_keys[key[2]].add(key)
+
+    @staticmethod
+    def _copy(value):
+        # callers may mutate what they get back, never share the cached dict
+        return dict(value) if isinstance(value, dict) else value
+
+    async def _cached(self, key: tuple, fetch):
+        value = self._lookup(key)
+        if value is _MISSING:
+            value = await fetch()
+            self._store(key, value)
+        return self._copy(value)
+
+    def _invalidate_node(self, node_id: str):
+        self._cache.pop(("node", node_id))
+
+    def _invalidate_structure(self, node_id: str):
+        """Drop everything derived from the edges of node_id"""
+        self._cache.pop(("degree", node_id))
+        self._cache.pop(("node_edges", node_id))
+        for key in self._edge_degree_keys.pop(node_id, ()):
+            self._cache.pop(key)
+
+    def _invalidate_edge(self, source_node_id: str, target_node_id: str):
+        self._cache.pop(("edge", source_node_id, target_node_id))
+        self._cache.pop(("edge", target_node_id, source_node_id))
+        self._invalidate_structure(source_node_id)
+        self._invalidate_structure(target_node_id)
+
+    # ------------------------------------------------------------------
+    # reads
+    # ------------------------------------------------------------------
+
+    async def get_types(self) -> tuple[list[str], list[str]]:
+        return await self.storage.get_types()
+
+    async def has_node(self, node_id: str) -> bool:
+        node = self._cache.get(("node", node_id))
+        if node is not _MISSING:
+            self._hits["node"] += 1
+            return node is not None
+        return await self.storage.has_node(node_id)
+
+    async def has_edge(self, source_node_id: str, target_node_id: str) -> bool:
+        edge = self._cache.get(("edge", source_node_id, target_node_id))
+        if edge is not _MISSING:
+            self._hits["edge"] += 1
+            return edge is not None
+        return await self.storage.has_edge(source_node_id, target_node_id)
+
+    async def get_node(self, node_id: str) -> Union[dict, None]:
+        return await self._cached(
+            ("node", node_id), lambda: self.storage.get_node(node_id)
+        )
+
+    async def get_edge(
+        self, source_node_id: str, target_node_id: str
+    ) -> Union[dict, None]:
+        return await self._cached(
+            ("edge", source_node_id, target_node_id),
+            lambda: self.storage.get_edge(source_node_id, target_node_id),
+        )
+
+    async def node_degree(self, node_id: str) -> int:
+        return await self._cached(
+            ("degree", node_id), lambda: self.storage.node_degree(node_id)
+        )
+
+    async def edge_degree(self, src_id: str, tgt_id: str) -> int:
+        return await self._cached(
+            ("edge_degree", src_id, tgt_id),
+            lambda: self.storage.edge_degree(src_id, tgt_id),
+        )
+
+    async def get_node_edges(self, source_node_id: str):
+        edges = await self._cached(
+            ("node_edges", source_node_id),
+            lambda: self.storage.get_node_edges(source_node_id),
+        )
+        return list(edges) if edges is not None else None
+
+    async def _cached_many(self, kind: str, keys: list, fetch_many, missing_value):
+        """Serve keys from the cache and fetch the rest with one batched call"""
+        keys = list(dict.fromkeys(keys))
+        found, misses = {}, []
+        for k in keys:
+            cache_key = (kind, *k) if isinstance(k, tuple) else (kind, k)
+            value = self._lookup(cache_key)
+            if value is _MISSING:
+                misses.append(k)
+            else:
+                found[k] = value
+        if misses:
+            fetched = await fetch_many(misses)
+            for k in misses:
+                value = fetched.get(k, missing_value)
+                self._store((kind, *k) if isinstance(k, tuple) else (kind, k), value)
+                found[k] = value
+        return {k: self._copy(v) for k, v in found.items() if v is not None}
+
+    async def get_nodes_bulk(self, node_ids: list[str]) -> dict[str, dict]:
+        return await self._cached_many(
+            "node", node_ids, self.storage.get_nodes_bulk, None
+        )
+
+    async def node_degrees(self, node_ids: list[str]) -> dict[str, int]:
+        return await self._cached_many(
+            "degree", node_ids, self.storage.node_degrees, 0
+        )
+
+    async def get_edges(
+        self, pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        return await self._cached_many(
+            "edge", [tuple(p) for p in pairs], self.storage.get_edges, None
+        )
+
+    async def edge_degrees(
+        self, pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], int]:
+        return await self._cached_many(
+            "edge_degree", [tuple(p) for p in pairs], self.storage.edge_degrees, 0
+        )
+
+    # ------------------------------------------------------------------
+    # writes (write-through, then invalidate)
+    # ------------------------------------------------------------------
+
+    async def upsert_node(self, node_id: str, node_data: dict[str, str]):
+        await self.storage.upsert_node(node_id, node_data)
+        self._invalidate_node(node_id)
+
+    async def upsert_edge(
+        self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
+    ):
+        await self.storage.upsert_edge(source_node_id, target_node_id, edge_data)
+        # some backends create missing endpoints on edge upsert
+        self._invalidate_node(source_node_id)
+        self._invalidate_node(target_node_id)
+        self._invalidate_edge(source_node_id, target_node_id)
+
+    async def upsert_nodes_bulk(self, nodes: dict[str, dict[str, str]]):
+        await self.storage.upsert_nodes_bulk(nodes)
+        for node_id in nodes:
+            self._invalidate_node(node_id)
+
+    async def upsert_edges_bulk(self, edges: list[tuple[str, str, dict[str, str]]]):
+        await self.storage.upsert_edges_bulk(edges)
+        for source_node_id, target_node_id, _ in edges:
+            self._invalidate_node(source_node_id)
+            self._invalidate_node(target_node_id)
+            self._invalidate_edge(source_node_id, target_node_id)
+
+    async def delete_node(self, node_id: str):
+        # the neighbours lose an edge as well
+        neighbours = self._cache.get(("node_edges", node_id))
+        if neighbours is _MISSING:
+            neighbours = await self.storage.get_node_edges(node_id)
+        await self.storage.delete_node(node_id)
+        self._invalidate_node(node_id)
+        self._invalidate_structure(node_id)
+        for source_node_id, target_node_id in neighbours or []:
+            self._invalidate_edge(source_node_id, target_node_id)
+
+    async def delete_edge(self, source_node_id: str, target_node_id: str):
+        await self.storage.delete_edge(source_node_id, target_node_id)
+        self._invalidate_edge(source_node_id, target_node_id)
+
+    # ------------------------------------------------------------------
+    # passthrough
+    # ------------------------------------------------------------------
+
+    async def index_done_callback(self):
+        await self.storage.index_done_callback()
+
+    async def query_done_callback(self):
+        await self.storage.query_done_callback()
+        logger.debug(f"Graph cache stats: {self.cache_stats()['total']}")
+
+    async def embed_nodes(self, algorithm: str):
+        return await self.storage.embed_nodes(algorithm)
+
+    async def get_neighbors_within_k_hops_bulk(
+        self, node_ids: list[str], k: int
+    ) -> dict[str, list[tuple]]:
+        # paths are not cached, let the backend batch them
+        return await self.storage.get_neighbors_within_k_hops_bulk(node_ids, k)
@@ -101,6 +101,9 @@ class JsonKVStorage(BaseKVStorage):
         self._data.update(left_data)
         return left_data
 
+    async def replace(self, data: dict[str, dict]):
+        self._data.update(data)
+
     async def drop(self):
         self._data = {}
 
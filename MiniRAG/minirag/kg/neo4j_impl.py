@@ -24,8 +24,6 @@ from tenacity import (
 
 from minirag.utils import logger
 from ..base import BaseGraphStorage
-import copy
-from minirag.utils import merge_tuples
 
 @dataclass
 class Neo4JStorage(BaseGraphStorage):
@@ -49,6 +47,17 @@ class Neo4JStorage(BaseGraphStorage):
             "NEO4J_DATABASE"
         )  # If this param is None, the home database will be used. If it is not None, the specified database will be used.
         self._DATABASE = DATABASE
+        # number of nodes/edges sent per statement by the *_bulk methods
+        self._bulk_batch_size = int(os.environ.get("NEO4J_BULK_BATCH_SIZE", 200))
+        # upper bound on the paths returned by get_neighbors_within_k_hops
+        self._max_paths = int(os.environ.get("NEO4J_MAX_PATHS", 1000))
+        # "label": entity name used as node label (original layout)
+        # "entity": single :Entity label with a unique entity_id property
+        self._schema_mode = os.environ.get("NEO4J_SCHEMA_MODE", "label").lower()
+        if self._schema_mode not in ("label", "entity"):
+            raise ValueError(
+                f"NEO4J_SCHEMA_MODE must be 'label' or 'entity', got {self._schema_mode}"
+            )
         self._driver: AsyncDriver = AsyncGraphDatabase.driver(
             URI, auth=(USERNAME, PASSWORD)
         )
@@ -91,6 +100,22 @@ class Neo4JStorage(BaseGraphStorage):
                     logger.error(f"Failed to create {DATABASE} at {URI}")
                     raise e
 
+            if self._entity_mode:
+                with _sync_driver.session(database=DATABASE) as session:
+                    self.ensure_entity_schema(session)
+
+    @staticmethod
+    def ensure_entity_schema(session):
+        """Create the constraint and index used by the :Entity schema mode"""
+        session.run(
+            "CREATE CONSTRAINT entity_id_unique IF NOT EXISTS "
+            "FOR (n:Entity) REQUIRE n.entity_id IS UNIQUE"
+        )
+        session.run(
+            "CREATE INDEX entity_type_index IF NOT EXISTS "
+            "FOR (n:Entity) ON (n.entity_type)"
+        )
+
     def __post_init__(self):
         self._node_embed_algorithms = {
             "node2vec": self._node2vec_embed,
@@ -108,14 +133,57 @@ class Neo4JStorage(BaseGraphStorage):
     async def index_done_callback(self):
         print("KG successfully indexed.")
 
+    @property
+    def _entity_mode(self) -> bool:
+        return self._schema_mode == "entity"
+
+    @property
+    def _entity_label(self) -> str:
+        """Label shared by all entity nodes, empty in label mode"""
+        return ":Entity" if self._entity_mode else ""
+
+    @property
+    def _rel_type(self) -> str:
+        """Relationship type filter, entity mode only follows entity relations.
+
+        Entity relations all share the one :DIRECTED type instead of a type
+        derived from their keywords. The keywords are free LLM text that
+        changes whenever a relation is merged again, and MERGE only matches a
+        relationship of the same type, so a keyword type would add a second
+        edge for the pair instead of updating it. Every traversal would also
+        have to list all types or drop the filter. Keywords stay a property.
+        """
+        return ":DIRECTED" if self._entity_mode else ""
+
+    @staticmethod
+    def _escape_label(node_id: str) -> str:
+        return node_id.strip('"').replace("`", "``")
+
+    def _node_pattern(self, var: str, node_id: str) -> Tuple[str, Dict[str, str]]:
+        """Cypher pattern matching the node of node_id, and its parameters"""
+        if self._entity_mode:
+            return (
+                f"({var}:Entity {{entity_id: ${var}_id}})",
+                {f"{var}_id": node_id.strip('"')},
+            )
+        return f"({var}:`{self._escape_label(node_id)}`)", {}
+
+    def _node_name(self, var: str) -> str:
+        """Cypher expression returning the entity name of a node variable"""
+        return f"{var}.entity_id" if self._entity_mode else f"labels({var})[0]"
+
+    @staticmethod
+    def _to_entity_name(name: str) -> str:
+        # entity names are stored quoted everywhere else (vector stores, prompts),
+        # only the graph drops the quotes
+        return f'"{name}"'
+
     async def has_node(self, node_id: str) -> bool:
-        entity_name_label = node_id.strip('"')
+        node, params = self._node_pattern("n", node_id)
 
         async with self._driver.session(database=self._DATABASE) as session:
-            query = (
-                f"MATCH (n:`{entity_name_label}`) RETURN count(n) > 0 AS node_exists"
-            )
-            result = await session.run(query)
+            query = f"MATCH {node} RETURN count(n) > 0 AS node_exists"
+            result = await session.run(query, **params)
             single_result = await result.single()
             logger.debug(
                 f'{inspect.currentframe().f_code.co_name}:query:{query}:result:{single_result["node_exists"]}'
@@ -123,15 +191,15 @@ class Neo4JStorage(BaseGraphStorage):
             return single_result["node_exists"]
 
     async def has_edge(self, source_node_id: str, target_node_id: str) -> bool:
-        entity_name_label_source = source_node_id.strip('"')
-        entity_name_label_target = target_node_id.strip('"')
+        source, source_params = self._node_pattern("a", source_node_id)
+        target, target_params = self._node_pattern("b", target_node_id)
 
         async with self._driver.session(database=self._DATABASE) as session:
             query = (
-                f"MATCH (a:`{entity_name_label_source}`)-[r]-(b:`{entity_name_label_target}`) "
+                f"MATCH {source}-[r{self._rel_type}]-{target} "
                 "RETURN COUNT(r) > 0 AS edgeExists"
             )
-            result = await session.run(query)
+            result = await session.run(query, **source_params, **target_params)
             single_result = await result.single()
             logger.debug(
                 f'{inspect.currentframe().f_code.co_name}:query:{query}:result:{single_result["edgeExists"]}'
@@ -140,9 +208,9 @@ class Neo4JStorage(BaseGraphStorage):
 
     async def get_node(self, node_id: str) -> Union[dict, None]:
         async with self._driver.session(database=self._DATABASE) as session:
-            entity_name_label = node_id.strip('"')
-            query = f"MATCH (n:`{entity_name_label}`) RETURN n"
-            result = await session.run(query)
+            node, params = self._node_pattern("n", node_id)
+            query = f"MATCH {node} RETURN n"
+            result = await session.run(query, **params)
             record = await result.single()
             if record:
                 node = record["n"]
@@ -154,50 +222,80 @@ class Neo4JStorage(BaseGraphStorage):
             return None
 
 
-    async def get_node_from_types(self,type_list)  -> Union[dict, None]:
-        node_list = []
-        for name, arrt in self._graph.nodes(data = True):
-            node_type = arrt.get('entity_type').strip('\"')
-            if node_type in type_list:
-                node_list.append(name)
-        node_datas = await asyncio.gather(
-            *[self.get_node(name) for name in node_list]
+    async def get_types(self) -> tuple[list[str], list[str]]:
+        async with self._driver.session(database=self._DATABASE) as session:
+            query = f"""
+                MATCH (n{self._entity_label}) WHERE n.entity_type IS NOT NULL
+                RETURN DISTINCT n.entity_type AS entity_type
+            """
+            result = await session.run(query)
+            types_with_case = [record["entity_type"] async for record in result]
+        types = list({t.lower() for t in types_with_case})
+        return types, types_with_case
+
+    async def get_node_from_types(self, type_list) -> Union[List[dict], None]:
+        """
+        Return every node whose entity_type is in type_list, with one query
+        (an index seek on :Entity(entity_type) in entity mode).
+        """
+        # entity_type is stored quoted, type_list usually is not
+        stripped = {t.strip('"') for t in type_list}
+        types = list(stripped | {f'"{t}"' for t in stripped})
+        query = f"""
+            MATCH (n{self._entity_label}) WHERE n.entity_type IN $types
+            RETURN {self._node_name("n")} AS name, n
+        """
+        async with self._driver.session(database=self._DATABASE) as session:
+            result = await session.run(query, types=types)
+            node_datas = [
+                {
+                    **dict(record["n"]),
+                    "entity_name": self._to_entity_name(record["name"]),
+                }
+                async for record in result
+            ]
+        logger.debug(
+            f"{inspect.currentframe().f_code.co_name}: {len(node_datas)} nodes for types {type_list}"
         )
-        node_datas = [
-            {**n, "entity_name": k}
-            for k, n in zip(node_list, node_datas)
-            if n is not None
-        ]
-        return node_datas#,node_dict
-    
-
-    async def get_neighbors_within_k_hops(self,source_node_id: str, k):
-        count = 0
-        if await self.has_node(source_node_id):
-            source_edge = list(self._graph.edges(source_node_id))
-        else:
-            print("NO THIS ID:",source_node_id)
-            return []
-        count = count+1
-        while count<k:
-            count = count+1
-            sc_edge = copy.deepcopy(source_edge)
-            source_edge =[]
-            for pair in sc_edge:
-                append_edge = list(self._graph.edges(pair[-1]))
-                for tuples in merge_tuples([pair],append_edge):
-                    source_edge.append(tuples)
-        return source_edge
-    
+        return node_datas
+
+    async def get_neighbors_within_k_hops(self, source_node_id: str, k):
+        """
+        Return the paths of up to k hops starting at source_node_id, as tuples
+        of entity names, expanding them in a single variable-length match.
+
+        Like the NetworkX backend, an edge is never used twice in a path and
+        only paths that cannot be extended further are returned. At most
+        NEO4J_MAX_PATHS paths are fetched.
+        """
+        source, params = self._node_pattern("s", source_node_id)
+        query = f"""
+            MATCH p = {source}-[{self._rel_type}*1..{int(k)}]-()
+            RETURN [n IN nodes(p) | {self._node_name("n")}] AS path
+            LIMIT $max_paths
+        """
+        async with self._driver.session(database=self._DATABASE) as session:
+            result = await session.run(query, max_paths=self._max_paths, **params)
+            paths = list(
+                dict.fromkeys(
+                    [
+                        tuple(self._to_entity_name(n) for n in record["path"])
+                        async for record in result
+                    ]
+                )
+            )
+        prefixes = {p[:i] for p in paths for i in range(2, len(p))}
+        return [p for p in paths if p not in prefixes]
+
     async def node_degree(self, node_id: str) -> int:
-        entity_name_label = node_id.strip('"')
+        node, params = self._node_pattern("n", node_id)
 
         async with self._driver.session(database=self._DATABASE) as session:
             query = f"""
-                MATCH (n:`{entity_name_label}`)
-                RETURN COUNT{{ (n)--() }} AS totalEdgeCount
+                MATCH {node}
+                RETURN COUNT{{ (n)-[{self._rel_type}]-() }} AS totalEdgeCount
             """
-            result = await session.run(query)
+            result = await session.run(query, **params)
             record = await result.single()
             if record:
                 edge_count = record["totalEdgeCount"]
@@ -209,10 +307,8 @@ class Neo4JStorage(BaseGraphStorage):
                 return None
 
     async def edge_degree(self, src_id: str, tgt_id: str) -> int:
-        entity_name_label_source = src_id.strip('"')
-        entity_name_label_target = tgt_id.strip('"')
-        src_degree = await self.node_degree(entity_name_label_source)
-        trg_degree = await self.node_degree(entity_name_label_target)
+        src_degree = await self.node_degree(src_id)
+        trg_degree = await self.node_degree(tgt_id)
 
         # Convert None to 0 for addition
         src_degree = 0 if src_degree is None else src_degree
@@ -227,8 +323,6 @@ class Neo4JStorage(BaseGraphStorage):
     async def get_edge(
         self, source_node_id: str, target_node_id: str
     ) -> Union[dict, None]:
-        entity_name_label_source = source_node_id.strip('"')
-        entity_name_label_target = target_node_id.strip('"')
         """
         Find all edges between nodes of two given labels
 
@@ -239,17 +333,16 @@ class Neo4JStorage(BaseGraphStorage):
         Returns:
             list: List of all relationships/edges found
         """
+        source, source_params = self._node_pattern("start", source_node_id)
+        target, target_params = self._node_pattern("end", target_node_id)
         async with self._driver.session(database=self._DATABASE) as session:
             query = f"""
-            MATCH (start:`{entity_name_label_source}`)-[r]->(end:`{entity_name_label_target}`)
+            MATCH {source}-[r{self._rel_type}]->{target}
             RETURN properties(r) as edge_properties
             LIMIT 1
-            """.format(
-                entity_name_label_source=entity_name_label_source,
-                entity_name_label_target=entity_name_label_target,
-            )
+            """
 
-            result = await session.run(query)
+            result = await session.run(query, **source_params, **target_params)
             record = await result.single()
             if record:
                 result = dict(record["edge_properties"])
@@ -261,33 +354,29 @@ class Neo4JStorage(BaseGraphStorage):
                 return None
 
     async def get_node_edges(self, source_node_id: str) -> List[Tuple[str, str]]:
-        node_label = source_node_id.strip('"')
-
         """
         Retrieves all edges (relationships) for a particular node identified by its label.
         :return: List of dictionaries containing edge information
         """
-        query = f"""MATCH (n:`{node_label}`)
-                OPTIONAL MATCH (n)-[r]-(connected)
-                RETURN n, r, connected"""
+        node, params = self._node_pattern("n", source_node_id)
+        query = f"""MATCH {node}
+                OPTIONAL MATCH (n)-[r{self._rel_type}]-(connected)
+                RETURN {self._node_name("n")} AS source_name,
+                       {self._node_name("connected")} AS target_name"""
         async with self._driver.session(database=self._DATABASE) as session:
-            results = await session.run(query)
+            results = await session.run(query, **params)
             edges = []
             async for record in results:
-                source_node = record["n"]
-                connected_node = record["connected"]
-
-                source_label = (
-                    list(source_node.labels)[0] if source_node.labels else None
-                )
-                target_label = (
-                    list(connected_node.labels)[0]
-                    if connected_node and connected_node.labels
-                    else None
-                )
+                source_label = record["source_name"]
+                target_label = record["target_name"]
 
                 if source_label and target_label:
-                    edges.append((source_label, target_label))
+                    edges.append(
+                        (
+                            self._to_entity_name(source_label),
+                            self._to_entity_name(target_label),
+                        )
+                    )
 
             return edges
 
@@ -313,13 +402,14 @@ class Neo4JStorage(BaseGraphStorage):
         """
         label = node_id.strip('"')
         properties = node_data
+        node, params = self._node_pattern("n", node_id)
 
         async def _do_upsert(tx: AsyncManagedTransaction):
             query = f"""
-            MERGE (n:`{label}`)
+            MERGE {node}
             SET n += $properties
             """
-            await tx.run(query, properties=properties)
+            await tx.run(query, properties=properties, **params)
             logger.debug(
                 f"Upserted node with label '{label}' and properties: {properties}"
             )
@@ -356,17 +446,22 @@ class Neo4JStorage(BaseGraphStorage):
         source_node_label = source_node_id.strip('"')
         target_node_label = target_node_id.strip('"')
         edge_properties = edge_data
+        source, source_params = self._node_pattern("source", source_node_id)
+        target, target_params = self._node_pattern("target", target_node_id)
 
+        # fixed :DIRECTED type (see _rel_type), MERGE updates the pair's one edge
         async def _do_upsert_edge(tx: AsyncManagedTransaction):
             query = f"""
-            MATCH (source:`{source_node_label}`)
+            MATCH {source}
             WITH source
-            MATCH (target:`{target_node_label}`)
+            MATCH {target}
             MERGE (source)-[r:DIRECTED]->(target)
             SET r += $properties
             RETURN r
             """
-            await tx.run(query, properties=edge_properties)
+            await tx.run(
+                query, properties=edge_properties, **source_params, **target_params
+            )
             logger.debug(
                 f"Upserted edge from '{source_node_label}' to '{target_node_label}' with properties: {edge_properties}"
             )
@@ -378,6 +473,241 @@ class Neo4JStorage(BaseGraphStorage):
             logger.error(f"Error during edge upsert: {str(e)}")
             raise
 
+    async def delete_node(self, node_id: str):
+        """Delete a node together with all of its relationships"""
+        node, params = self._node_pattern("n", node_id)
+
+        async def _do_delete(tx: AsyncManagedTransaction):
+            await tx.run(f"MATCH {node} DETACH DELETE n", **params)
+
+        async with self._driver.session(database=self._DATABASE) as session:
+            await session.execute_write(_do_delete)
+        logger.debug(f"Deleted node {node_id}")
+
+    async def delete_edge(self, source_node_id: str, target_node_id: str):
+        """Delete the relationships between two nodes, in either direction"""
+        source, source_params = self._node_pattern("a", source_node_id)
+        target, target_params = self._node_pattern("b", target_node_id)
+
+        async def _do_delete(tx: AsyncManagedTransaction):
+            await tx.run(
+                f"MATCH {source}-[r{self._rel_type}]-{target} DELETE r",
+                **source_params,
+                **target_params,
+            )
+
+        async with self._driver.session(database=self._DATABASE) as session:
+            await session.execute_write(_do_delete)
+        logger.debug(f"Deleted edge {source_node_id} -> {target_node_id}")
+
+    def _batches(self, items: list) -> list[list]:
+        size = max(1, self._bulk_batch_size)
+        return [items[i : i + size] for i in range(0, len(items), size)]
+
+    async def get_nodes_bulk(self, node_ids: List[str]) -> Dict[str, dict]:
+        """
+        Fetch many nodes with one statement per batch.
+
+        In label mode node ids are labels, which Cypher cannot take as
+        parameters, so each batch is a UNION ALL of label scans instead of an
+        UNWIND.
+        """
+        node_ids = list(dict.fromkeys(node_ids))
+        nodes = {}
+        async with self._driver.session(database=self._DATABASE) as session:
+            for batch in self._batches(node_ids):
+                if self._entity_mode:
+                    result = await session.run(
+                        """
+                        UNWIND range(0, size($ids) - 1) AS idx
+                        MATCH (n:Entity {entity_id: $ids[idx]})
+                        RETURN idx, n
+                        """,
+                        ids=[node_id.strip('"') for node_id in batch],
+                    )
+                    async for record in result:
+                        nodes[batch[record["idx"]]] = dict(record["n"])
+                    continue
+                query = "\nUNION ALL\n".join(
+                    f"MATCH (n:`{self._escape_label(node_id)}`) RETURN {idx} AS idx, n LIMIT 1"
+                    for idx, node_id in enumerate(batch)
+                )
+                result = await session.run(query)
+                async for record in result:
+                    nodes[batch[record["idx"]]] = dict(record["n"])
+        logger.debug(
+            f"{inspect.currentframe().f_code.co_name}: fetched {len(nodes)}/{len(node_ids)} nodes"
+        )
+        return nodes
+
+    async def node_degrees(self, node_ids: List[str]) -> Dict[str, int]:
+        """
+        Degrees of many nodes with one statement per batch, missing nodes count as 0.
+        """
+        node_ids = list(dict.fromkeys(node_ids))
+        degrees = dict.fromkeys(node_ids, 0)
+        async with self._driver.session(database=self._DATABASE) as session:
+            for batch in self._batches(node_ids):
+                if self._entity_mode:
+                    # only entity relations count, like _rel_type in node_degree
+                    query = """
+                        UNWIND range(0, size($ids) - 1) AS idx
+                        MATCH (n:Entity {entity_id: $ids[idx]})
+                        RETURN idx, COUNT { (n)-[:DIRECTED]-() } AS degree
+                    """
+                else:
+                    query = "\nUNION ALL\n".join(
+                        f"MATCH (n:`{self._escape_label(node_id)}`) "
+                        f"RETURN {idx} AS idx, COUNT {{ (n)--() }} AS degree LIMIT 1"
+                        for idx, node_id in enumerate(batch)
+                    )
+                result = await session.run(
+                    query, ids=[node_id.strip('"') for node_id in batch]
+                )
+                async for record in result:
+                    degrees[batch[record["idx"]]] = record["degree"]
+        return degrees
+
+    async def get_edges(
+        self, pairs: List[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], dict]:
+        """
+        Fetch many (source, target) edges with one statement per batch.
+        """
+        pairs = list(dict.fromkeys(tuple(p) for p in pairs))
+        edges = {}
+        async with self._driver.session(database=self._DATABASE) as session:
+            for batch in self._batches(pairs):
+                if self._entity_mode:
+                    # same :DIRECTED filter as get_edge
+                    query = """
+                        UNWIND range(0, size($sources) - 1) AS idx
+                        MATCH (a:Entity {entity_id: $sources[idx]})
+                              -[r:DIRECTED]->(b:Entity {entity_id: $targets[idx]})
+                        WITH idx, head(collect(properties(r))) AS edge_properties
+                        RETURN idx, edge_properties
+                    """
+                else:
+                    query = "\nUNION ALL\n".join(
+                        f"MATCH (a:`{self._escape_label(src)}`)-[r]->(b:`{self._escape_label(tgt)}`) "
+                        f"RETURN {idx} AS idx, properties(r) AS edge_properties LIMIT 1"
+                        for idx, (src, tgt) in enumerate(batch)
+                    )
+                result = await session.run(
+                    query,
+                    sources=[src.strip('"') for src, _ in batch],
+                    targets=[tgt.strip('"') for _, tgt in batch],
+                )
+                async for record in result:
+                    edges[batch[record["idx"]]] = dict(record["edge_properties"])
+        logger.debug(
+            f"{inspect.currentframe().f_code.co_name}: fetched {len(edges)}/{len(pairs)} edges"
+        )
+        return edges
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(
+            (
+                neo4jExceptions.ServiceUnavailable,
+                neo4jExceptions.TransientError,
+                neo4jExceptions.WriteServiceUnavailable,
+            )
+        ),
+    )
+    async def upsert_nodes_bulk(self, nodes: Dict[str, Dict[str, Any]]):
+        """
+        Upsert many nodes with one write transaction per batch.
+
+        Entity mode uses a plain UNWIND. In label mode every node gets its own
+        unit subquery, so a label matching several nodes cannot multiply the
+        rows seen by the rest of the batch.
+        """
+        items = list(nodes.items())
+
+        async def _do_upsert(tx: AsyncManagedTransaction, batch, query):
+            await tx.run(
+                query,
+                rows=[node_data for _, node_data in batch],
+                ids=[node_id.strip('"') for node_id, _ in batch],
+            )
+
+        try:
+            async with self._driver.session(database=self._DATABASE) as session:
+                for batch in self._batches(items):
+                    if self._entity_mode:
+                        query = """
+                        UNWIND range(0, size($ids) - 1) AS idx
+                        MERGE (n:Entity {entity_id: $ids[idx]})
+                        SET n += $rows[idx]
+                        """
+                        await session.execute_write(_do_upsert, batch, query)
+                        continue
+                    query = "\n".join(
+                        f"CALL {{ MERGE (n:`{self._escape_label(node_id)}`) SET n += $rows[{idx}] }}"
+                        for idx, (node_id, _) in enumerate(batch)
+                    )
+                    query += "\nRETURN count(*) AS upserted"
+                    await session.execute_write(_do_upsert, batch, query)
+            logger.debug(f"Upserted {len(items)} nodes in bulk")
+        except Exception as e:
+            logger.error(f"Error during bulk upsert: {str(e)}")
+            raise
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(
+            (
+                neo4jExceptions.ServiceUnavailable,
+                neo4jExceptions.TransientError,
+                neo4jExceptions.WriteServiceUnavailable,
+            )
+        ),
+    )
+    async def upsert_edges_bulk(
+        self, edges: List[Tuple[str, str, Dict[str, Any]]]
+    ):
+        """
+        Upsert many edges with one write transaction per batch.
+        """
+
+        async def _do_upsert_edges(tx: AsyncManagedTransaction, batch, query):
+            await tx.run(
+                query,
+                rows=[edge_data for _, _, edge_data in batch],
+                sources=[src.strip('"') for src, _, _ in batch],
+                targets=[tgt.strip('"') for _, tgt, _ in batch],
+            )
+
+        try:
+            async with self._driver.session(database=self._DATABASE) as session:
+                for batch in self._batches(list(edges)):
+                    if self._entity_mode:
+                        # keywords go into r's properties, the type stays :DIRECTED
+                        query = """
+                        UNWIND range(0, size($rows) - 1) AS idx
+                        MATCH (source:Entity {entity_id: $sources[idx]})
+                        MATCH (target:Entity {entity_id: $targets[idx]})
+                        MERGE (source)-[r:DIRECTED]->(target)
+                        SET r += $rows[idx]
+                        """
+                        await session.execute_write(_do_upsert_edges, batch, query)
+                        continue
+                    query = "\n".join(
+                        f"CALL {{ MATCH (source:`{self._escape_label(src)}`) "
+                        f"MATCH (target:`{self._escape_label(tgt)}`) "
+                        f"MERGE (source)-[r:DIRECTED]->(target) SET r += $rows[{idx}] }}"
+                        for idx, (src, tgt, _) in enumerate(batch)
+                    )
+                    query += "\nRETURN count(*) AS upserted"
+                    await session.execute_write(_do_upsert_edges, batch, query)
+            logger.debug(f"Upserted {len(edges)} edges in bulk")
+        except Exception as e:
+            logger.error(f"Error during bulk edge upsert: {str(e)}")
+            raise
+
     async def _node2vec_embed(self):
         print("Implemented but never called.")
 
@@ -397,22 +727,23 @@ class Neo4JStorage(BaseGraphStorage):
         result = {"nodes": [], "edges": []}
         seen_nodes = set()
         seen_edges = set()
+        start_node, params = self._node_pattern("start", node_label)
 
         async with self._driver.session(database=self._DATABASE) as session:
             try:
                 # Critical debug step: first verify if starting node exists
-                validate_query = f"MATCH (n:`{label}`) RETURN n LIMIT 1"
-                validate_result = await session.run(validate_query)
+                validate_query = f"MATCH {start_node} RETURN start LIMIT 1"
+                validate_result = await session.run(validate_query, **params)
                 if not await validate_result.single():
                     logger.warning(f"Starting node {label} does not exist!")
                     return result
 
                 # Optimized query (including direction handling and self-loops)
                 main_query = f"""
-                MATCH (start:`{label}`)
+                MATCH {start_node}
                 WITH start
                 CALL apoc.path.subgraphAll(start, {{
-                    relationshipFilter: '>',
+                    relationshipFilter: '{self._rel_type.lstrip(":")}>',
                     minLevel: 0,
                     maxLevel: {max_depth},
                     bfs: true
@@ -420,7 +751,7 @@ class Neo4JStorage(BaseGraphStorage):
                 YIELD nodes, relationships
                 RETURN nodes, relationships
                 """
-                result_set = await session.run(main_query)
+                result_set = await session.run(main_query, **params)
                 record = await result_set.single()
 
                 if record:
@@ -494,14 +825,14 @@ class Neo4JStorage(BaseGraphStorage):
             result["nodes"].append(node_data)
 
             # Get all outgoing and incoming edges
+            current, params = self._node_pattern("a", current_label)
             query = f"""
-            MATCH (a)-[r]-(b)
-            WHERE a:`{current_label}` OR b:`{current_label}`
-            RETURN a, r, b,
+            MATCH {current}-[r{self._rel_type}]-(b)
+            RETURN {self._node_name("a")} AS a_name, r, {self._node_name("b")} AS b_name,
                    CASE WHEN startNode(r) = a THEN 'OUTGOING' ELSE 'INCOMING' END AS direction
             """
             async with self._driver.session(database=self._DATABASE) as session:
-                results = await session.run(query)
+                results = await session.run(query, **params)
                 async for record in results:
                     # Handle edges
                     rel = record["r"]
@@ -510,8 +841,8 @@ class Neo4JStorage(BaseGraphStorage):
                         edge_data = dict(rel)
                         edge_data.update(
                             {
-                                "source": list(record["a"].labels)[0],
-                                "target": list(record["b"].labels)[0],
+                                "source": record["a_name"],
+                                "target": record["b_name"],
                                 "type": rel.type,
                                 "direction": record["direction"],
                             }
@@ -520,11 +851,7 @@ class Neo4JStorage(BaseGraphStorage):
                         visited_edges.add(edge_id)
 
                         # Recursively traverse adjacent nodes
-                        next_label = (
-                            list(record["b"].labels)[0]
-                            if record["direction"] == "OUTGOING"
-                            else list(record["a"].labels)[0]
-                        )
+                        next_label = record["b_name"]
                         await traverse(next_label, current_depth + 1)
 
         await traverse(label, 0)
@@ -540,6 +867,15 @@ class Neo4JStorage(BaseGraphStorage):
             # Method 1: Direct metadata query (Available for Neo4j 4.3+)
             # query = "CALL db.labels() YIELD label RETURN label"
 
+            if self._entity_mode:
+                query = """
+                    MATCH (n:Entity)
+                    RETURN DISTINCT n.entity_id AS label
+                    ORDER BY label
+                """
+                result = await session.run(query)
+                return [record["label"] async for record in result]
+
             # Method 2: Query compatible with older versions
             query = """
                 MATCH (n)
@@ -226,6 +226,36 @@ class NetworkXStorage(BaseGraphStorage):
     ):
         self._graph.add_edge(source_node_id, target_node_id, **edge_data)
 
+    async def get_nodes_bulk(self, node_ids: list[str]) -> dict[str, dict]:
+        return {
+            node_id: self._graph.nodes[node_id]
+            for node_id in node_ids
+            if self._graph.has_node(node_id)
+        }
+
+    async def node_degrees(self, node_ids: list[str]) -> dict[str, int]:
+        return {
+            node_id: self._graph.degree(node_id) if self._graph.has_node(node_id) else 0
+            for node_id in node_ids
+        }
+
+    async def get_edges(
+        self, pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        return {
+            (s, t): self._graph.edges[s, t]
+            for s, t in pairs
+            if self._graph.has_edge(s, t)
+        }
+
+    async def upsert_nodes_bulk(self, nodes: dict[str, dict[str, str]]):
+        for node_id, node_data in nodes.items():
+            self._graph.add_node(node_id, **node_data)
+
+    async def upsert_edges_bulk(self, edges: list[tuple[str, str, dict[str, str]]]):
+        for source_node_id, target_node_id, edge_data in edges:
+            self._graph.add_edge(source_node_id, target_node_id, **edge_data)
+
     async def delete_node(self, node_id: str):
         """
         Delete a node from the graph based on the specified node_id.
@@ -238,6 +268,14 @@ class NetworkXStorage(BaseGraphStorage):
         else:
             logger.warning(f"Node {node_id} not found in the graph for deletion.")
 
+    async def delete_edge(self, source_node_id: str, target_node_id: str):
+        if self._graph.has_edge(source_node_id, target_node_id):
+            self._graph.remove_edge(source_node_id, target_node_id)
+        else:
+            logger.warning(
+                f"Edge {source_node_id} -> {target_node_id} not found in the graph for deletion."
+            )
+
     async def embed_nodes(self, algorithm: str) -> tuple[np.ndarray, list[str]]:
         if algorithm not in self._node_embed_algorithms:
             raise ValueError(f"Node embedding algorithm {algorithm} not supported")
@@ -229,6 +229,10 @@ class OracleKVStorage(BaseKVStorage):
             for row in res:
                 dict_res[row["mode"]][row["id"]] = row
             res = [{k: v} for k, v in dict_res.items()]
+        else:
+            # same order as ids, None for missing ids
+            by_id = {row["id"]: row for row in res or []}
+            return [by_id.get(id) for id in ids]
         if res:
             data = res  # [{"data":i} for i in res]
             # print(data)
@@ -3,6 +3,7 @@ import inspect
 import json
 import os
 import time
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from typing import Union, List, Dict, Set, Any, Tuple
 import numpy as np
@@ -11,8 +12,11 @@ import pipmaster as pm
 
 if not pm.is_installed("asyncpg"):
     pm.install("asyncpg")
+if not pm.is_installed("pgvector"):
+    pm.install("pgvector")
 
 import asyncpg
+from pgvector.asyncpg import register_vector
 import sys
 from tqdm.asyncio import tqdm as tqdm_async
 from tenacity import (
@@ -47,8 +51,33 @@ class PostgreSQLDB:
         self.password = config.get("password", None)
         self.database = config.get("database", "postgres")
         self.workspace = config.get("workspace", "default")
-        self.max = 12
+        # pool sizing, size max_connections against llm_model_max_async since
+        # every concurrent extraction/query task may hold a connection
+        self.min = int(
+            config.get("min_connections", os.environ.get("POSTGRES_MIN_CONNECTIONS", 1))
+        )
+        self.max = int(
+            config.get("max_connections", os.environ.get("POSTGRES_MAX_CONNECTIONS", 12))
+        )
+        self.statement_cache_size = int(
+            config.get(
+                "statement_cache_size",
+                os.environ.get("POSTGRES_STATEMENT_CACHE_SIZE", 256),
+            )
+        )
+        self.max_inactive_connection_lifetime = float(
+            config.get("max_inactive_connection_lifetime", 300.0)
+        )
+        # AGE graph prepared once per connection by the pool init hook
+        self.graph_name = config.get("graph_name", os.environ.get("AGE_GRAPH_NAME"))
         self.increment = 1
+        # set once the pgvector binary codec is registered on the pool connections
+        self.vector_codec = False
+        # pool gauges, see pool_stats()
+        self._waiting = 0
+        self._acquired = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
         logger.info(f"Using the label {self.workspace} for PostgreSQL as identifier")
 
         if self.user is None or self.password is None or self.database is None:
@@ -64,12 +93,26 @@ class PostgreSQLDB:
                 database=self.database,
                 host=self.host,
                 port=self.port,
-                min_size=1,
+                min_size=self.min,
                 max_size=self.max,
+                statement_cache_size=self.statement_cache_size,
+                max_inactive_connection_lifetime=self.max_inactive_connection_lifetime,
+                init=self._init_connection,
+                # the pool runs RESET ALL when a connection is released, session
+                # settings only survive it as startup parameters
+                server_settings=(
+                    {"search_path": 'ag_catalog, "$user", public'}
+                    if self.graph_name
+                    else None
+                ),
             )
+            if self.graph_name:
+                async with self.pool.acquire() as connection:
+                    await PostgreSQLDB._prerequisite(connection, self.graph_name)
 
             logger.info(
-                f"Connected to PostgreSQL database at {self.host}:{self.port}/{self.database}"
+                f"Connected to PostgreSQL database at {self.host}:{self.port}/{self.database} "
+                f"(pool {self.min}-{self.max})"
             )
         except Exception as e:
             logger.error(
@@ -78,6 +121,69 @@ class PostgreSQLDB:
             logger.error(f"PostgreSQL database error: {e}")
             raise
 
+    async def _init_connection(self, connection: asyncpg.Connection):
+        """Run once per new pool connection: pgvector codec and AGE setup"""
+        try:
+            await register_vector(connection)
+            self.vector_codec = True
+        except ValueError:
+            # the vector extension is not installed (yet) in this database,
+            # vectors are sent in their text form instead
+            self.vector_codec = False
+        if self.graph_name:
+            try:
+                await connection.execute("LOAD 'age'")
+            except asyncpg.exceptions.PostgresError as e:
+                # fine when age is in shared/session_preload_libraries
+                logger.debug(f"LOAD 'age' skipped: {e}")
+
+    @asynccontextmanager
+    async def _acquire(self):
+        """pool.acquire() that records how long callers wait for a connection"""
+        self._waiting += 1
+        start = time.perf_counter()
+        try:
+            connection = await self.pool.acquire()
+        finally:
+            self._waiting -= 1
+        waited = time.perf_counter() - start
+        self._acquired += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        try:
+            yield connection
+        finally:
+            await self.pool.release(connection)
+
+    def pool_stats(self) -> dict:
+        """Gauges to size the pool: connections in use, waiters and wait time"""
+        size = self.pool.get_size() if self.pool else 0
+        idle = self.pool.get_idle_size() if self.pool else 0
+        return {
+            "min_size": self.min,
+            "max_size": self.max,
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiting": self._waiting,
+            "acquired_total": self._acquired,
+            "wait_avg_ms": self._wait_total / self._acquired * 1000
+            if self._acquired
+            else 0.0,
+            "wait_max_ms": self._wait_max * 1000,
+        }
+
+    async def _ensure_age(self, connection: asyncpg.Connection, graph_name: str):
+        # connections of the configured graph were prepared by the init hook
+        if graph_name != self.graph_name:
+            await PostgreSQLDB._prerequisite(connection, graph_name)
+
+    def encode_vector(self, vector: np.ndarray):
+        """Parameter value for a vector column, binary when the codec is available"""
+        if self.vector_codec:
+            return np.asarray(vector, dtype=np.float32)
+        return "[" + ",".join(map(str, vector)) + "]"
+
     async def check_tables(self):
         for k, v in TABLES.items():
             try:
@@ -102,10 +208,10 @@ class PostgreSQLDB:
         for_age: bool = False,
         graph_name: str = None,
     ) -> Union[dict, None, list[dict]]:
-        async with self.pool.acquire() as connection:
+        async with self._acquire() as connection:
             try:
                 if for_age:
-                    await PostgreSQLDB._prerequisite(connection, graph_name)
+                    await self._ensure_age(connection, graph_name)
                 if params:
                     rows = await connection.fetch(sql, *params.values())
                 else:
@@ -139,9 +245,9 @@ class PostgreSQLDB:
         upsert: bool = False,
     ):
         try:
-            async with self.pool.acquire() as connection:
+            async with self._acquire() as connection:
                 if for_age:
-                    await PostgreSQLDB._prerequisite(connection, graph_name)
+                    await self._ensure_age(connection, graph_name)
 
                 if data is None:
                     await connection.execute(sql)
@@ -161,6 +267,22 @@ class PostgreSQLDB:
             print(data)
             raise
 
+    async def executemany(self, sql: str, data: list[dict]):
+        """Run one prepared statement for many rows in a single transaction"""
+        if not data:
+            return
+        try:
+            async with self._acquire() as connection:
+                async with connection.transaction():
+                    await connection.executemany(
+                        sql, [tuple(row.values()) for row in data]
+                    )
+        except Exception as e:
+            logger.error(f"PostgreSQL database error: {e.__class__} - {e}")
+            print(sql)
+            print(data[:1])
+            raise
+
     @staticmethod
     async def _prerequisite(conn: asyncpg.Connection, graph_name: str):
         try:
@@ -231,7 +353,10 @@ class PGKVStorage(BaseKVStorage):
                 dict_res[row["mode"]][row["id"]] = row
             res = [{k: v} for k, v in dict_res.items()]
         else:
-            res = await self.db.query(sql, params, multirows=True)
+            rows = await self.db.query(sql, params, multirows=True) or []
+            # same order as ids, None for missing ids
+            by_id = {row["id"]: row for row in rows}
+            return [by_id.get(id) for id in ids]
         if res:
             return res
         else:
@@ -272,27 +397,35 @@ class PGKVStorage(BaseKVStorage):
         if self.namespace == "text_chunks":
             pass
         elif self.namespace == "full_docs":
-            for k, v in data.items():
-                upsert_sql = SQL_TEMPLATES["upsert_doc_full"]
-                _data = {
+            rows = [
+                {
                     "id": k,
                     "content": v["content"],
                     "workspace": self.db.workspace,
                 }
-                await self.db.execute(upsert_sql, _data)
+                for k, v in data.items()
+            ]
+            for i in range(0, len(rows), self._max_batch_size):
+                await self.db.executemany(
+                    SQL_TEMPLATES["upsert_doc_full"], rows[i : i + self._max_batch_size]
+                )
         elif self.namespace == "llm_response_cache":
-            for mode, items in data.items():
-                for k, v in items.items():
-                    upsert_sql = SQL_TEMPLATES["upsert_llm_response_cache"]
-                    _data = {
-                        "workspace": self.db.workspace,
-                        "id": k,
-                        "original_prompt": v["original_prompt"],
-                        "return_value": v["return"],
-                        "mode": mode,
-                    }
-
-                    await self.db.execute(upsert_sql, _data)
+            rows = [
+                {
+                    "workspace": self.db.workspace,
+                    "id": k,
+                    "original_prompt": v["original_prompt"],
+                    "return_value": v["return"],
+                    "mode": mode,
+                }
+                for mode, items in data.items()
+                for k, v in items.items()
+            ]
+            for i in range(0, len(rows), self._max_batch_size):
+                await self.db.executemany(
+                    SQL_TEMPLATES["upsert_llm_response_cache"],
+                    rows[i : i + self._max_batch_size],
+                )
 
     async def index_done_callback(self):
         if self.namespace in ["full_docs", "text_chunks"]:
@@ -322,7 +455,7 @@ class PGVectorStorage(BaseVectorStorage):
                 "chunk_order_index": item["chunk_order_index"],
                 "full_doc_id": item["full_doc_id"],
                 "content": item["content"],
-                "content_vector": json.dumps(item["__vector__"].tolist()),
+                "content_vector": self.db.encode_vector(item["__vector__"]),
             }
         except Exception as e:
             logger.error(f"Error to prepare upsert sql: {e}")
@@ -337,7 +470,7 @@ class PGVectorStorage(BaseVectorStorage):
             "id": item["__id__"],
             "entity_name": item["entity_name"],
             "content": item["content"],
-            "content_vector": json.dumps(item["__vector__"].tolist()),
+            "content_vector": self.db.encode_vector(item["__vector__"]),
         }
         return upsert_sql, data
 
@@ -349,7 +482,7 @@ class PGVectorStorage(BaseVectorStorage):
             "source_id": item["src_id"],
             "target_id": item["tgt_id"],
             "content": item["content"],
-            "content_vector": json.dumps(item["__vector__"].tolist()),
+            "content_vector": self.db.encode_vector(item["__vector__"]),
         }
         return upsert_sql, data
 
@@ -387,17 +520,19 @@ class PGVectorStorage(BaseVectorStorage):
         embeddings = np.concatenate(embeddings_list)
         for i, d in enumerate(list_data):
             d["__vector__"] = embeddings[i]
-        for item in list_data:
-            if self.namespace == "chunks":
-                upsert_sql, data = self._upsert_chunks(item)
-            elif self.namespace == "entities":
-                upsert_sql, data = self._upsert_entities(item)
-            elif self.namespace == "relationships":
-                upsert_sql, data = self._upsert_relationships(item)
-            else:
-                raise ValueError(f"{self.namespace} is not supported")
 
-            await self.db.execute(upsert_sql, data)
+        if self.namespace == "chunks":
+            prepare = self._upsert_chunks
+        elif self.namespace == "entities":
+            prepare = self._upsert_entities
+        elif self.namespace == "relationships":
+            prepare = self._upsert_relationships
+        else:
+            raise ValueError(f"{self.namespace} is not supported")
+        # one prepared statement per embedding batch instead of a round trip per row
+        for i in range(0, len(list_data), self._max_batch_size):
+            rows = [prepare(item) for item in list_data[i : i + self._max_batch_size]]
+            await self.db.executemany(rows[0][0], [row for _, row in rows])
 
     async def index_done_callback(self):
         logger.info("vector data had been saved into postgresql db!")
@@ -407,13 +542,15 @@ class PGVectorStorage(BaseVectorStorage):
         """从向量数据库中查询数据"""
         embeddings = await self.embedding_func([query])
         embedding = embeddings[0]
-        embedding_string = ",".join(map(str, embedding))
 
-        sql = SQL_TEMPLATES[self.namespace].format(embedding_string=embedding_string)
+        # the vector is a parameter, so the statement text stays the same and
+        # asyncpg reuses its prepared statement across queries
+        sql = SQL_TEMPLATES[self.namespace]
         params = {
             "workspace": self.db.workspace,
             "better_than_threshold": self.cosine_better_than_threshold,
             "top_k": top_k,
+            "embedding": self.db.encode_vector(embedding),
         }
         results = await self.db.query(sql, params=params, multirows=True)
         return results
@@ -502,19 +639,21 @@ class PGDocStatusStorage(DocStatusStorage):
                   chunks_count = EXCLUDED.chunks_count,
                   status = EXCLUDED.status,
                   updated_at = CURRENT_TIMESTAMP"""
-        for k, v in data.items():
-            # chunks_count is optional
-            await self.db.execute(
-                sql,
+        await self.db.executemany(
+            sql,
+            [
                 {
                     "workspace": self.db.workspace,
                     "id": k,
                     "content_summary": v["content_summary"],
                     "content_length": v["content_length"],
+                    # chunks_count is optional
                     "chunks_count": v["chunks_count"] if "chunks_count" in v else -1,
                     "status": v["status"],
-                },
-            )
+                }
+                for k, v in data.items()
+            ],
+        )
         return data
 
 
@@ -551,6 +690,8 @@ class PGGraphStorage(BaseGraphStorage):
             embedding_func=embedding_func,
         )
         self.graph_name = os.environ["AGE_GRAPH_NAME"]
+        # number of nodes/edges sent per statement by the *_bulk methods
+        self._bulk_batch_size = int(os.environ.get("AGE_BULK_BATCH_SIZE", 200))
         self._node_embed_algorithms = {
             "node2vec": self._node2vec_embed,
         }
@@ -1001,6 +1142,162 @@ class PGGraphStorage(BaseGraphStorage):
             logger.error("Error during edge upsert: {%s}", e)
             raise
 
+    def _batches(self, items: list) -> List[list]:
+        size = max(1, self._bulk_batch_size)
+        return [items[i : i + size] for i in range(0, len(items), size)]
+
+    async def get_nodes_bulk(self, node_ids: List[str]) -> Dict[str, dict]:
+        """
+        Fetch many nodes with a single MATCH ... WHERE node_id IN [...] per batch.
+        """
+        labels = {
+            PGGraphStorage._encode_graph_label(node_id.strip('"')): node_id
+            for node_id in node_ids
+        }
+        nodes = {}
+        for batch in self._batches(list(labels)):
+            query = """SELECT * FROM cypher('%s', $$
+                         MATCH (n:Entity)
+                         WHERE n.node_id IN [%s]
+                         RETURN n
+                       $$) AS (n agtype)""" % (
+                self.graph_name,
+                ", ".join(json.dumps(label) for label in batch),
+            )
+            for record in await self._query(query):
+                node = record["n"]
+                nodes[labels[node["node_id"]]] = node
+        return nodes
+
+    async def node_degrees(self, node_ids: List[str]) -> Dict[str, int]:
+        """
+        Outgoing degrees of many nodes, one statement per batch. Missing nodes count as 0.
+        """
+        labels = {
+            PGGraphStorage._encode_graph_label(node_id.strip('"')): node_id
+            for node_id in node_ids
+        }
+        degrees = {node_id: 0 for node_id in node_ids}
+        for batch in self._batches(list(labels)):
+            # cypher() cannot bind a SQL array ($1 / ANY($1)), the batch goes in
+            # as a list literal like in get_nodes_bulk
+            query = """SELECT * FROM cypher('%s', $$
+                         MATCH (n:Entity)
+                         WHERE n.node_id IN [%s]
+                         OPTIONAL MATCH (n)-[]->(x)
+                         RETURN n.node_id AS node_id, count(x) AS degree
+                       $$) AS (node_id agtype, degree agtype)""" % (
+                self.graph_name,
+                ", ".join(json.dumps(label) for label in batch),
+            )
+            for record in await self._query(query):
+                degrees[labels[record["node_id"]]] = int(record["degree"])
+        return degrees
+
+    async def get_edges(
+        self, pairs: List[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], dict]:
+        """
+        Fetch many (source, target) edges with one UNWIND statement per batch.
+        """
+        keys = {
+            (
+                PGGraphStorage._encode_graph_label(src.strip('"')),
+                PGGraphStorage._encode_graph_label(tgt.strip('"')),
+            ): (src, tgt)
+            for src, tgt in pairs
+        }
+        edges = {}
+        for batch in self._batches(list(keys)):
+            rows = ", ".join(
+                "{src: %s, tgt: %s}" % (json.dumps(src), json.dumps(tgt))
+                for src, tgt in batch
+            )
+            query = """SELECT * FROM cypher('%s', $$
+                         UNWIND [%s] AS pair
+                         MATCH (a:Entity {node_id: pair.src})-[r]->(b:Entity {node_id: pair.tgt})
+                         RETURN pair.src AS src, pair.tgt AS tgt, properties(r) AS edge_properties
+                       $$) AS (src agtype, tgt agtype, edge_properties agtype)""" % (
+                self.graph_name,
+                rows,
+            )
+            for record in await self._query(query):
+                key = keys[(record["src"], record["tgt"])]
+                if key not in edges and record["edge_properties"]:
+                    edges[key] = record["edge_properties"]
+        return edges
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type((PGGraphQueryException,)),
+    )
+    async def upsert_nodes_bulk(self, nodes: Dict[str, Dict[str, Any]]):
+        """
+        Upsert many nodes, one UNWIND statement per batch.
+
+        Args:
+            nodes: mapping of node id to node properties
+        """
+        for batch in self._batches(list(nodes.items())):
+            rows = ", ".join(
+                "{node_id: %s, properties: %s}"
+                % (
+                    json.dumps(PGGraphStorage._encode_graph_label(node_id.strip('"'))),
+                    PGGraphStorage._format_properties(node_data),
+                )
+                for node_id, node_data in batch
+            )
+            query = """SELECT * FROM cypher('%s', $$
+                         UNWIND [%s] AS row
+                         MERGE (n:Entity {node_id: row.node_id})
+                         SET n += row.properties
+                         RETURN n
+                       $$) AS (n agtype)""" % (self.graph_name, rows)
+            try:
+                await self._query(query, readonly=False, upsert=True)
+            except Exception as e:
+                logger.error("Error during bulk upsert: {%s}", e)
+                raise
+        logger.debug("Upserted {%s} nodes in bulk", len(nodes))
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type((PGGraphQueryException,)),
+    )
+    async def upsert_edges_bulk(self, edges: List[Tuple[str, str, Dict[str, Any]]]):
+        """
+        Upsert many edges, one UNWIND statement per batch.
+
+        Args:
+            edges: list of (source node id, target node id, edge properties)
+        """
+        for batch in self._batches(list(edges)):
+            rows = ", ".join(
+                "{src: %s, tgt: %s, properties: %s}"
+                % (
+                    json.dumps(PGGraphStorage._encode_graph_label(src.strip('"'))),
+                    json.dumps(PGGraphStorage._encode_graph_label(tgt.strip('"'))),
+                    PGGraphStorage._format_properties(edge_data),
+                )
+                for src, tgt, edge_data in batch
+            )
+            query = """SELECT * FROM cypher('%s', $$
+                         UNWIND [%s] AS row
+                         MATCH (source:Entity {node_id: row.src})
+                         MATCH (target:Entity {node_id: row.tgt})
+                         MERGE (source)-[r:DIRECTED]->(target)
+                         SET r += row.properties
+                         RETURN r
+                       $$) AS (r agtype)""" % (self.graph_name, rows)
+            try:
+                await self._query(query, readonly=False, upsert=True)
+            except Exception as e:
+                logger.error("Error during bulk edge upsert: {%s}", e)
+                raise
+        logger.debug("Upserted {%s} edges in bulk", len(edges))
+
     async def _node2vec_embed(self):
         print("Implemented but never called.")
 
@@ -1165,17 +1462,17 @@ SQL_TEMPLATES = {
                      """,
     # SQL for VectorStorage
     "entities": """SELECT entity_name FROM
-        (SELECT id, entity_name, 1 - (content_vector <=> '[{embedding_string}]'::vector) as distance
+        (SELECT id, entity_name, 1 - (content_vector <=> $4::vector) as distance
         FROM LIGHTRAG_VDB_ENTITY where workspace=$1)
         WHERE distance>$2 ORDER BY distance DESC  LIMIT $3
        """,
     "relationships": """SELECT source_id as src_id, target_id as tgt_id FROM
-        (SELECT id, source_id,target_id, 1 - (content_vector <=> '[{embedding_string}]'::vector) as distance
+        (SELECT id, source_id,target_id, 1 - (content_vector <=> $4::vector) as distance
         FROM LIGHTRAG_VDB_RELATION where workspace=$1)
         WHERE distance>$2 ORDER BY distance DESC  LIMIT $3
        """,
     "chunks": """SELECT id FROM
-        (SELECT id, 1 - (content_vector <=> '[{embedding_string}]'::vector) as distance
+        (SELECT id, 1 - (content_vector <=> $4::vector) as distance
         FROM LIGHTRAG_DOC_CHUNKS where workspace=$1)
         WHERE distance>$2 ORDER BY distance DESC  LIMIT $3
        """,
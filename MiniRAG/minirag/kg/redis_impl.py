@@ -11,36 +11,79 @@ from redis.asyncio import Redis
 from minirag.utils import logger
 from minirag.base import BaseKVStorage
 import json
-import copy
-from minirag.utils import merge_tuples
 
 
 @dataclass
 class RedisKVStorage(BaseKVStorage):
+    """
+    Two layouts, selected with REDIS_KV_LAYOUT:
+      - "string" (default): one string key "<namespace>:<id>" per record
+      - "hash": one hash "<namespace>" per namespace, one field per record,
+        so bulk reads are a single HMGET and drop is a single UNLINK
+    """
+
     def __post_init__(self):
         redis_url = os.environ.get("REDIS_URI", "redis://localhost:6379")
         self._redis = Redis.from_url(redis_url, decode_responses=True)
-        logger.info(f"Use Redis as KV {self.namespace}")
+        self._layout = os.environ.get("REDIS_KV_LAYOUT", "string").lower()
+        if self._layout not in ("string", "hash"):
+            raise ValueError(
+                f"REDIS_KV_LAYOUT must be 'string' or 'hash', got {self._layout}"
+            )
+        # commands per pipeline / keys per MGET, HMGET, SCAN page
+        self._chunk_size = int(os.environ.get("REDIS_PIPELINE_CHUNK_SIZE", 1000))
+        logger.info(f"Use Redis as KV {self.namespace} ({self._layout} layout)")
+
+    def _key(self, id: str) -> str:
+        return f"{self.namespace}:{id}"
+
+    def _chunks(self, items: list) -> list[list]:
+        size = max(1, self._chunk_size)
+        return [items[i : i + size] for i in range(0, len(items), size)]
+
+    async def _scan_keys(self):
+        """Iterate the string keys of the namespace with SCAN, never KEYS"""
+        async for key in self._redis.scan_iter(
+            match=f"{self.namespace}:*", count=self._chunk_size
+        ):
+            yield key
+
+    async def _get_raw(self, ids: list[str]) -> list:
+        """JSON strings (or None) for ids, one MGET/HMGET per chunk"""
+        results = []
+        for chunk in self._chunks(list(ids)):
+            if self._layout == "hash":
+                results.extend(await self._redis.hmget(self.namespace, chunk))
+            else:
+                results.extend(await self._redis.mget([self._key(id) for id in chunk]))
+        return results
 
     async def all_keys(self) -> list[str]:
-        keys = await self._redis.keys(f"{self.namespace}:*")
-        return [key.split(":", 1)[-1] for key in keys]
+        if self._layout == "hash":
+            # HSCAN NOVALUES needs Redis 7.4, drop the values client side
+            return [
+                key
+                async for key, _ in self._redis.hscan_iter(
+                    self.namespace, count=self._chunk_size
+                )
+            ]
+        return [key.split(":", 1)[-1] async for key in self._scan_keys()]
 
     async def get_by_id(self, id):
-        data = await self._redis.get(f"{self.namespace}:{id}")
+        if self._layout == "hash":
+            data = await self._redis.hget(self.namespace, id)
+        else:
+            data = await self._redis.get(self._key(id))
         return json.loads(data) if data else None
 
     async def get_by_ids(self, ids, fields=None):
-        pipe = self._redis.pipeline()
-        for id in ids:
-            pipe.get(f"{self.namespace}:{id}")
-        results = await pipe.execute()
+        results = await self._get_raw(ids)
 
         if fields:
             # Filter fields if specified
             return [
                 {field: value.get(field) for field in fields if field in value}
-                if (value := json.loads(result))
+                if result and (value := json.loads(result))
                 else None
                 for result in results
             ]
@@ -48,25 +91,58 @@ class RedisKVStorage(BaseKVStorage):
         return [json.loads(result) if result else None for result in results]
 
     async def filter_keys(self, data: list[str]) -> set[str]:
-        pipe = self._redis.pipeline()
-        for key in data:
-            pipe.exists(f"{self.namespace}:{key}")
-        results = await pipe.execute()
+        if self._layout == "hash":
+            existing_ids = set()
+            for chunk in self._chunks(list(data)):
+                # HMGET returns None for missing fields
+                values = await self._redis.hmget(self.namespace, chunk)
+                existing_ids.update(k for k, v in zip(chunk, values) if v is not None)
+            return set(data) - existing_ids
 
-        existing_ids = {data[i] for i, exists in enumerate(results) if exists}
+        existing_ids = set()
+        for chunk in self._chunks(list(data)):
+            pipe = self._redis.pipeline(transaction=False)
+            for key in chunk:
+                pipe.exists(self._key(key))
+            results = await pipe.execute()
+            existing_ids.update(k for k, exists in zip(chunk, results) if exists)
         return set(data) - existing_ids
 
     async def upsert(self, data: dict[str, dict]):
-        pipe = self._redis.pipeline()
-        for k, v in tqdm_async(data.items(), desc="Upserting"):
-            pipe.set(f"{self.namespace}:{k}", json.dumps(v))
-        await pipe.execute()
+        items = list(data.items())
+        for chunk in tqdm_async(self._chunks(items), desc="Upserting"):
+            if self._layout == "hash":
+                await self._redis.hset(
+                    self.namespace, mapping={k: json.dumps(v) for k, v in chunk}
+                )
+                continue
+            # no MULTI/EXEC: a chunk is a plain pipeline, one round trip
+            pipe = self._redis.pipeline(transaction=False)
+            for k, v in chunk:
+                pipe.set(self._key(k), json.dumps(v))
+            await pipe.execute()
 
         for k in data:
             data[k]["_id"] = k
         return data
 
+    async def delete(self, ids: list[str]):
+        for chunk in self._chunks(list(ids)):
+            if self._layout == "hash":
+                await self._redis.hdel(self.namespace, *chunk)
+            else:
+                await self._redis.unlink(*[self._key(id) for id in chunk])
+
     async def drop(self):
-        keys = await self._redis.keys(f"{self.namespace}:*")
-        if keys:
-            await self._redis.delete(*keys)
+        if self._layout == "hash":
+            # UNLINK frees the hash in the background instead of blocking
+            await self._redis.unlink(self.namespace)
+            return
+        batch = []
+        async for key in self._scan_keys():
+            batch.append(key)
+            if len(batch) >= self._chunk_size:
+                await self._redis.unlink(*batch)
+                batch = []
+        if batch:
+            await self._redis.unlink(*batch)
@@ -1,7 +1,15 @@
-from minirag.llm.openai import (
-    gpt_4o_mini_complete,
-)
-from minirag.llm.hf import (
-    hf_embed,
-    hf_model_complete
-)
\ No newline at end of file
+from minirag.llm.openai import (
+    gpt_4o_mini_complete,
+)
+
+# minirag.llm.hf pulls in torch and transformers, import it only when one of
+# its functions is actually asked for (`from minirag.llm import hf_embed`)
+_LAZY_HF = ("hf_embed", "hf_model_complete")
+
+
+def __getattr__(name: str):
+    if name in _LAZY_HF:
+        from minirag.llm import hf
+
+        return getattr(hf, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -108,6 +108,8 @@ async def openai_complete_if_cache(
     )
     kwargs.pop("hashing_kv", None)
     kwargs.pop("keyword_extraction", None)
+    # optional object with add_usage(dict), gets the token usage of each call
+    token_tracker = kwargs.pop("token_tracker", None)
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
@@ -119,28 +121,47 @@ async def openai_complete_if_cache(
     logger.debug(f"Query: {prompt}")
     logger.debug(f"System prompt: {system_prompt}")
     logger.debug("Full context:")
-    if "response_format" in kwargs:
-        response = await openai_async_client.beta.chat.completions.parse(
-            model=model, messages=messages, **kwargs
-        )
-    else:
-        response = await openai_async_client.chat.completions.create(
-            model=model, messages=messages, **kwargs
-        )
-
+    try:
+        if "response_format" in kwargs:
+            response = await openai_async_client.beta.chat.completions.parse(
+                model=model, messages=messages, **kwargs
+            )
+        else:
+            response = await openai_async_client.chat.completions.create(
+                model=model, messages=messages, **kwargs
+            )
+    except BaseException:
+        await openai_async_client.close()
+        raise
+
+    # the client is created per call, close it so its connections do not
+    # stay open until garbage collection (piles up sockets under load)
     if hasattr(response, "__aiter__"):
 
         async def inner():
-            async for chunk in response:
-                content = chunk.choices[0].delta.content
-                if content is None:
-                    continue
-                if r"\u" in content:
-                    content = safe_unicode_decode(content.encode("utf-8"))
-                yield content
+            try:
+                async for chunk in response:
+                    content = chunk.choices[0].delta.content
+                    if content is None:
+                        continue
+                    if r"\u" in content:
+                        content = safe_unicode_decode(content.encode("utf-8"))
+                    yield content
+            finally:
+                await openai_async_client.close()
 
         return inner()
     else:
+        await openai_async_client.close()
+        usage = getattr(response, "usage", None)
+        if token_tracker is not None and usage is not None:
+            token_tracker.add_usage(
+                {
+                    "prompt_tokens": usage.prompt_tokens,
+                    "completion_tokens": usage.completion_tokens,
+                    "total_tokens": usage.total_tokens,
+                }
+            )
         if not response or not hasattr(response, "choices") or not response.choices:
             logger.error("No valid choices returned. Full response: %s", response)
             return ""  # or raise a more specific exception
@@ -260,7 +281,8 @@ async def openai_embed(
     openai_async_client = (
         AsyncOpenAI() if base_url is None else AsyncOpenAI(base_url=base_url)
     )
-    response = await openai_async_client.embeddings.create(
-        model=model, input=texts, encoding_format="float"
-    )
+    async with openai_async_client:
+        response = await openai_async_client.embeddings.create(
+            model=model, input=texts, encoding_format="float"
+        )
     return np.array([dp.embedding for dp in response.data])
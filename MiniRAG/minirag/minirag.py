@@ -1,9 +1,12 @@
 import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from functools import partial
-from typing import Type, cast, Any
+from types import MappingProxyType
+from typing import Type, cast, Any, Mapping
 from dotenv import load_dotenv
 
 
@@ -13,6 +16,7 @@ from .operate import (
     hybrid_query,
     minirag_query,
     naive_query,
+    retract_chunks,
 )
 
 from .utils import (
@@ -34,10 +38,12 @@ from .base import (
     QueryParam,
     DocStatus,
 )
+from . import tracing
 
 
 STORAGES = {
     "NetworkXStorage": ".kg.networkx_impl",
+    "CachedGraphStorage": ".kg.cached_graph_impl",
     "JsonKVStorage": ".kg.json_kv_impl",
     "NanoVectorDBStorage": ".kg.nano_vector_db_impl",
     "JsonDocStatusStorage": ".kg.jsondocstatus_impl",
@@ -65,6 +71,10 @@ STORAGES = {
     "run_sync": ".kg.weaviate_impl",
 }
 
+# KV backends with one table per known namespace (NAMESPACE_TABLE_MAP / N_T),
+# namespaces added later such as extraction_staging are kept in JsonKVStorage
+FIXED_NAMESPACE_KV_STORAGES = {"PGKVStorage", "OracleKVStorage", "TiDBKVStorage"}
+
 # future KG integrations
 
 # from .kg.ArangoDB_impl import (
@@ -142,6 +152,8 @@ class MiniRAG:
     # entity extraction
     entity_extract_max_gleaning: int = 1
     entity_summary_to_max_tokens: int = 500
+    # number of extracted chunks merged into the graph per checkpoint
+    entity_extract_checkpoint_size: int = 32
 
     # node embedding
     node_embedding_algorithm: str = "node2vec"
@@ -171,6 +183,9 @@ class MiniRAG:
 
     # storage
     vector_db_storage_cls_kwargs: dict = field(default_factory=dict)
+    # used with graph_storage="CachedGraphStorage":
+    # {"storage": "Neo4JStorage", "max_size": 10000, "ttl": 300}
+    graph_cache_params: dict = field(default_factory=dict)
 
     enable_llm_cache: bool = True
 
@@ -187,6 +202,36 @@ class MiniRAG:
 
     max_parallel_insert: int = field(default=int(os.getenv("MAX_PARALLEL_INSERT", 2)))
 
+    # threads used to load the storages in __post_init__, 1 = one after another
+    storage_init_workers: int = field(
+        default=int(os.getenv("STORAGE_INIT_WORKERS", 1))
+    )
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self.__dataclass_fields__:
+            # settings changed, rebuild the snapshot on next use
+            self.__dict__["_global_config"] = None
+
+    @property
+    def global_config(self) -> Mapping[str, Any]:
+        """Read-only snapshot of the settings, passed by reference to the
+        storages and query functions.
+
+        asdict deep-copies every field (the prompt in llm_model_kwargs, addon_params,
+        ...), so it is built once and rebuilt only after a field is reassigned.
+        Call refresh_config() after mutating a dict field in place.
+        """
+        config = self.__dict__.get("_global_config")
+        if config is None:
+            config = MappingProxyType(asdict(self))
+            self.__dict__["_global_config"] = config
+        return config
+
+    def refresh_config(self):
+        """Drop the cached global_config snapshot"""
+        self.__dict__["_global_config"] = None
+
     def __post_init__(self):
         log_file = os.path.join(self.working_dir, "minirag.log")
         set_logger(log_file)
@@ -198,7 +243,7 @@ class MiniRAG:
             os.makedirs(self.working_dir)
 
         # show config
-        global_config = asdict(self)
+        global_config = self.global_config
         _print_config = ",\n  ".join([f"{k} = {v}" for k, v in global_config.items()])
         logger.debug(f"MiniRAG init with param:\n  {_print_config}\n")
 
@@ -234,68 +279,87 @@ class MiniRAG:
             logger.info(f"Creating working directory {self.working_dir}")
             os.makedirs(self.working_dir)
 
-        self.llm_response_cache = (
-            self.key_string_value_json_storage_cls(
-                namespace="llm_response_cache",
-                global_config=asdict(self),
-                embedding_func=None,
-            )
-            if self.enable_llm_cache
-            else None
-        )
-
+        llm_cache_config = global_config
         self.embedding_func = limit_async_func_call(self.embedding_func_max_async)(
             self.embedding_func
         )
+        # rebuilt with the wrapped embedding_func
+        global_config = self.global_config
+        self.doc_status_storage_cls = self._get_storage_class(self.doc_status_storage)
 
-        ####
-        # add embedding func by walter
-        ####
-        self.full_docs = self.key_string_value_json_storage_cls(
-            namespace="full_docs",
-            global_config=asdict(self),
-            embedding_func=self.embedding_func,
-        )
-        self.text_chunks = self.key_string_value_json_storage_cls(
-            namespace="text_chunks",
-            global_config=asdict(self),
-            embedding_func=self.embedding_func,
-        )
-        self.chunk_entity_relation_graph = self.graph_storage_cls(
-            namespace="chunk_entity_relation",
-            global_config=asdict(self),
-            embedding_func=self.embedding_func,
-        )
-        ####
-        # add embedding func by walter over
-        ####
-
-        self.entities_vdb = self.vector_db_storage_cls(
-            namespace="entities",
-            global_config=asdict(self),
-            embedding_func=self.embedding_func,
-            meta_fields={"entity_name"},
-        )
-        global_config = asdict(self)
-
-        self.entity_name_vdb = self.vector_db_storage_cls(
-            namespace="entities_name",
-            global_config=asdict(self),
-            embedding_func=self.embedding_func,
-            meta_fields={"entity_name"},
-        )
-
-        self.relationships_vdb = self.vector_db_storage_cls(
-            namespace="relationships",
-            global_config=asdict(self),
-            embedding_func=self.embedding_func,
-            meta_fields={"src_id", "tgt_id"},
-        )
-        self.chunks_vdb = self.vector_db_storage_cls(
-            namespace="chunks",
-            global_config=asdict(self),
-            embedding_func=self.embedding_func,
-        )
+        # the storages are independent of each other and most of their start-up
+        # time is spent reading and decoding their files or connecting to a
+        # server, so they are built in parallel when storage_init_workers > 1
+        storage_factories = {
+            "full_docs": partial(
+                self.key_string_value_json_storage_cls,
+                namespace="full_docs",
+                global_config=global_config,
+                embedding_func=self.embedding_func,
+            ),
+            "text_chunks": partial(
+                self.key_string_value_json_storage_cls,
+                namespace="text_chunks",
+                global_config=global_config,
+                embedding_func=self.embedding_func,
+            ),
+            # per-chunk extraction results, used to resume an interrupted import
+            "extraction_staging": partial(
+                self._get_staging_storage_class(),
+                namespace="extraction_staging",
+                global_config=global_config,
+                embedding_func=None,
+            ),
+            "chunk_entity_relation_graph": partial(
+                self.graph_storage_cls,
+                namespace="chunk_entity_relation",
+                global_config=global_config,
+                embedding_func=self.embedding_func,
+            ),
+            "entities_vdb": partial(
+                self.vector_db_storage_cls,
+                namespace="entities",
+                global_config=global_config,
+                embedding_func=self.embedding_func,
+                meta_fields={"entity_name"},
+            ),
+            "entity_name_vdb": partial(
+                self.vector_db_storage_cls,
+                namespace="entities_name",
+                global_config=global_config,
+                embedding_func=self.embedding_func,
+                meta_fields={"entity_name"},
+            ),
+            "relationships_vdb": partial(
+                self.vector_db_storage_cls,
+                namespace="relationships",
+                global_config=global_config,
+                embedding_func=self.embedding_func,
+                meta_fields={"src_id", "tgt_id"},
+            ),
+            "chunks_vdb": partial(
+                self.vector_db_storage_cls,
+                namespace="chunks",
+                global_config=global_config,
+                embedding_func=self.embedding_func,
+            ),
+            "doc_status": partial(
+                self.doc_status_storage_cls,
+                namespace="doc_status",
+                global_config=global_config,
+                embedding_func=None,
+            ),
+        }
+        if self.enable_llm_cache:
+            storage_factories["llm_response_cache"] = partial(
+                self.key_string_value_json_storage_cls,
+                namespace="llm_response_cache",
+                global_config=llm_cache_config,
+                embedding_func=None,
+            )
+        else:
+            self.llm_response_cache = None
+        self._init_storages(storage_factories)
 
         self.llm_model_func = limit_async_func_call(self.llm_model_max_async)(
             partial(
@@ -304,12 +368,28 @@ class MiniRAG:
                 **self.llm_model_kwargs,
             )
         )
-        # Initialize document status storage
-        self.doc_status_storage_cls = self._get_storage_class(self.doc_status_storage)
-        self.doc_status = self.doc_status_storage_cls(
-            namespace="doc_status",
-            global_config=global_config,
-            embedding_func=None,
+
+    def _init_storages(self, factories: dict[str, callable]):
+        """Build the storages and set them as attributes, in parallel threads
+        when storage_init_workers > 1"""
+        start = time.perf_counter()
+        workers = min(self.storage_init_workers, len(factories))
+        if workers <= 1:
+            for name, factory in factories.items():
+                setattr(self, name, factory())
+        else:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="minirag-storage"
+            ) as executor:
+                futures = {
+                    name: executor.submit(factory) for name, factory in factories.items()
+                }
+                # result() re-raises the first storage error in the caller
+                for name, future in futures.items():
+                    setattr(self, name, future.result())
+        logger.info(
+            f"Initialized {len(factories)} storages in "
+            f"{time.perf_counter() - start:.2f}s ({max(workers, 1)} workers)"
         )
 
     def _get_storage_class(self, storage_name: str) -> dict:
@@ -317,6 +397,17 @@ class MiniRAG:
         storage_class = lazy_external_import(import_path, storage_name)
         return storage_class
 
+    def _get_staging_storage_class(self):
+        """KV storage for extraction_staging, JsonKVStorage when the configured
+        backend has no table for that namespace"""
+        if self.kv_storage not in FIXED_NAMESPACE_KV_STORAGES:
+            return self.key_string_value_json_storage_cls
+        logger.info(
+            f"{self.kv_storage} has no extraction_staging table, "
+            "staging extraction results in JsonKVStorage"
+        )
+        return self._get_storage_class("JsonKVStorage")
+
     def set_storage_client(self, db_client):
         # Now only tested on Oracle Database
         for storage in [
@@ -383,7 +474,8 @@ class MiniRAG:
                 entity_vdb=self.entities_vdb,
                 entity_name_vdb=self.entity_name_vdb,
                 relationships_vdb=self.relationships_vdb,
-                global_config=asdict(self),
+                global_config=self.global_config,
+                extraction_staging=self.extraction_staging,
             )
  
         await self._insert_done()
@@ -519,6 +611,7 @@ class MiniRAG:
             self.full_docs,
             self.text_chunks,
             self.llm_response_cache,
+            self.extraction_staging,
             self.entities_vdb,
             self.entity_name_vdb,
             self.relationships_vdb,
@@ -535,40 +628,53 @@ class MiniRAG:
         return loop.run_until_complete(self.aquery(query, param))
 
     async def aquery(self, query: str, param: QueryParam = QueryParam()):
-        if param.mode == "light":
-            response = await hybrid_query(
-                query,
-                self.chunk_entity_relation_graph,
-                self.entities_vdb,
-                self.relationships_vdb,
-                self.text_chunks,
-                param,
-                asdict(self),
-            )
-        elif param.mode == "mini":
-            response = await minirag_query(
-                query,
-                self.chunk_entity_relation_graph,
-                self.entities_vdb,
-                self.entity_name_vdb,
-                self.relationships_vdb,
-                self.chunks_vdb,
-                self.text_chunks,
-                self.embedding_func,
-                param,
-                asdict(self),
-            )
-        elif param.mode == "naive":
-            response = await naive_query(
-                query,
-                self.chunks_vdb,
-                self.text_chunks,
-                param,
-                asdict(self),
-            )
-        else:
-            raise ValueError(f"Unknown mode {param.mode}")
-        await self._query_done()
+        global_config = self.global_config
+        # one trace per query, every storage call below becomes a span
+        with tracing.trace(
+            "minirag.aquery",
+            mode=param.mode,
+            top_k=param.top_k,
+            only_need_context=param.only_need_context,
+        ):
+            graph = tracing.traced_storage(self.chunk_entity_relation_graph, "graph")
+            text_chunks = tracing.traced_storage(self.text_chunks, "kv")
+            entities_vdb = tracing.traced_storage(self.entities_vdb, "vdb")
+            relationships_vdb = tracing.traced_storage(self.relationships_vdb, "vdb")
+            chunks_vdb = tracing.traced_storage(self.chunks_vdb, "vdb")
+            if param.mode == "light":
+                response = await hybrid_query(
+                    query,
+                    graph,
+                    entities_vdb,
+                    relationships_vdb,
+                    text_chunks,
+                    param,
+                    global_config,
+                )
+            elif param.mode == "mini":
+                response = await minirag_query(
+                    query,
+                    graph,
+                    entities_vdb,
+                    tracing.traced_storage(self.entity_name_vdb, "vdb"),
+                    relationships_vdb,
+                    chunks_vdb,
+                    text_chunks,
+                    self.embedding_func,
+                    param,
+                    global_config,
+                )
+            elif param.mode == "naive":
+                response = await naive_query(
+                    query,
+                    chunks_vdb,
+                    text_chunks,
+                    param,
+                    global_config,
+                )
+            else:
+                raise ValueError(f"Unknown mode {param.mode}")
+            await self._query_done()
         return response
 
     async def _query_done(self):
@@ -598,6 +704,53 @@ class MiniRAG:
         except Exception as e:
             logger.error(f"Error while deleting entity '{entity_name}': {e}")
 
+    def delete_by_doc_id(self, doc_id: str):
+        loop = always_get_an_event_loop()
+        return loop.run_until_complete(self.adelete_by_doc_id(doc_id))
+
+    async def adelete_by_doc_id(self, doc_id: str):
+        """Remove a document, its chunks and what they contributed to the graph"""
+        status_doc = await self.doc_status.get_by_id(doc_id)
+        if status_doc is None:
+            logger.warning(f"Document {doc_id} not found, nothing to delete")
+            return
+
+        chunk_ids = list(
+            {
+                compute_mdhash_id(dp["content"], prefix="chunk-")
+                for dp in self.chunking_func(
+                    status_doc["content"],
+                    self.chunk_overlap_token_size,
+                    self.chunk_token_size,
+                    self.tiktoken_model_name,
+                )
+            }
+        )
+        # identical chunks are shared between documents, keep the ones owned by another doc
+        chunks = await self.text_chunks.get_by_ids(chunk_ids)
+        chunk_ids = [
+            chunk_id
+            for chunk_id, chunk in zip(chunk_ids, chunks)
+            if chunk is None or chunk.get("full_doc_id") == doc_id
+        ]
+
+        await retract_chunks(
+            chunk_ids,
+            knowledge_graph_inst=self.chunk_entity_relation_graph,
+            entity_vdb=self.entities_vdb,
+            entity_name_vdb=self.entity_name_vdb,
+            relationships_vdb=self.relationships_vdb,
+            extraction_staging=self.extraction_staging,
+        )
+        await asyncio.gather(
+            self.chunks_vdb.delete(chunk_ids),
+            self.text_chunks.delete(chunk_ids),
+            self.full_docs.delete([doc_id]),
+        )
+        await self.doc_status.delete([doc_id])
+        logger.info(f"Document {doc_id} and {len(chunk_ids)} chunks deleted")
+        await self._insert_done()
+
     async def _delete_by_entity_done(self):
         tasks = []
         for storage_inst in [
@@ -1,6 +1,7 @@
 import asyncio
 import json
 import re
+import time
 from typing import Union
 from collections import Counter, defaultdict
 import warnings
@@ -9,10 +10,10 @@ import json_repair
 from .utils import (
     list_of_list_to_csv,
     truncate_list_by_token_size,
+    count_tokens_by_tiktoken,
     split_string_by_multi_markers,
     logger,
     locate_json_string_body_from_string,
-    process_combine_contexts,
     clean_str,
     edge_vote_path,
     encode_string_by_tiktoken,
@@ -29,8 +30,13 @@ from .base import (
     BaseVectorStorage,
     TextChunkSchema,
     QueryParam,
+    QueryContext,
+    ContextEntity,
+    ContextRelation,
+    ContextSource,
 )
 from .prompt import GRAPH_FIELD_SEP, PROMPTS
+from . import tracing
 
 
 def chunking_by_token_size(
@@ -114,120 +120,155 @@ async def _handle_single_relationship_extraction(
     )
 
 
-async def _merge_nodes_then_upsert(
-    entity_name: str,
+def _merge_nodes_data(
     nodes_data: list[dict],
-    knowledge_graph_inst: BaseGraphStorage,
-    global_config: dict,
-):
+    already_node: Union[dict, None],
+) -> dict:
     already_entitiy_types = []
     already_source_ids = []
     already_description = []
 
-    already_node = await knowledge_graph_inst.get_node(entity_name)
     if already_node is not None:
         already_entitiy_types.append(already_node["entity_type"])
         already_source_ids.extend(
             split_string_by_multi_markers(already_node["source_id"], [GRAPH_FIELD_SEP])
         )
-        already_description.append(already_node["description"])
+        already_description.extend(
+            split_string_by_multi_markers(already_node["description"], [GRAPH_FIELD_SEP])
+        )
 
+    # Chunks already recorded in source_id were merged by an earlier (possibly
+    # interrupted) run, so they must not be counted twice.
+    new_nodes_data = [
+        dp for dp in nodes_data if dp["source_id"] not in already_source_ids
+    ]
     entity_type = sorted(
         Counter(
-            [dp["entity_type"] for dp in nodes_data] + already_entitiy_types
+            [dp["entity_type"] for dp in new_nodes_data] + already_entitiy_types
         ).items(),
         key=lambda x: x[1],
         reverse=True,
     )[0][0]
 
     description = GRAPH_FIELD_SEP.join(
-        sorted(set([dp["description"] for dp in nodes_data] + already_description))
+        sorted(set([dp["description"] for dp in new_nodes_data] + already_description))
     )
     source_id = GRAPH_FIELD_SEP.join(
-        set([dp["source_id"] for dp in nodes_data] + already_source_ids)
+        set([dp["source_id"] for dp in new_nodes_data] + already_source_ids)
     )
 
     # description = await _handle_entity_relation_summary(
     #     entity_name, description, global_config
     # )
-    node_data = dict(
+    return dict(
         entity_type=entity_type,
         description=description,
+        # read by truncate_list_by_token_size at query time
+        description_tokens=count_tokens_by_tiktoken(description),
         source_id=source_id,
     )
-    await knowledge_graph_inst.upsert_node(
-        entity_name,
-        node_data=node_data,
-    )
-    node_data["entity_name"] = entity_name
-    return node_data
 
 
-async def _merge_edges_then_upsert(
-    src_id: str,
-    tgt_id: str,
+def _merge_edges_data(
     edges_data: list[dict],
-    knowledge_graph_inst: BaseGraphStorage,
-    global_config: dict,
-):
+    already_edge: Union[dict, None],
+) -> dict:
     already_weights = []
     already_source_ids = []
     already_description = []
     already_keywords = []
 
-    if await knowledge_graph_inst.has_edge(src_id, tgt_id):
-        already_edge = await knowledge_graph_inst.get_edge(src_id, tgt_id)
+    if already_edge is not None:
         already_weights.append(already_edge["weight"])
         already_source_ids.extend(
             split_string_by_multi_markers(already_edge["source_id"], [GRAPH_FIELD_SEP])
         )
-        already_description.append(already_edge["description"])
+        already_description.extend(
+            split_string_by_multi_markers(already_edge["description"], [GRAPH_FIELD_SEP])
+        )
         already_keywords.extend(
             split_string_by_multi_markers(already_edge["keywords"], [GRAPH_FIELD_SEP])
         )
 
-    weight = sum([dp["weight"] for dp in edges_data] + already_weights)
+    # Same as for nodes: a chunk that is already part of source_id has
+    # contributed its weight, description and keywords before.
+    new_edges_data = [
+        dp for dp in edges_data if dp["source_id"] not in already_source_ids
+    ]
+    weight = sum([dp["weight"] for dp in new_edges_data] + already_weights)
     description = GRAPH_FIELD_SEP.join(
-        sorted(set([dp["description"] for dp in edges_data] + already_description))
+        sorted(set([dp["description"] for dp in new_edges_data] + already_description))
     )
     keywords = GRAPH_FIELD_SEP.join(
-        sorted(set([dp["keywords"] for dp in edges_data] + already_keywords))
+        sorted(set([dp["keywords"] for dp in new_edges_data] + already_keywords))
     )
     source_id = GRAPH_FIELD_SEP.join(
-        set([dp["source_id"] for dp in edges_data] + already_source_ids)
+        set([dp["source_id"] for dp in new_edges_data] + already_source_ids)
     )
-    for need_insert_id in [src_id, tgt_id]:
-        if not (await knowledge_graph_inst.has_node(need_insert_id)):
-            await knowledge_graph_inst.upsert_node(
-                need_insert_id,
-                node_data={
-                    "source_id": source_id,
-                    "description": description,
-                    "entity_type": '"UNKNOWN"',
-                },
-            )
     # description = await _handle_entity_relation_summary(
     #     (src_id, tgt_id), description, global_config
     # )
-    await knowledge_graph_inst.upsert_edge(
-        src_id,
-        tgt_id,
-        edge_data=dict(
-            weight=weight,
-            description=description,
-            keywords=keywords,
-            source_id=source_id,
-        ),
-    )
-
-    edge_data = dict(
-        src_id=src_id,
-        tgt_id=tgt_id,
+    return dict(
+        weight=weight,
         description=description,
+        description_tokens=count_tokens_by_tiktoken(description),
         keywords=keywords,
+        source_id=source_id,
     )
 
-    return edge_data
+
+async def _merge_nodes_and_edges_then_upsert(
+    maybe_nodes: dict[str, list[dict]],
+    maybe_edges: dict[tuple[str, str], list[dict]],
+    knowledge_graph_inst: BaseGraphStorage,
+) -> tuple[list[dict], list[dict]]:
+    """Merge extracted nodes and edges with what the graph already holds.
+
+    Existing nodes are read with one bulk call and everything is written back
+    with one bulk upsert for nodes and one for edges, so a checkpoint costs a
+    handful of round trips instead of several per entity.
+    """
+    edge_keys = list(maybe_edges.keys())
+    already_nodes = await knowledge_graph_inst.get_nodes_bulk(
+        list(set(maybe_nodes) | {node_id for k in edge_keys for node_id in k})
+    )
+    already_edges = await knowledge_graph_inst.get_edges(edge_keys)
+
+    nodes_to_upsert = {}
+    entities_data = []
+    for entity_name, nodes_data in maybe_nodes.items():
+        node_data = _merge_nodes_data(nodes_data, already_nodes.get(entity_name))
+        nodes_to_upsert[entity_name] = node_data
+        entities_data.append({**node_data, "entity_name": entity_name})
+
+    edges_to_upsert = []
+    relationships_data = []
+    for src_id, tgt_id in edge_keys:
+        edge_data = _merge_edges_data(
+            maybe_edges[(src_id, tgt_id)], already_edges.get((src_id, tgt_id))
+        )
+        for need_insert_id in [src_id, tgt_id]:
+            if need_insert_id in already_nodes or need_insert_id in nodes_to_upsert:
+                continue
+            nodes_to_upsert[need_insert_id] = {
+                "source_id": edge_data["source_id"],
+                "description": edge_data["description"],
+                "description_tokens": edge_data["description_tokens"],
+                "entity_type": '"UNKNOWN"',
+            }
+        edges_to_upsert.append((src_id, tgt_id, edge_data))
+        relationships_data.append(
+            dict(
+                src_id=src_id,
+                tgt_id=tgt_id,
+                description=edge_data["description"],
+                keywords=edge_data["keywords"],
+            )
+        )
+
+    await knowledge_graph_inst.upsert_nodes_bulk(nodes_to_upsert)
+    await knowledge_graph_inst.upsert_edges_bulk(edges_to_upsert)
+    return entities_data, relationships_data
 
 
 async def extract_entities(
@@ -237,11 +278,45 @@ async def extract_entities(
     entity_name_vdb: BaseVectorStorage,
     relationships_vdb: BaseVectorStorage,
     global_config: dict,
+    extraction_staging: BaseKVStorage = None,
 ) -> Union[BaseGraphStorage, None]:
+    """Extract entities and relations from chunks and merge them into the graph.
+
+    When ``extraction_staging`` is given, the raw extraction result of every
+    chunk is persisted there as soon as it completes, and chunks that already
+    have a staged result are not sent to the LLM again. Results are merged
+    into the graph and vector stores every ``entity_extract_checkpoint_size``
+    chunks and their staged records are then flagged as merged, so an
+    interrupted run only has to redo the unfinished chunks and merges.
+    """
     use_llm_func: callable = global_config["llm_model_func"]
     entity_extract_max_gleaning = global_config["entity_extract_max_gleaning"]
+    checkpoint_size = max(1, global_config.get("entity_extract_checkpoint_size", 32))
+
+    staged_results = {}
+    merged_keys = set()
+    if extraction_staging is not None:
+        pending_keys = await extraction_staging.filter_keys(list(chunks.keys()))
+        staged_keys = [k for k in chunks if k not in pending_keys]
+        if staged_keys:
+            staged_records = await extraction_staging.get_by_ids(staged_keys)
+            for k, record in zip(staged_keys, staged_records):
+                if record is None:
+                    continue
+                if record.get("merged"):
+                    merged_keys.add(k)
+                else:
+                    staged_results[k] = _unpack_staged_extraction(record)
+            logger.info(
+                f"Reusing staged extraction results for {len(staged_results)} chunks, "
+                f"{len(merged_keys)} chunks already merged"
+            )
 
-    ordered_chunks = list(chunks.items())
+    ordered_chunks = [
+        (k, v)
+        for k, v in chunks.items()
+        if k not in staged_results and k not in merged_keys
+    ]
     # if global_config['RAGmode'] == 'minirag':
     #     # entity_extract_prompt = PROMPTS["entity_extraction_noDes"]
     #     entity_extract_prompt = PROMPTS["entity_extraction"]
@@ -328,84 +403,298 @@ async def extract_entities(
         )
         return dict(maybe_nodes), dict(maybe_edges)
 
+    all_entities_data = []
+    all_relationships_data = []
+    pending_results: dict[str, tuple[dict, dict]] = dict(staged_results)
+    checkpoint_lock = asyncio.Lock()
+
+    async def _merge_and_upsert(results: list[tuple[dict, dict]]):
+        maybe_nodes = defaultdict(list)
+        maybe_edges = defaultdict(list)
+        for m_nodes, m_edges in results:
+            for k, v in m_nodes.items():
+                maybe_nodes[k].extend(v)
+            for k, v in m_edges.items():
+                maybe_edges[tuple(sorted(k))].extend(v)
+        entities_data, relationships_data = await _merge_nodes_and_edges_then_upsert(
+            maybe_nodes, maybe_edges, knowledge_graph_inst
+        )
+        all_entities_data.extend(entities_data)
+        all_relationships_data.extend(relationships_data)
+
+        if entity_vdb is not None and entities_data:
+            data_for_vdb = {
+                compute_mdhash_id(dp["entity_name"], prefix="ent-"): {
+                    "content": dp["entity_name"] + " " + dp["description"],
+                    "entity_name": dp["entity_name"],
+                }
+                for dp in entities_data
+            }
+            await entity_vdb.upsert(data_for_vdb)
+
+        if entity_name_vdb is not None and entities_data:
+            data_for_vdb = {
+                compute_mdhash_id(dp["entity_name"], prefix="Ename-"): {
+                    "content": dp["entity_name"],
+                    "entity_name": dp["entity_name"],
+                }
+                for dp in entities_data
+            }
+            await entity_name_vdb.upsert(data_for_vdb)
+
+        if relationships_vdb is not None and relationships_data:
+            data_for_vdb = {
+                compute_mdhash_id(dp["src_id"] + dp["tgt_id"], prefix="rel-"): {
+                    "src_id": dp["src_id"],
+                    "tgt_id": dp["tgt_id"],
+                    "content": dp["keywords"]
+                    + " " + dp["src_id"]
+                    + " " + dp["tgt_id"]
+                    + " " + dp["description"],
+                }
+                for dp in relationships_data
+            }
+            await relationships_vdb.upsert(data_for_vdb)
+
+    async def _checkpoint(force: bool = False):
+        async with checkpoint_lock:
+            if not pending_results:
+                return
+            if not force and len(pending_results) < checkpoint_size:
+                return
+            batch = dict(pending_results)
+            pending_results.clear()
+
+            await _merge_and_upsert(list(batch.values()))
+            await asyncio.gather(
+                *[
+                    storage_inst.index_done_callback()
+                    for storage_inst in [
+                        knowledge_graph_inst,
+                        entity_vdb,
+                        entity_name_vdb,
+                        relationships_vdb,
+                    ]
+                    if storage_inst is not None
+                ]
+            )
+            if extraction_staging is not None:
+                await extraction_staging.replace(
+                    {
+                        k: _pack_staged_extraction(*result, merged=True)
+                        for k, result in batch.items()
+                    }
+                )
+                await extraction_staging.index_done_callback()
+
+    staged_since_flush = 0
+
+    async def _process_and_stage(chunk_key_dp: tuple[str, TextChunkSchema]):
+        nonlocal staged_since_flush
+        chunk_key = chunk_key_dp[0]
+        result = await _process_single_content(chunk_key_dp)
+        if extraction_staging is not None:
+            # staged before it can be merged, so the merged flag set by the
+            # checkpoint is never overwritten by this unmerged record
+            await extraction_staging.upsert(
+                {chunk_key: _pack_staged_extraction(*result)}
+            )
+            staged_since_flush += 1
+            if staged_since_flush >= checkpoint_size:
+                staged_since_flush = 0
+                await extraction_staging.index_done_callback()
+        pending_results[chunk_key] = result
+        await _checkpoint()
+
     # use_llm_func is wrapped in ascynio.Semaphore, limiting max_async callings
-    results = await asyncio.gather(
-        *[_process_single_content(c) for c in ordered_chunks]
-    )
+    try:
+        await asyncio.gather(*[_process_and_stage(c) for c in ordered_chunks])
+    finally:
+        # keep whatever was extracted, even if a chunk failed
+        if extraction_staging is not None and staged_since_flush:
+            await extraction_staging.index_done_callback()
+    await _checkpoint(force=True)
     print()  # clear the progress bar
-    maybe_nodes = defaultdict(list)
-    maybe_edges = defaultdict(list)
-    for m_nodes, m_edges in results:
-        for k, v in m_nodes.items():
-            maybe_nodes[k].extend(v)
-        for k, v in m_edges.items():
-            maybe_edges[tuple(sorted(k))].extend(v)
-    all_entities_data = await asyncio.gather(
-        *[
-            _merge_nodes_then_upsert(k, v, knowledge_graph_inst, global_config)
-            for k, v in maybe_nodes.items()
-        ]
-    )
-    all_relationships_data = await asyncio.gather(
-        *[
-            _merge_edges_then_upsert(k[0], k[1], v, knowledge_graph_inst, global_config)
-            for k, v in maybe_edges.items()
-        ]
-    )
-    if not len(all_entities_data):
+
+    # only chunks sent to the LLM in this run can tell whether it is working,
+    # a resume with every chunk already merged has nothing to extract
+    if ordered_chunks and not already_entities:
         logger.warning("Didn't extract any entities, maybe your LLM is not working")
         return None
-    if not len(all_relationships_data):
+    if ordered_chunks and not already_relations:
         logger.warning(
             "Didn't extract any relationships, maybe your LLM is not working"
         )
         return None
 
-    if entity_vdb is not None:
-        data_for_vdb = {
-            compute_mdhash_id(dp["entity_name"], prefix="ent-"): {
-                "content": dp["entity_name"] + dp["description"],
-                "entity_name": dp["entity_name"],
-            }
-            for dp in all_entities_data
-        }
-        await entity_vdb.upsert(data_for_vdb)
-    if entity_vdb is not None:
-        data_for_vdb = {
-            compute_mdhash_id(dp["entity_name"], prefix="ent-"): {
-                "content": dp["entity_name"] + " " + dp["description"],
-                "entity_name": dp["entity_name"],
-            }
-            for dp in all_entities_data
-        }
-        await entity_vdb.upsert(data_for_vdb)
+    return knowledge_graph_inst
 
-    if entity_name_vdb is not None:
-        data_for_vdb = {
-            compute_mdhash_id(dp["entity_name"], prefix="Ename-"): {
-                "content": dp["entity_name"],
-                "entity_name": dp["entity_name"],
-            }
-            for dp in all_entities_data
-        }
-        await entity_name_vdb.upsert(data_for_vdb)
-
-    if relationships_vdb is not None:
-        data_for_vdb = {
-            compute_mdhash_id(dp["src_id"] + dp["tgt_id"], prefix="rel-"): {
-                "src_id": dp["src_id"],
-                "tgt_id": dp["tgt_id"],
-                "content": dp["keywords"]
-                + " " + dp["src_id"]
-                + " " + dp["tgt_id"]
-                + " " + dp["description"],
-            }
-            for dp in all_relationships_data
+
+async def retract_chunks(
+    chunk_ids: list[str],
+    knowledge_graph_inst: BaseGraphStorage,
+    entity_vdb: BaseVectorStorage,
+    entity_name_vdb: BaseVectorStorage,
+    relationships_vdb: BaseVectorStorage,
+    extraction_staging: BaseKVStorage,
+):
+    """Undo what the given chunks contributed to the graph and vector stores.
+
+    The staged extraction results tell which entities and relations each chunk
+    produced. The chunk ids are removed from their source_id and the edge
+    weight they added is subtracted; nodes and edges left without any source
+    are deleted. Merged descriptions are left as they are.
+    """
+    removed = list(set(chunk_ids))
+    staged_records = await extraction_staging.get_by_ids(removed)
+
+    entity_names = set()
+    removed_weights = defaultdict(dict)
+    for chunk_id, record in zip(removed, staged_records):
+        if record is None:
+            continue
+        maybe_nodes, maybe_edges = _unpack_staged_extraction(record)
+        entity_names.update(maybe_nodes)
+        for k, v in maybe_edges.items():
+            edge_key = tuple(sorted(k))
+            entity_names.update(edge_key)
+            removed_weights[edge_key][chunk_id] = sum(dp["weight"] for dp in v)
+
+    def _split_sources(data: dict) -> list[str]:
+        return split_string_by_multi_markers(
+            data.get("source_id", ""), [GRAPH_FIELD_SEP]
+        )
+
+    already_edges = await knowledge_graph_inst.get_edges(list(removed_weights))
+    edges_to_upsert = []
+    edges_to_delete = set()
+    for edge_key, edge in already_edges.items():
+        sources = _split_sources(edge)
+        remaining = [s for s in sources if s not in removed]
+        if not remaining:
+            edges_to_delete.add(edge_key)
+            continue
+        # only chunks still listed in source_id have their weight in the edge
+        weight = edge["weight"] - sum(
+            w for chunk_id, w in removed_weights[edge_key].items() if chunk_id in sources
+        )
+        edges_to_upsert.append(
+            (
+                *edge_key,
+                {**edge, "weight": weight, "source_id": GRAPH_FIELD_SEP.join(remaining)},
+            )
+        )
+
+    already_nodes = await knowledge_graph_inst.get_nodes_bulk(list(entity_names))
+    nodes_to_upsert = {}
+    nodes_to_delete = []
+    for entity_name, node in already_nodes.items():
+        remaining = [s for s in _split_sources(node) if s not in removed]
+        if remaining:
+            nodes_to_upsert[entity_name] = {"source_id": GRAPH_FIELD_SEP.join(remaining)}
+            continue
+        # a relation from another chunk may still point at this node
+        node_edges = await knowledge_graph_inst.get_node_edges(entity_name) or []
+        if all(tuple(sorted(e)) in edges_to_delete for e in node_edges):
+            nodes_to_delete.append(entity_name)
+        else:
+            nodes_to_upsert[entity_name] = {"source_id": node.get("source_id", "")}
+
+    await knowledge_graph_inst.upsert_nodes_bulk(
+        {k: v for k, v in nodes_to_upsert.items() if v["source_id"]}
+    )
+    await knowledge_graph_inst.upsert_edges_bulk(edges_to_upsert)
+    deleted_nodes = set()
+    for entity_name in nodes_to_delete:
+        try:
+            await knowledge_graph_inst.delete_node(entity_name)
+        except NotImplementedError:
+            logger.warning(
+                f"{type(knowledge_graph_inst).__name__} cannot delete nodes, "
+                f"keeping {entity_name}"
+            )
+        else:
+            deleted_nodes.add(entity_name)
+    for src_id, tgt_id in edges_to_delete:
+        # deleting a node already removed its edges
+        if src_id in deleted_nodes or tgt_id in deleted_nodes:
+            continue
+        try:
+            await knowledge_graph_inst.delete_edge(src_id, tgt_id)
+        except NotImplementedError:
+            logger.warning(
+                f"{type(knowledge_graph_inst).__name__} cannot delete edges, "
+                f"keeping {src_id} -> {tgt_id}"
+            )
+
+    async def _delete_vectors(storage: BaseVectorStorage, ids: list[str]):
+        if storage is None or not ids:
+            return
+        try:
+            await storage.delete(ids)
+        except NotImplementedError:
+            logger.warning(
+                f"{type(storage).__name__} cannot delete vectors, {len(ids)} kept"
+            )
+
+    await asyncio.gather(
+        _delete_vectors(
+            entity_vdb, [compute_mdhash_id(n, prefix="ent-") for n in deleted_nodes]
+        ),
+        _delete_vectors(
+            entity_name_vdb,
+            [compute_mdhash_id(n, prefix="Ename-") for n in deleted_nodes],
+        ),
+        _delete_vectors(
+            relationships_vdb,
+            [compute_mdhash_id(s + t, prefix="rel-") for s, t in edges_to_delete],
+        ),
+    )
+    await extraction_staging.delete(removed)
+    logger.info(
+        f"Retracted {len(removed)} chunks: {len(deleted_nodes)} entities and "
+        f"{len(edges_to_delete)} relations deleted"
+    )
+
+
+def _pack_staged_extraction(
+    maybe_nodes: dict, maybe_edges: dict, merged: bool = False
+) -> dict:
+    """Flatten one chunk's extraction result into a JSON-serializable record.
+
+    ``merged`` records that the result is already part of the graph and the
+    vector stores, such chunks are left out of later merges. Merged records
+    only keep what retract_chunks needs: entity names and edge weights.
+    """
+    if merged:
+        return {
+            "nodes": [{"entity_name": name} for name in maybe_nodes],
+            "edges": [
+                {
+                    "src_id": src_id,
+                    "tgt_id": tgt_id,
+                    "weight": sum(dp["weight"] for dp in dps),
+                }
+                for (src_id, tgt_id), dps in maybe_edges.items()
+            ],
+            "merged": True,
         }
+    return {
+        "nodes": [dp for dps in maybe_nodes.values() for dp in dps],
+        "edges": [dp for dps in maybe_edges.values() for dp in dps],
+        "merged": False,
+    }
 
-        await relationships_vdb.upsert(data_for_vdb)
 
-    return knowledge_graph_inst
+def _unpack_staged_extraction(record: dict) -> tuple[dict, dict]:
+    """Rebuild the (maybe_nodes, maybe_edges) pair from a staged record"""
+    maybe_nodes = defaultdict(list)
+    maybe_edges = defaultdict(list)
+    for dp in record.get("nodes", []):
+        maybe_nodes[dp["entity_name"]].append(dp)
+    for dp in record.get("edges", []):
+        maybe_edges[(dp["src_id"], dp["tgt_id"])].append(dp)
+    return dict(maybe_nodes), dict(maybe_edges)
 
 
 async def local_query(
@@ -422,7 +711,8 @@ async def local_query(
 
     kw_prompt_temp = PROMPTS["keywords_extraction"]
     kw_prompt = kw_prompt_temp.format(query=query)
-    result = await use_model_func(kw_prompt)
+    with tracing.span("llm.keywords"):
+        result = await use_model_func(kw_prompt)
     json_text = locate_json_string_body_from_string(result)
 
     try:
@@ -454,6 +744,8 @@ async def local_query(
             text_chunks_db,
             query_param,
         )
+    if context is not None:
+        context = context.render()
     if query_param.only_need_context:
         return context
     if context is None:
@@ -462,10 +754,11 @@ async def local_query(
     sys_prompt = sys_prompt_temp.format(
         context_data=context, response_type=query_param.response_type
     )
-    response = await use_model_func(
-        query,
-        system_prompt=sys_prompt,
-    )
+    with tracing.span("llm.response"):
+        response = await use_model_func(
+            query,
+            system_prompt=sys_prompt,
+        )
     if len(response) > len(sys_prompt):
         response = (
             response.replace(sys_prompt, "")
@@ -491,80 +784,44 @@ async def _build_local_query_context(
 
     if not len(results):
         return None
-    node_datas = await asyncio.gather(
-        *[knowledge_graph_inst.get_node(r["entity_name"]) for r in results]
-    )
-    if not all([n is not None for n in node_datas]):
+    entity_names = [r["entity_name"] for r in results]
+    # node data, degree and adjacency in one batched lookup
+    neighbourhoods = await knowledge_graph_inst.get_node_neighbourhoods(entity_names)
+    if len(neighbourhoods) < len(set(entity_names)):
         logger.warning("Some nodes are missing, maybe the storage is damaged")
-    node_degrees = await asyncio.gather(
-        *[knowledge_graph_inst.node_degree(r["entity_name"]) for r in results]
-    )
     node_datas = [
-        {**n, "entity_name": k["entity_name"], "rank": d}
-        for k, n, d in zip(results, node_datas, node_degrees)
-        if n is not None
+        {
+            **neighbourhoods[k]["node"],
+            "entity_name": k,
+            "rank": neighbourhoods[k]["degree"],
+        }
+        for k in entity_names
+        if k in neighbourhoods
     ]  # what is this text_chunks_db doing.  dont remember it in airvx.  check the diagram.
+    node_edges = {k: v["edges"] for k, v in neighbourhoods.items()}
     use_text_units = await _find_most_related_text_unit_from_entities(
-        node_datas, query_param, text_chunks_db, knowledge_graph_inst
+        node_datas, node_edges, query_param, text_chunks_db, knowledge_graph_inst
     )
     use_relations = await _find_most_related_edges_from_entities(
-        node_datas, query_param, knowledge_graph_inst
+        node_datas, node_edges, query_param, knowledge_graph_inst
     )
     logger.info(
         f"Local query uses {len(node_datas)} entites, {len(use_relations)} relations, {len(use_text_units)} text units"
     )
-    entites_section_list = [["id", "entity", "type", "description", "rank"]]
-    for i, n in enumerate(node_datas):
-        entites_section_list.append(
-            [
-                i,
-                n["entity_name"],
-                n.get("entity_type", "UNKNOWN"),
-                n.get("description", "UNKNOWN"),
-                n["rank"],
-            ]
-        )
-    entities_context = list_of_list_to_csv(entites_section_list)
+    return QueryContext(
+        entities=[_context_entity(n) for n in node_datas],
+        relations=[_context_relation(e, *e["src_tgt"]) for e in use_relations],
+        sources=[_context_source(t) for t in use_text_units],
+    )
 
-    relations_section_list = [
-        ["id", "source", "target", "description", "keywords", "weight", "rank"]
-    ]
-    for i, e in enumerate(use_relations):
-        relations_section_list.append(
-            [
-                i,
-                e["src_tgt"][0],
-                e["src_tgt"][1],
-                e["description"],
-                e["keywords"],
-                e["weight"],
-                e["rank"],
-            ]
-        )
-    relations_context = list_of_list_to_csv(relations_section_list)
 
-    text_units_section_list = [["id", "content"]]
-    for i, t in enumerate(use_text_units):
-        text_units_section_list.append([i, t["content"]])
-    text_units_context = list_of_list_to_csv(text_units_section_list)
-    return f"""
------Entities-----
-```csv
-{entities_context}
-```
------Relationships-----
-```csv
-{relations_context}
-```
------Sources-----
-```csv
-{text_units_context}
-```
-"""
+# chunk fields read when building a query context
+_CHUNK_CONTEXT_FIELDS = {"content", "tokens"}
 
 
 async def _find_most_related_text_unit_from_entities(
     node_datas: list[dict],
+    node_edges: dict[str, list[tuple[str, str]]],
     query_param: QueryParam,
     text_chunks_db: BaseKVStorage[TextChunkSchema],
     knowledge_graph_inst: BaseGraphStorage,
@@ -573,55 +830,51 @@ async def _find_most_related_text_unit_from_entities(
         split_string_by_multi_markers(dp["source_id"], [GRAPH_FIELD_SEP])
         for dp in node_datas
     ]
-    edges = await asyncio.gather(
-        *[knowledge_graph_inst.get_node_edges(dp["entity_name"]) for dp in node_datas]
-    )
+    edges = [node_edges.get(dp["entity_name"]) for dp in node_datas]
     all_one_hop_nodes = set()
     for this_edges in edges:
         if not this_edges:
             continue
         all_one_hop_nodes.update([e[1] for e in this_edges])
 
-    all_one_hop_nodes = list(all_one_hop_nodes)
-    all_one_hop_nodes_data = await asyncio.gather(
-        *[knowledge_graph_inst.get_node(e) for e in all_one_hop_nodes]
+    all_one_hop_nodes_data = await knowledge_graph_inst.get_nodes_bulk(
+        list(all_one_hop_nodes)
     )
 
-    # Add null check for node data
-    all_one_hop_text_units_lookup = {
-        k: set(split_string_by_multi_markers(v["source_id"], [GRAPH_FIELD_SEP]))
-        for k, v in zip(all_one_hop_nodes, all_one_hop_nodes_data)
-        if v is not None and "source_id" in v  # Add source_id check
-    }
+    # chunk id -> one-hop nodes whose source_id lists the chunk
+    chunk_one_hop_nodes = defaultdict(set)
+    for k, v in all_one_hop_nodes_data.items():
+        if v is not None and "source_id" in v:  # Add source_id check
+            for c_id in split_string_by_multi_markers(v["source_id"], [GRAPH_FIELD_SEP]):
+                chunk_one_hop_nodes[c_id].add(k)
 
+    # first entity that mentions a chunk decides its order and relation count,
+    # the count being how many of that entity's neighbours share the chunk
     all_text_units_lookup = {}
     for index, (this_text_units, this_edges) in enumerate(zip(text_units, edges)):
+        neighbours = {e[1] for e in this_edges or []}
         for c_id in this_text_units:
             if c_id in all_text_units_lookup:
                 continue
-            relation_counts = 0
-            if this_edges:  # Add check for None edges
-                for e in this_edges:
-                    if (
-                        e[1] in all_one_hop_text_units_lookup
-                        and c_id in all_one_hop_text_units_lookup[e[1]]
-                    ):
-                        relation_counts += 1
-
-            chunk_data = await text_chunks_db.get_by_id(c_id)
-            if chunk_data is not None and "content" in chunk_data:  # Add content check
-                all_text_units_lookup[c_id] = {
-                    "data": chunk_data,
-                    "order": index,
-                    "relation_counts": relation_counts,
-                }
+            all_text_units_lookup[c_id] = {
+                "order": index,
+                "relation_counts": len(chunk_one_hop_nodes.get(c_id, set()) & neighbours),
+            }
 
-    # Filter out None values and ensure data has content
-    all_text_units = [
-        {"id": k, **v}
-        for k, v in all_text_units_lookup.items()
-        if v is not None and v.get("data") is not None and "content" in v["data"]
-    ]
+    # one round trip for all chunks, only the fields the context needs
+    chunk_ids = list(all_text_units_lookup)
+    chunk_datas = (
+        await text_chunks_db.get_by_ids(chunk_ids, fields=_CHUNK_CONTEXT_FIELDS)
+        if chunk_ids
+        else []
+    )
+    for c_id, chunk_data in zip(chunk_ids, chunk_datas):
+        if chunk_data is not None and "content" in chunk_data:  # Add content check
+            all_text_units_lookup[c_id]["data"] = chunk_data
+        else:
+            del all_text_units_lookup[c_id]
+
+    all_text_units = [{"id": k, **v} for k, v in all_text_units_lookup.items()]
 
     if not all_text_units:
         logger.warning("No valid text units found")
@@ -635,34 +888,31 @@ async def _find_most_related_text_unit_from_entities(
         all_text_units,
         key=lambda x: x["data"]["content"],
         max_token_size=query_param.max_token_for_text_unit,
+        tokens=lambda x: x["data"].get("tokens"),
     )
 
-    all_text_units = [t["data"] for t in all_text_units]
+    all_text_units = [{**t["data"], "id": t["id"]} for t in all_text_units]
     return all_text_units
 
 
 async def _find_most_related_edges_from_entities(
     node_datas: list[dict],
+    node_edges: dict[str, list[tuple[str, str]]],
     query_param: QueryParam,
     knowledge_graph_inst: BaseGraphStorage,
 ):
-    all_related_edges = await asyncio.gather(
-        *[knowledge_graph_inst.get_node_edges(dp["entity_name"]) for dp in node_datas]
-    )
     all_edges = set()
-    for this_edges in all_related_edges:
-        all_edges.update([tuple(sorted(e)) for e in this_edges])
+    for dp in node_datas:
+        all_edges.update([tuple(sorted(e)) for e in node_edges.get(dp["entity_name"]) or []])
     all_edges = list(all_edges)
-    all_edges_pack = await asyncio.gather(
-        *[knowledge_graph_inst.get_edge(e[0], e[1]) for e in all_edges]
-    )
-    all_edges_degree = await asyncio.gather(
-        *[knowledge_graph_inst.edge_degree(e[0], e[1]) for e in all_edges]
+    all_edges_pack, all_edges_degree = await asyncio.gather(
+        knowledge_graph_inst.get_edges(all_edges),
+        knowledge_graph_inst.edge_degrees(all_edges),
     )
     all_edges_data = [
-        {"src_tgt": k, "rank": d, **v}
-        for k, v, d in zip(all_edges, all_edges_pack, all_edges_degree)
-        if v is not None
+        {"src_tgt": k, "rank": all_edges_degree.get(k, 0), **all_edges_pack[k]}
+        for k in all_edges
+        if k in all_edges_pack
     ]
     all_edges_data = sorted(
         all_edges_data, key=lambda x: (x["rank"], x["weight"]), reverse=True
@@ -671,6 +921,7 @@ async def _find_most_related_edges_from_entities(
         all_edges_data,
         key=lambda x: x["description"],
         max_token_size=query_param.max_token_for_global_context,
+        tokens=lambda x: x.get("description_tokens"),
     )
     return all_edges_data
 
@@ -689,7 +940,8 @@ async def global_query(
 
     kw_prompt_temp = PROMPTS["keywords_extraction"]
     kw_prompt = kw_prompt_temp.format(query=query)
-    result = await use_model_func(kw_prompt)
+    with tracing.span("llm.keywords"):
+        result = await use_model_func(kw_prompt)
     json_text = locate_json_string_body_from_string(result)
 
     try:
@@ -723,6 +975,8 @@ async def global_query(
             text_chunks_db,
             query_param,
         )
+    if context is not None:
+        context = context.render()
 
     if query_param.only_need_context:
         return context
@@ -733,10 +987,11 @@ async def global_query(
     sys_prompt = sys_prompt_temp.format(
         context_data=context, response_type=query_param.response_type
     )
-    response = await use_model_func(
-        query,
-        system_prompt=sys_prompt,
-    )
+    with tracing.span("llm.response"):
+        response = await use_model_func(
+            query,
+            system_prompt=sys_prompt,
+        )
     if len(response) > len(sys_prompt):
         response = (
             response.replace(sys_prompt, "")
@@ -764,19 +1019,18 @@ async def _build_global_query_context(
     if not len(results):
         return None
 
-    edge_datas = await asyncio.gather(
-        *[knowledge_graph_inst.get_edge(r["src_id"], r["tgt_id"]) for r in results]
+    edge_keys = [(r["src_id"], r["tgt_id"]) for r in results]
+    edge_datas, edge_degree = await asyncio.gather(
+        knowledge_graph_inst.get_edges(edge_keys),
+        knowledge_graph_inst.edge_degrees(edge_keys),
     )
 
-    if not all([n is not None for n in edge_datas]):
+    if len(edge_datas) < len(set(edge_keys)):
         logger.warning("Some edges are missing, maybe the storage is damaged")
-    edge_degree = await asyncio.gather(
-        *[knowledge_graph_inst.edge_degree(r["src_id"], r["tgt_id"]) for r in results]
-    )
     edge_datas = [
-        {"src_id": k["src_id"], "tgt_id": k["tgt_id"], "rank": d, **v}
-        for k, v, d in zip(results, edge_datas, edge_degree)
-        if v is not None
+        {"src_id": k[0], "tgt_id": k[1], "rank": edge_degree.get(k, 0), **edge_datas[k]}
+        for k in edge_keys
+        if k in edge_datas
     ]
     edge_datas = sorted(
         edge_datas, key=lambda x: (x["rank"], x["weight"]), reverse=True
@@ -785,6 +1039,7 @@ async def _build_global_query_context(
         edge_datas,
         key=lambda x: x["description"],
         max_token_size=query_param.max_token_for_global_context,
+        tokens=lambda x: x.get("description_tokens"),
     )
 
     use_entities = await _find_most_related_entities_from_relationships(
@@ -796,55 +1051,11 @@ async def _build_global_query_context(
     logger.info(
         f"Global query uses {len(use_entities)} entites, {len(edge_datas)} relations, {len(use_text_units)} text units"
     )
-    relations_section_list = [
-        ["id", "source", "target", "description", "keywords", "weight", "rank"]
-    ]
-    for i, e in enumerate(edge_datas):
-        relations_section_list.append(
-            [
-                i,
-                e["src_id"],
-                e["tgt_id"],
-                e["description"],
-                e["keywords"],
-                e["weight"],
-                e["rank"],
-            ]
-        )
-    relations_context = list_of_list_to_csv(relations_section_list)
-
-    entites_section_list = [["id", "entity", "type", "description", "rank"]]
-    for i, n in enumerate(use_entities):
-        entites_section_list.append(
-            [
-                i,
-                n["entity_name"],
-                n.get("entity_type", "UNKNOWN"),
-                n.get("description", "UNKNOWN"),
-                n["rank"],
-            ]
-        )
-    entities_context = list_of_list_to_csv(entites_section_list)
-
-    text_units_section_list = [["id", "content"]]
-    for i, t in enumerate(use_text_units):
-        text_units_section_list.append([i, t["content"]])
-    text_units_context = list_of_list_to_csv(text_units_section_list)
-
-    return f"""
------Entities-----
-```csv
-{entities_context}
-```
------Relationships-----
-```csv
-{relations_context}
-```
------Sources-----
-```csv
-{text_units_context}
-```
-"""
+    return QueryContext(
+        entities=[_context_entity(n) for n in use_entities],
+        relations=[_context_relation(e, e["src_id"], e["tgt_id"]) for e in edge_datas],
+        sources=[_context_source(t) for t in use_text_units],
+    )
 
 
 async def _find_most_related_entities_from_relationships(
@@ -857,22 +1068,22 @@ async def _find_most_related_entities_from_relationships(
         entity_names.add(e["src_id"])
         entity_names.add(e["tgt_id"])
 
-    node_datas = await asyncio.gather(
-        *[knowledge_graph_inst.get_node(entity_name) for entity_name in entity_names]
-    )
-
-    node_degrees = await asyncio.gather(
-        *[knowledge_graph_inst.node_degree(entity_name) for entity_name in entity_names]
+    entity_names = list(entity_names)
+    node_datas, node_degrees = await asyncio.gather(
+        knowledge_graph_inst.get_nodes_bulk(entity_names),
+        knowledge_graph_inst.node_degrees(entity_names),
     )
     node_datas = [
-        {**n, "entity_name": k, "rank": d}
-        for k, n, d in zip(entity_names, node_datas, node_degrees)
+        {**node_datas[k], "entity_name": k, "rank": node_degrees.get(k, 0)}
+        for k in entity_names
+        if k in node_datas
     ]
 
     node_datas = truncate_list_by_token_size(
         node_datas,
         key=lambda x: x["description"],
         max_token_size=query_param.max_token_for_local_context,
+        tokens=lambda x: x.get("description_tokens"),
     )
 
     return node_datas
@@ -889,32 +1100,173 @@ async def _find_related_text_unit_from_relationships(
         for dp in edge_datas
     ]
 
-    all_text_units_lookup = {}
-
+    # first relation that mentions a chunk decides its order
+    chunk_order = {}
     for index, unit_list in enumerate(text_units):
         for c_id in unit_list:
-            if c_id not in all_text_units_lookup:
-                all_text_units_lookup[c_id] = {
-                    "data": await text_chunks_db.get_by_id(c_id),
-                    "order": index,
-                }
+            chunk_order.setdefault(c_id, index)
 
-    if any([v is None for v in all_text_units_lookup.values()]):
+    chunk_ids = list(chunk_order)
+    chunk_datas = (
+        await text_chunks_db.get_by_ids(chunk_ids, fields=_CHUNK_CONTEXT_FIELDS)
+        if chunk_ids
+        else []
+    )
+    if any(v is None for v in chunk_datas):
         logger.warning("Text chunks are missing, maybe the storage is damaged")
     all_text_units = [
-        {"id": k, **v} for k, v in all_text_units_lookup.items() if v is not None
+        {"id": c_id, "data": data, "order": chunk_order[c_id]}
+        for c_id, data in zip(chunk_ids, chunk_datas)
+        if data is not None
     ]
     all_text_units = sorted(all_text_units, key=lambda x: x["order"])
     all_text_units = truncate_list_by_token_size(
         all_text_units,
         key=lambda x: x["data"]["content"],
         max_token_size=query_param.max_token_for_text_unit,
+        tokens=lambda x: x["data"].get("tokens"),
     )
-    all_text_units: list[TextChunkSchema] = [t["data"] for t in all_text_units]
+    all_text_units: list[TextChunkSchema] = [
+        {**t["data"], "id": t["id"]} for t in all_text_units
+    ]
 
     return all_text_units
 
 
+class _SharedReads:
+    """Per-query memo of storage reads, shared by concurrent context builders.
+
+    Every key is fetched at most once: a key already requested by the other
+    branch is awaited instead of fetched again, and the rest of a batch still
+    goes out as one bulk call.
+    """
+
+    def __init__(self):
+        self._futures: dict[tuple, asyncio.Future] = {}
+        self.requested = 0
+        self.fetched = 0
+
+    def _seed(self, kind: str, key, value):
+        if (kind, key) not in self._futures:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._futures[(kind, key)] = future
+
+    async def _many(self, kind: str, keys: list, fetch_many) -> dict:
+        """{key: value} for keys, fetch_many(missing) -> {key: value} reads the rest"""
+        keys = list(dict.fromkeys(keys))
+        self.requested += len(keys)
+        loop = asyncio.get_running_loop()
+        # futures are taken before any await, a failed fetch in the other
+        # branch drops its keys from self._futures
+        futures, missing = [], {}
+        for k in keys:
+            future = self._futures.get((kind, k))
+            if future is None:
+                future = self._futures[(kind, k)] = loop.create_future()
+                missing[k] = future
+            futures.append(future)
+        if missing:
+            self.fetched += len(missing)
+            try:
+                fetched = await fetch_many(list(missing))
+            except BaseException as e:
+                for k, future in missing.items():
+                    self._futures.pop((kind, k), None)
+                    if isinstance(e, asyncio.CancelledError):
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+                        future.exception()  # re-raised below, don't log it twice
+                raise
+            for k, future in missing.items():
+                future.set_result(fetched.get(k))
+        values = await asyncio.gather(*futures)
+        return dict(zip(keys, values))
+
+
+class _SharedGraphReads(_SharedReads):
+    """Graph storage whose bulk reads go through the per-query memo"""
+
+    def __init__(self, storage: BaseGraphStorage):
+        super().__init__()
+        self._storage = storage
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._storage, name)
+
+    async def get_node_neighbourhoods(self, node_ids: list[str]) -> dict[str, dict]:
+        found = await self._many(
+            "neighbourhood", node_ids, self._storage.get_node_neighbourhoods
+        )
+        # the other branch may ask for the same nodes or degrees separately
+        for k, v in found.items():
+            if v is not None:
+                self._seed("node", k, v["node"])
+                self._seed("degree", k, v["degree"])
+        return {k: v for k, v in found.items() if v is not None}
+
+    async def get_nodes_bulk(self, node_ids: list[str]) -> dict[str, dict]:
+        found = await self._many("node", node_ids, self._storage.get_nodes_bulk)
+        return {k: v for k, v in found.items() if v is not None}
+
+    async def node_degrees(self, node_ids: list[str]) -> dict[str, int]:
+        found = await self._many("degree", node_ids, self._storage.node_degrees)
+        return {k: v or 0 for k, v in found.items()}
+
+    async def get_edges(
+        self, pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], dict]:
+        found = await self._many(
+            "edge", [tuple(p) for p in pairs], self._storage.get_edges
+        )
+        return {k: v for k, v in found.items() if v is not None}
+
+    async def edge_degrees(
+        self, pairs: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], int]:
+        found = await self._many(
+            "edge_degree", [tuple(p) for p in pairs], self._storage.edge_degrees
+        )
+        return {k: v or 0 for k, v in found.items()}
+
+
+class _SharedChunkReads(_SharedReads):
+    """Text chunk storage whose reads go through the per-query memo"""
+
+    def __init__(self, storage: BaseKVStorage):
+        super().__init__()
+        self._storage = storage
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._storage, name)
+
+    async def get_by_id(self, id: str):
+        return (await self.get_by_ids([id]))[0]
+
+    async def get_by_ids(self, ids: list[str], fields=None):
+        async def fetch(missing: list[str]) -> dict:
+            return dict(zip(missing, await self._storage.get_by_ids(missing, fields=fields)))
+
+        # a projection is its own cache entry, never served from a narrower one
+        kind = f"chunk:{','.join(sorted(fields))}" if fields else "chunk"
+        found = await self._many(kind, ids, fetch)
+        return [found[id] for id in ids]
+
+
+async def _timed(timings: dict, stage: str, coro, span: str):
+    start = time.perf_counter()
+    try:
+        with tracing.span(span):
+            return await coro
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
 async def hybrid_query(
     query,
     knowledge_graph_inst: BaseGraphStorage,
@@ -924,14 +1276,15 @@ async def hybrid_query(
     query_param: QueryParam,
     global_config: dict,
 ) -> str:
-    low_level_context = None
-    high_level_context = None
+    timings = {}
     use_model_func = global_config["llm_model_func"]
 
     kw_prompt_temp = PROMPTS["keywords_extraction"]
     kw_prompt = kw_prompt_temp.format(query=query)
 
-    result = await use_model_func(kw_prompt)
+    result = await _timed(
+        timings, "keywords", use_model_func(kw_prompt), span="llm.keywords"
+    )
     json_text = locate_json_string_body_from_string(result)
     try:
         keywords_data = json.loads(json_text)
@@ -957,26 +1310,55 @@ async def hybrid_query(
         except json.JSONDecodeError as e:
             print(f"JSON parsing error: {e}")
             return PROMPTS["fail_response"]
-    if ll_keywords:
-        low_level_context = await _build_local_query_context(
-            ll_keywords,
-            knowledge_graph_inst,
-            entities_vdb,
-            text_chunks_db,
-            query_param,
-        )
+    # both branches run at once and share one memo of graph and chunk reads
+    graph_reads = _SharedGraphReads(knowledge_graph_inst)
+    chunk_reads = _SharedChunkReads(text_chunks_db)
 
-    if hl_keywords:
-        high_level_context = await _build_global_query_context(
-            hl_keywords,
-            knowledge_graph_inst,
-            entities_vdb,
-            relationships_vdb,
-            text_chunks_db,
-            query_param,
+    async def _no_context():
+        return None
+
+    retrieval_start = time.perf_counter()
+    low_level_context, high_level_context = await asyncio.gather(
+        _timed(
+            timings,
+            "local",
+            _build_local_query_context(
+                ll_keywords, graph_reads, entities_vdb, chunk_reads, query_param
+            ),
+            span="context.local",
+        )
+        if ll_keywords
+        else _no_context(),
+        _timed(
+            timings,
+            "global",
+            _build_global_query_context(
+                hl_keywords,
+                graph_reads,
+                entities_vdb,
+                relationships_vdb,
+                chunk_reads,
+                query_param,
+            ),
+            span="context.global",
         )
+        if hl_keywords
+        else _no_context(),
+    )
+    timings["retrieval"] = time.perf_counter() - retrieval_start
 
-    context = combine_contexts(high_level_context, low_level_context)
+    combine_start = time.perf_counter()
+    with tracing.span("context.combine"):
+        context = combine_contexts(high_level_context, low_level_context, query_param)
+        if context is not None:
+            context = context.render()
+    timings["combine"] = time.perf_counter() - combine_start
+    logger.info(
+        "Hybrid query timings: "
+        + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in timings.items())
+        + f"; graph reads {graph_reads.fetched}/{graph_reads.requested},"
+        f" chunk reads {chunk_reads.fetched}/{chunk_reads.requested} (fetched/requested)"
+    )
 
     if query_param.only_need_context:
         return context
@@ -987,10 +1369,11 @@ async def hybrid_query(
     sys_prompt = sys_prompt_temp.format(
         context_data=context, response_type=query_param.response_type
     )
-    response = await use_model_func(
-        query,
-        system_prompt=sys_prompt,
-    )
+    with tracing.span("llm.response"):
+        response = await use_model_func(
+            query,
+            system_prompt=sys_prompt,
+        )
     if len(response) > len(sys_prompt):
         response = (
             response.replace(sys_prompt, "")
@@ -1004,73 +1387,93 @@ async def hybrid_query(
     return response
 
 
-def combine_contexts(high_level_context, low_level_context):
-    # Function to extract entities, relationships, and sources from context strings
+def _context_entity(node: dict) -> ContextEntity:
+    return ContextEntity(
+        entity_name=node["entity_name"],
+        entity_type=node.get("entity_type", "UNKNOWN"),
+        description=node.get("description", "UNKNOWN"),
+        rank=node["rank"],
+        tokens=node.get("description_tokens"),
+    )
 
-    def extract_sections(context):
-        entities_match = re.search(
-            r"-----Entities-----\s*```csv\s*(.*?)\s*```", context, re.DOTALL
-        )
-        relationships_match = re.search(
-            r"-----Relationships-----\s*```csv\s*(.*?)\s*```", context, re.DOTALL
-        )
-        sources_match = re.search(
-            r"-----Sources-----\s*```csv\s*(.*?)\s*```", context, re.DOTALL
-        )
 
-        entities = entities_match.group(1) if entities_match else ""
-        relationships = relationships_match.group(1) if relationships_match else ""
-        sources = sources_match.group(1) if sources_match else ""
+def _context_relation(edge: dict, src_id: str, tgt_id: str) -> ContextRelation:
+    return ContextRelation(
+        src_id=src_id,
+        tgt_id=tgt_id,
+        description=edge["description"],
+        keywords=edge["keywords"],
+        weight=edge["weight"],
+        rank=edge["rank"],
+        tokens=edge.get("description_tokens"),
+    )
+
 
-        return entities, relationships, sources
+def _context_source(chunk: dict) -> ContextSource:
+    return ContextSource(id=chunk["id"], content=chunk["content"], tokens=chunk.get("tokens"))
 
-    # Extract sections from both contexts
 
+def _merge_context_records(primary: list, secondary: list, key, text, max_token_size: int) -> list:
+    """primary then secondary records, deduplicated by key and truncated to max_token_size"""
+    merged = {}
+    for record in primary + secondary:
+        merged.setdefault(key(record), record)
+    return truncate_list_by_token_size(
+        list(merged.values()),
+        key=text,
+        max_token_size=max_token_size,
+        tokens=lambda r: r.tokens,
+    )
+
+
+def combine_contexts(
+    high_level_context: Union[QueryContext, None],
+    low_level_context: Union[QueryContext, None],
+    query_param: QueryParam,
+) -> Union[QueryContext, None]:
+    """Merge the global (high level) and local (low level) contexts of hybrid mode.
+
+    Records are deduplicated by entity name, relation endpoints and chunk id.
+    Each section leads with the side that retrieved it directly (entities from
+    the local search, relations from the global one) and is cut to the same
+    token budget as in local/global mode.
+    """
+    if high_level_context is None and low_level_context is None:
+        return None
     if high_level_context is None:
         warnings.warn(
             "High Level context is None. Return empty High entity/relationship/source"
         )
-        hl_entities, hl_relationships, hl_sources = "", "", ""
-    else:
-        hl_entities, hl_relationships, hl_sources = extract_sections(high_level_context)
-
+        high_level_context = QueryContext()
     if low_level_context is None:
         warnings.warn(
             "Low Level context is None. Return empty Low entity/relationship/source"
         )
-        ll_entities, ll_relationships, ll_sources = "", "", ""
-    else:
-        ll_entities, ll_relationships, ll_sources = extract_sections(low_level_context)
-
-    # Combine and deduplicate the entities
-
-    combined_entities = process_combine_contexts(hl_entities, ll_entities)
-    combined_entities = chunking_by_token_size(combined_entities, max_token_size=2000)
-    # Combine and deduplicate the relationships
-    combined_relationships = process_combine_contexts(
-        hl_relationships, ll_relationships
-    )
-    combined_relationships = chunking_by_token_size(
-        combined_relationships, max_token_size=2000
+        low_level_context = QueryContext()
+
+    return QueryContext(
+        entities=_merge_context_records(
+            low_level_context.entities,
+            high_level_context.entities,
+            key=lambda e: e.entity_name,
+            text=lambda e: e.description,
+            max_token_size=query_param.max_token_for_local_context,
+        ),
+        relations=_merge_context_records(
+            high_level_context.relations,
+            low_level_context.relations,
+            key=lambda r: r.key,
+            text=lambda r: r.description,
+            max_token_size=query_param.max_token_for_global_context,
+        ),
+        sources=_merge_context_records(
+            low_level_context.sources,
+            high_level_context.sources,
+            key=lambda c: c.id,
+            text=lambda c: c.content,
+            max_token_size=query_param.max_token_for_text_unit,
+        ),
     )
-    # Combine and deduplicate the sources
-    combined_sources = process_combine_contexts(hl_sources, ll_sources)
-    combined_sources = chunking_by_token_size(combined_sources, max_token_size=2000)
-    # Format the combined context
-    return f"""
------Entities-----
-```csv
-{combined_entities}
-```
------Relationships-----
-```csv
-{combined_relationships}
-```
------Sources-----
-```csv
-{combined_sources}
-```
-"""
 
 
 async def naive_query(
@@ -1092,6 +1495,7 @@ async def naive_query(
         chunks,
         key=lambda x: x["content"],
         max_token_size=query_param.max_token_for_text_unit,
+        tokens=lambda x: x.get("tokens"),
     )
     logger.info(f"Truncate {len(chunks)} to {len(maybe_trun_chunks)} chunks")
     section = "--New Chunk--\n".join([c["content"] for c in maybe_trun_chunks])
@@ -1101,10 +1505,11 @@ async def naive_query(
     sys_prompt = sys_prompt_temp.format(
         content_data=section, response_type=query_param.response_type
     )
-    response = await use_model_func(
-        query,
-        system_prompt=sys_prompt,
-    )
+    with tracing.span("llm.response"):
+        response = await use_model_func(
+            query,
+            system_prompt=sys_prompt,
+        )
 
     if len(response) > len(sys_prompt):
         response = (
@@ -1124,6 +1529,17 @@ async def naive_query(
 async def path2chunk(
     scored_edged_reasoning_path, knowledge_graph_inst, pairs_append, query, max_chunks=5
 ):
+    # every node and edge on the paths, fetched in two batched lookups
+    path_nodes, path_edges = set(scored_edged_reasoning_path), set()
+    for v in scored_edged_reasoning_path.values():
+        for pathtuple in v["Path"]:
+            path_nodes.update(pathtuple)
+            path_edges.update((r[0], r[1]) for r in pairs_append.get(pathtuple, []))
+    node_lookup, edge_lookup = await asyncio.gather(
+        knowledge_graph_inst.get_nodes_bulk(list(path_nodes)),
+        knowledge_graph_inst.get_edges(list(path_edges)),
+    )
+
     already_node = {}
     for k, v in scored_edged_reasoning_path.items():
         node_chunk_id = None
@@ -1131,10 +1547,7 @@ async def path2chunk(
         for pathtuple, scorelist in v["Path"].items():
             if pathtuple in pairs_append:
                 use_edge = pairs_append[pathtuple]
-                edge_datas = []
-                edge_datas = await asyncio.gather(
-                    *[knowledge_graph_inst.get_edge(r[0], r[1]) for r in use_edge]
-                )
+                edge_datas = [edge_lookup.get((r[0], r[1])) for r in use_edge]
                 text_units = [
                     split_string_by_multi_markers(dp["source_id"], [GRAPH_FIELD_SEP])
                     for dp in edge_datas  # chunk ID
@@ -1144,18 +1557,14 @@ async def path2chunk(
                 use_edge = []
                 text_units = []
 
-            node_datas = await asyncio.gather(
-                *[knowledge_graph_inst.get_node(pathtuple[0])]
-            )
+            node_datas = [node_lookup.get(pathtuple[0])]
             for dp in node_datas:
                 text_units_node = split_string_by_multi_markers(
                     dp["source_id"], [GRAPH_FIELD_SEP]
                 )
                 text_units = text_units + text_units_node
 
-            node_datas = await asyncio.gather(
-                *[knowledge_graph_inst.get_node(ents) for ents in pathtuple[1:]]
-            )
+            node_datas = [node_lookup.get(ents) for ents in pathtuple[1:]]
             if query is not None:
                 for dp in node_datas:
                     text_units_node = split_string_by_multi_markers(
@@ -1192,7 +1601,7 @@ async def path2chunk(
                 node_chunk_id = node_chunk_id + count_dict
         v["Path"] = []
         if node_chunk_id is None:
-            node_datas = await asyncio.gather(*[knowledge_graph_inst.get_node(k)])
+            node_datas = [node_lookup.get(k)]
             for dp in node_datas:
                 text_units_node = split_string_by_multi_markers(
                     dp["source_id"], [GRAPH_FIELD_SEP]
@@ -1285,10 +1694,11 @@ async def _build_mini_query_context(
             **candidate_reasoning_path,
             **candidate_reasoning_path_new,
         }
+    paths = await knowledge_graph_inst.get_neighbors_within_k_hops_bulk(
+        list(candidate_reasoning_path.keys()), 2
+    )
     for key in candidate_reasoning_path.keys():
-        candidate_reasoning_path[key][
-            "Path"
-        ] = await knowledge_graph_inst.get_neighbors_within_k_hops(key, 2)
+        candidate_reasoning_path[key]["Path"] = paths[key]
         imp_ents.append(key)
 
     short_path_entries = {
@@ -1340,15 +1750,17 @@ async def _build_mini_query_context(
     )
 
     entites_section_list = []
-    node_datas = await asyncio.gather(
-        *[
-            knowledge_graph_inst.get_node(entity_name)
-            for entity_name in scored_edged_reasoning_path.keys()
-        ]
+    node_datas = await knowledge_graph_inst.get_nodes_bulk(
+        list(scored_edged_reasoning_path.keys())
     )
     node_datas = [
-        {**n, "entity_name": k, "Score": scored_edged_reasoning_path[k]["Score"]}
-        for k, n in zip(scored_edged_reasoning_path.keys(), node_datas)
+        {
+            **node_datas[k],
+            "entity_name": k,
+            "Score": scored_edged_reasoning_path[k]["Score"],
+        }
+        for k in scored_edged_reasoning_path.keys()
+        if k in node_datas
     ]
     for i, n in enumerate(node_datas):
         entites_section_list.append(
@@ -1358,6 +1770,7 @@ async def _build_mini_query_context(
                 n.get("description", "UNKNOWN"),
             ]
         )
+    description_tokens = {n["entity_name"]: n.get("description_tokens") for n in node_datas}
     entites_section_list = sorted(
         entites_section_list, key=lambda x: x[1], reverse=True
     )
@@ -1365,6 +1778,7 @@ async def _build_mini_query_context(
         entites_section_list,
         key=lambda x: x[2],
         max_token_size=query_param.max_token_for_node_context,
+        tokens=lambda x: description_tokens.get(x[0]),
     )
 
     entites_section_list.insert(0, ["entity", "score", "description"])
@@ -1385,8 +1799,10 @@ async def _build_mini_query_context(
     if not len(results_edge):
         return None
 
-    use_text_units = await asyncio.gather(
-        *[text_chunks_db.get_by_id(id) for id in final_chunk_id]
+    use_text_units = (
+        await text_chunks_db.get_by_ids(final_chunk_id, fields=_CHUNK_CONTEXT_FIELDS)
+        if final_chunk_id
+        else []
     )
     text_units_section_list = [["id", "content"]]
 
@@ -1423,7 +1839,8 @@ async def minirag_query(  # MiniRAG
     kw_prompt_temp = PROMPTS["minirag_query2kwd"]
     TYPE_POOL, TYPE_POOL_w_CASE = await knowledge_graph_inst.get_types()
     kw_prompt = kw_prompt_temp.format(query=query, TYPE_POOL=TYPE_POOL)
-    result = await use_model_func(kw_prompt)
+    with tracing.span("llm.keywords"):
+        result = await use_model_func(kw_prompt)
 
     try:
         keywords_data = json_repair.loads(result)
@@ -1449,19 +1866,20 @@ async def minirag_query(  # MiniRAG
             print(f"JSON parsing error: {e}")
             return PROMPTS["fail_response"]
 
-    context = await _build_mini_query_context(
-        entities_from_query,
-        type_keywords,
-        query,
-        knowledge_graph_inst,
-        entities_vdb,
-        entity_name_vdb,
-        relationships_vdb,
-        chunks_vdb,
-        text_chunks_db,
-        embedder,
-        query_param,
-    )
+    with tracing.span("context.mini"):
+        context = await _build_mini_query_context(
+            entities_from_query,
+            type_keywords,
+            query,
+            knowledge_graph_inst,
+            entities_vdb,
+            entity_name_vdb,
+            relationships_vdb,
+            chunks_vdb,
+            text_chunks_db,
+            embedder,
+            query_param,
+        )
 
     if query_param.only_need_context:
         return context
@@ -1472,9 +1890,10 @@ async def minirag_query(  # MiniRAG
     sys_prompt = sys_prompt_temp.format(
         context_data=context, response_type=query_param.response_type
     )
-    response = await use_model_func(
-        query,
-        system_prompt=sys_prompt,
-    )
+    with tracing.span("llm.response"):
+        response = await use_model_func(
+            query,
+            system_prompt=sys_prompt,
+        )
 
     return response
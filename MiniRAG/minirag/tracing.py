@@ -0,0 +1,420 @@
+"""
+Per-stage latency tracing for the query pipeline.
+
+Spans follow the OpenTelemetry data model (trace id, span id, parent span id,
+start/end in unix nanoseconds, attributes, status) without depending on the
+OpenTelemetry SDK:
+
+    with tracing.trace("minirag.aquery", mode="light"):   # starts a trace
+        with tracing.span("llm.keywords"):                # child, no-op outside a trace
+            ...
+
+Finished traces are kept in an in-process ring buffer (recent_traces()) and
+handed to the registered exporters. to_otlp_json() renders traces as an
+OTLP/JSON ExportTraceServiceRequest, OTLPHttpExporter pushes them to a
+collector (Jaeger, Tempo, otel-collector...) from a background thread.
+
+Environment:
+    MINIRAG_TRACING=false                  turn span()/trace() into no-ops
+    MINIRAG_TRACE_BUFFER_SIZE=200          traces kept in the ring buffer
+    OTEL_EXPORTER_OTLP_TRACES_ENDPOINT     e.g. http://otel-collector:4318/v1/traces
+    OTEL_SERVICE_NAME=minirag
+"""
+
+import contextvars
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Callable, Optional, Union
+
+# minirag.utils imports this module, use the same logger without importing it
+logger = logging.getLogger("minirag")
+
+ENABLED = os.getenv("MINIRAG_TRACING", "true").lower() in ("1", "true", "yes", "on")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "minirag")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: dict = field(default_factory=dict)
+    error: Optional[str] = None
+    # finished spans of the trace, shared by every span in it
+    _trace: list = field(default_factory=list, repr=False)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class _NoopSpan:
+    """Returned when tracing is off or no trace is active"""
+
+    name = trace_id = span_id = parent_id = error = None
+    duration_ms = None
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_NOOP_CONTEXT = nullcontext(NOOP_SPAN)
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "minirag_current_span", default=None
+)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(
+    name: str, parent: Union[Span, None] = None, root: bool = False, **attributes
+) -> Union[Span, _NoopSpan]:
+    """Create a span without making it current, finish it with end_span().
+
+    The parent defaults to the current span. Without a parent a new trace is
+    started only when root is True, otherwise NOOP_SPAN is returned so that
+    leaf stages (embeddings during indexing, ...) do not fill the buffer.
+    """
+    if not ENABLED:
+        return NOOP_SPAN
+    if parent is None:
+        parent = _current.get()
+    if isinstance(parent, Span):
+        return Span(
+            name,
+            parent.trace_id,
+            _new_id(64),
+            parent.span_id,
+            time.time_ns(),
+            attributes=attributes,
+            _trace=parent._trace,
+        )
+    if not root:
+        return NOOP_SPAN
+    return Span(name, _new_id(128), _new_id(64), None, time.time_ns(), attributes=attributes)
+
+
+def end_span(span: Union[Span, _NoopSpan], error: Union[BaseException, None] = None):
+    """Finish a span, the trace is recorded when its root span ends"""
+    if not isinstance(span, Span) or span.end_ns is not None:
+        return
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    span._trace.append(span)
+    if span.parent_id is None:
+        _record(span._trace)
+
+
+@contextmanager
+def use_span(span: Union[Span, _NoopSpan]):
+    """Make span the current one for the block (children attach to it)"""
+    if not isinstance(span, Span):
+        yield span
+        return
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _reset(token)
+
+
+def _reset(token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # resumed in another context (async generator driven by separate tasks)
+        _current.set(None)
+
+
+@contextmanager
+def _active(name: str, root: bool, attributes: dict):
+    s = start_span(name, root=root, **attributes)
+    if not isinstance(s, Span):
+        yield s
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        end_span(s, error=e)
+        raise
+    finally:
+        _reset(token)
+        end_span(s)
+
+
+def span(name: str, **attributes):
+    """Child span of the current one, a no-op when no trace is active"""
+    if not ENABLED or _current.get() is None:
+        return _NOOP_CONTEXT
+    return _active(name, False, attributes)
+
+
+def trace(name: str, **attributes):
+    """Span that starts a new trace, or a child span when a trace is already active"""
+    return _active(name, True, attributes)
+
+
+class _TracedStorage:
+    """Proxy that opens a span around every async method of a storage"""
+
+    def __init__(self, storage, kind: str):
+        self._storage = storage
+        self._kind = kind
+        self._namespace = getattr(storage, "namespace", None)
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._storage, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+        span_name = f"{self._kind}.{name}"
+
+        @wraps(attr)
+        async def call(*args, **kwargs):
+            attributes = {"namespace": self._namespace}
+            if args and isinstance(args[0], (list, tuple, set, dict)):
+                attributes["keys"] = len(args[0])
+            if "top_k" in kwargs:
+                attributes["top_k"] = kwargs["top_k"]
+            with span(span_name, **attributes) as s:
+                result = await attr(*args, **kwargs)
+                if isinstance(result, (list, dict)):
+                    s.set(results=len(result))
+                return result
+
+        return call
+
+
+def traced_storage(storage, kind: str):
+    """Wrap a storage so each call shows up as a `<kind>.<method>` span"""
+    if not ENABLED or storage is None:
+        return storage
+    return _TracedStorage(storage, kind)
+
+
+# ----------------------------------------------------------------------
+# buffer and exporters
+# ----------------------------------------------------------------------
+
+
+class TraceBuffer:
+    """Ring buffer of the most recent finished traces, safe to read from any thread"""
+
+    def __init__(self, max_traces: int):
+        self._traces: deque = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    def add(self, spans: list[Span]):
+        with self._lock:
+            self._traces.append(spans)
+
+    def recent(self, limit: Union[int, None] = None) -> list[list[Span]]:
+        """Newest first"""
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()
+        return traces[:limit] if limit is not None else traces
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+    def __len__(self):
+        return len(self._traces)
+
+
+buffer = TraceBuffer(int(os.getenv("MINIRAG_TRACE_BUFFER_SIZE", "200")))
+_exporters: list[Callable[[list[Span]], Any]] = []
+
+
+def add_exporter(exporter: Callable[[list[Span]], Any]):
+    """Call exporter(spans) with every finished trace"""
+    _exporters.append(exporter)
+
+
+def remove_exporter(exporter: Callable[[list[Span]], Any]):
+    if exporter in _exporters:
+        _exporters.remove(exporter)
+
+
+def _record(spans: list[Span]):
+    buffer.add(spans)
+    for exporter in list(_exporters):
+        try:
+            exporter(spans)
+        except Exception as e:
+            logger.warning(f"Trace exporter {exporter!r} failed: {e}")
+
+
+def recent_traces(limit: Union[int, None] = None) -> list[list[Span]]:
+    return buffer.recent(limit)
+
+
+def summarize(spans: list[Span]) -> dict:
+    """Readable form of one trace: stages with offset and duration in ms"""
+    root = next((s for s in spans if s.parent_id is None), spans[-1])
+    ordered = sorted(spans, key=lambda s: s.start_ns)
+    return {
+        "trace_id": root.trace_id,
+        "name": root.name,
+        "start": root.start_ns / 1e9,
+        "duration_ms": root.duration_ms,
+        "error": root.error,
+        "attributes": root.attributes,
+        "spans": [
+            {
+                "name": s.name,
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "offset_ms": (s.start_ns - root.start_ns) / 1e6,
+                "duration_ms": s.duration_ms,
+                "attributes": s.attributes,
+                "error": s.error,
+            }
+            for s in ordered
+        ],
+    }
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # int64 is a string in the proto3 JSON mapping
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(s: Span) -> dict:
+    otlp = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [
+            {"key": k, "value": _otlp_value(v)}
+            for k, v in s.attributes.items()
+            if v is not None
+        ],
+        # STATUS_CODE_ERROR / STATUS_CODE_UNSET
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 0},
+    }
+    if s.parent_id is not None:
+        otlp["parentSpanId"] = s.parent_id
+    return otlp
+
+
+def to_otlp_json(traces: list[list[Span]], service_name: str = SERVICE_NAME) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest for the given traces"""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": service_name}}
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "minirag.tracing"},
+                        "spans": [_otlp_span(s) for spans in traces for s in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class OTLPHttpExporter:
+    """Push finished traces to an OTLP/HTTP endpoint (JSON encoding).
+
+    Traces are queued and sent in batches from a daemon thread, so the query
+    path never waits on the collector. When the queue is full traces are dropped.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        service_name: str = SERVICE_NAME,
+        headers: Union[dict, None] = None,
+        max_queue: int = 1000,
+        max_batch: int = 50,
+        timeout: float = 5.0,
+    ):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(
+            target=self._run, name="otlp-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def __call__(self, spans: list[Span]):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._send(batch)
+            except Exception as e:
+                logger.warning(f"OTLP export to {self.endpoint} failed: {e}")
+
+    def _send(self, batch: list[list[Span]]):
+        body = json.dumps(to_otlp_json(batch, self.service_name)).encode("utf-8")
+        req = urllib.request.Request(
+            self.endpoint, data=body, headers=self.headers, method="POST"
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+
+
+_otlp_endpoint = os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT")
+if ENABLED and _otlp_endpoint:
+    add_exporter(OTLPHttpExporter(_otlp_endpoint))
@@ -1,31 +1,60 @@
 import asyncio
 import html
+import importlib
 import io
 import csv
 import json
 import logging
 import os
 import re
+from bisect import bisect_right
 from dataclasses import dataclass
-from functools import wraps
+from functools import lru_cache, wraps
 from hashlib import md5
+from itertools import accumulate
 from typing import Any, Union, List
 import xml.etree.ElementTree as ET
 import copy
 import numpy as np
 import tiktoken
-from nltk.metrics import edit_distance
-from rouge import Rouge
-from nltk.translate.bleu_score import sentence_bleu
-from sentence_transformers import SentenceTransformer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from nltk.tokenize import word_tokenize
-from nltk.translate.bleu_score import SmoothingFunction
+
+from . import tracing
 
 ENCODER = None
 
 logger = logging.getLogger("minirag")
 
+# Heavy optional dependencies (torch through sentence_transformers, sklearn,
+# rouge, nltk) are only used by the non-default calculate_similarity methods,
+# so they are imported on first use instead of on every `import minirag`.
+# `minirag.utils.SentenceTransformer` and friends keep working through the
+# module level __getattr__ below.
+_LAZY_IMPORTS = {
+    "edit_distance": ("nltk.metrics", "edit_distance"),
+    "Rouge": ("rouge", "Rouge"),
+    "sentence_bleu": ("nltk.translate.bleu_score", "sentence_bleu"),
+    "SmoothingFunction": ("nltk.translate.bleu_score", "SmoothingFunction"),
+    "SentenceTransformer": ("sentence_transformers", "SentenceTransformer"),
+    "TfidfVectorizer": ("sklearn.feature_extraction.text", "TfidfVectorizer"),
+    "word_tokenize": ("nltk.tokenize", "word_tokenize"),
+}
+
+
+def _lazy_import(name: str):
+    """Import one of _LAZY_IMPORTS and cache it as a module global"""
+    value = globals().get(name)
+    if value is None:
+        module_name, attr = _LAZY_IMPORTS[name]
+        value = getattr(importlib.import_module(module_name), attr)
+        globals()[name] = value
+    return value
+
+
+def __getattr__(name: str):
+    if name in _LAZY_IMPORTS:
+        return _lazy_import(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def set_logger(log_file: str):
     logger.setLevel(logging.DEBUG)
@@ -49,7 +78,11 @@ class EmbeddingFunc:
     func: callable
 
     async def __call__(self, *args, **kwargs) -> np.ndarray:
-        return await self.func(*args, **kwargs)
+        texts = args[0] if args else kwargs.get("texts")
+        with tracing.span(
+            "embedding", texts=len(texts) if isinstance(texts, list) else 1
+        ):
+            return await self.func(*args, **kwargs)
 
 
 def compute_mdhash_id(content, prefix: str = ""):
@@ -100,17 +133,30 @@ def limit_async_func_call(max_size: int, waitting_time: float = 0.0001):
     def final_decro(func):
         """Not using async.Semaphore to aovid use nest-asyncio"""
         __current_size = 0
+        __waiting = 0
 
         @wraps(func)
         async def wait_func(*args, **kwargs):
-            nonlocal __current_size
-            while __current_size >= max_size:
-                await asyncio.sleep(waitting_time)
+            nonlocal __current_size, __waiting
+            if __current_size >= max_size:
+                __waiting += 1
+                try:
+                    while __current_size >= max_size:
+                        await asyncio.sleep(waitting_time)
+                finally:
+                    __waiting -= 1
             __current_size += 1
-            result = await func(*args, **kwargs)
-            __current_size -= 1
-            return result
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                # release the slot on errors too, or failed calls shrink the limit
+                __current_size -= 1
 
+        def stats() -> dict:
+            """Calls running and waiting for a slot, for metrics"""
+            return {"running": __current_size, "waiting": __waiting, "max_size": max_size}
+
+        wait_func.stats = stats
         return wait_func
 
     return final_decro
@@ -186,16 +232,36 @@ def is_float_regex(value):
     return bool(re.match(r"^[-+]?[0-9]*\.?[0-9]+$", value))
 
 
-def truncate_list_by_token_size(list_data: list, key: callable, max_token_size: int):
-    """Truncate a list of data by token size"""
+@lru_cache(maxsize=65536)
+def count_tokens_by_tiktoken(content: str) -> int:
+    """Token count of content, memoized since the same descriptions and chunks
+    come back query after query"""
+    return len(encode_string_by_tiktoken(content))
+
+
+def truncate_list_by_token_size(
+    list_data: list,
+    key: callable,
+    max_token_size: int,
+    tokens: callable = None,
+):
+    """Truncate a list of data by token size
+
+    tokens(data) may return the token count stored on the record at write time
+    (e.g. "tokens" on chunks, "description_tokens" on nodes and edges), only
+    records without one are counted with the tokenizer.
+    """
     if max_token_size <= 0:
         return []
-    tokens = 0
-    for i, data in enumerate(list_data):
-        tokens += len(encode_string_by_tiktoken(key(data)))
-        if tokens > max_token_size:
-            return list_data[:i]
-    return list_data
+    with tracing.span("truncate", items=len(list_data), max_tokens=max_token_size) as s:
+        counts = []
+        for data in list_data:
+            count = tokens(data) if tokens is not None else None
+            counts.append(count if count is not None else count_tokens_by_tiktoken(key(data)))
+        # keep the longest prefix whose running total fits
+        kept = bisect_right(list(accumulate(counts)), max_token_size)
+        s.set(kept=kept)
+    return list_data[:kept]
 
 
 def list_of_list_to_csv(data: List[List[str]]) -> str:
@@ -463,6 +529,26 @@ def dequantize_embedding(
     return (quantized * scale + min_val).astype(np.float32)
 
 
+def _token_edit_distance(s1: list, s2: list) -> int:
+    """Levenshtein distance between two token lists (same result as nltk's edit_distance)"""
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    previous = list(range(len(s2) + 1))
+    for i, a in enumerate(s1, 1):
+        current = [i]
+        for j, b in enumerate(s2, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b))
+            )
+        previous = current
+    return previous[-1]
+
+
+@lru_cache(maxsize=1)
+def _sentence_transformer(model_name: str = "all-MiniLM-L6-v2"):
+    return _lazy_import("SentenceTransformer")(model_name)
+
+
 def calculate_similarity(sentences, target, method="levenshtein", n=1, k=1):
     target_tokens = target.lower().split()
     similarities_with_index = []
@@ -475,19 +561,19 @@ def calculate_similarity(sentences, target, method="levenshtein", n=1, k=1):
             similarities_with_index.append((i, jaccard_score))
     elif method == "levenshtein":
         for i, sentence in enumerate(sentences):
-            distance = edit_distance(target_tokens, sentence.lower().split())
+            distance = _token_edit_distance(target_tokens, sentence.lower().split())
             similarities_with_index.append(
                 (i, 1 - (distance / max(len(target_tokens), len(sentence.split()))))
             )
     elif method == "rouge":
-        rouge = Rouge()
+        rouge = _lazy_import("Rouge")()
         for i, sentence in enumerate(sentences):
             scores = rouge.get_scores(sentence, target)
             rouge_score = scores[0].get(f"rouge-{n}", {}).get("f", 0)
             similarities_with_index.append((i, rouge_score))
 
     elif method == "bert":
-        model = SentenceTransformer('all-MiniLM-L6-v2')
+        model = _sentence_transformer('all-MiniLM-L6-v2')
         embeddings = model.encode(sentences + [target])
         target_vec = embeddings[-1]
         similarities_with_index = [(i, np.dot(embeddings[i], target_vec) /
@@ -502,7 +588,9 @@ def calculate_similarity(sentences, target, method="levenshtein", n=1, k=1):
             similarities_with_index.append((i, score))
 
     elif method == "bleu":
-        smooth_fn = SmoothingFunction().method1  # simple and effective
+        sentence_bleu = _lazy_import("sentence_bleu")
+        word_tokenize = _lazy_import("word_tokenize")
+        smooth_fn = _lazy_import("SmoothingFunction")().method1  # simple and effective
         target_tokens_bleu = word_tokenize(target.lower())
         for i, sentence in enumerate(sentences):
             sentence_tokens_bleu = word_tokenize(sentence.lower())
@@ -0,0 +1,82 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+import minirag.utils
+from minirag import MiniRAG
+from minirag.prompt import PROMPTS
+from minirag.utils import EmbeddingFunc
+
+
+class WhitespaceEncoder:
+    """Stand-in for tiktoken so chunking runs offline and is easy to predict"""
+
+    def __init__(self):
+        self.vocab = {}
+        self.words = {}
+
+    def encode(self, content):
+        tokens = []
+        for word in content.split(" "):
+            if word not in self.vocab:
+                self.vocab[word] = len(self.vocab)
+                self.words[self.vocab[word]] = word
+            tokens.append(self.vocab[word])
+        return tokens
+
+    def decode(self, tokens):
+        return " ".join(self.words[t] for t in tokens)
+
+
+class StubExtractionLLM:
+    """Answer every extraction prompt with one entity of its own plus a
+    relation to an entity shared by all chunks. ``fail_after`` makes the
+    call after that many extractions raise, like an interrupted run."""
+
+    def __init__(self, fail_after=None):
+        self.calls = 0
+        self.fail_after = fail_after
+
+    async def __call__(self, prompt, system_prompt=None, history_messages=[], **kwargs):
+        if "-Real Data-" not in prompt:
+            return ""
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("LLM went away")
+        h = hashlib.md5(prompt.encode()).hexdigest()[:6]
+        td = PROMPTS["DEFAULT_TUPLE_DELIMITER"]
+        rd = PROMPTS["DEFAULT_RECORD_DELIMITER"]
+        return rd.join(
+            [
+                f'("entity"{td}"E{h}"{td}"ORGANIZATION"{td}"entity of {h}")',
+                f'("entity"{td}"SHARED"{td}"ORGANIZATION"{td}"seen in {h}")',
+                f'("relationship"{td}"E{h}"{td}"SHARED"{td}"linked in {h}"{td}"kw"{td}2)',
+            ]
+        )
+
+
+async def _stub_embedding(texts):
+    return np.random.rand(len(texts), 8)
+
+
+@pytest.fixture
+def make_rag(tmp_path, monkeypatch):
+    """Build a NetworkX + JsonKV MiniRAG on tmp_path around a given stub LLM"""
+    monkeypatch.setattr(minirag.utils, "ENCODER", WhitespaceEncoder())
+
+    def _make_rag(llm, name="rag"):
+        working_dir = tmp_path / name
+        working_dir.mkdir(exist_ok=True)
+        return MiniRAG(
+            working_dir=str(working_dir),
+            llm_model_func=llm,
+            embedding_func=EmbeddingFunc(8, 100, _stub_embedding),
+            entity_extract_max_gleaning=0,
+            chunk_token_size=40,
+            chunk_overlap_token_size=0,
+            entity_extract_checkpoint_size=2,
+        )
+
+    return _make_rag
+
@@ -0,0 +1,99 @@
+import pytest
+
+from minirag.kg import cached_graph_impl
+from minirag.kg.cached_graph_impl import CachedGraphStorage
+from minirag.kg.networkx_impl import NetworkXStorage
+
+
+def make_cached(tmp_path, ttl=300):
+    global_config = {"working_dir": str(tmp_path), "graph_cache_params": {"ttl": ttl}}
+    storage = NetworkXStorage(
+        namespace="graph", global_config=global_config, embedding_func=None
+    )
+    return CachedGraphStorage(
+        namespace="graph", global_config=global_config, storage=storage
+    )
+
+
+async def warm(cached, node_ids):
+    """Read nodes, degrees and neighbourhoods so they are all cached"""
+    for node_id in node_ids:
+        await cached.get_node(node_id)
+        await cached.node_degree(node_id)
+        await cached.get_node_edges(node_id)
+
+
+@pytest.mark.asyncio
+async def test_upsert_node_invalidates_node(tmp_path):
+    cached = make_cached(tmp_path)
+    await cached.upsert_node("A", {"description": "old"})
+    await warm(cached, ["A"])
+
+    await cached.upsert_node("A", {"description": "new"})
+
+    assert (await cached.get_node("A"))["description"] == "new"
+
+
+@pytest.mark.asyncio
+async def test_upsert_edge_invalidates_degree_and_neighbourhood(tmp_path):
+    cached = make_cached(tmp_path)
+    await cached.upsert_nodes_bulk({"A": {}, "B": {}})
+    await warm(cached, ["A", "B"])
+    assert await cached.edge_degree("A", "B") == 0
+
+    await cached.upsert_edge("A", "B", {"weight": 1.0})
+
+    assert await cached.node_degree("A") == await cached.node_degree("B") == 1
+    assert await cached.edge_degree("A", "B") == 2
+    assert await cached.get_node_edges("A") == [("A", "B")]
+    assert await cached.get_edge("A", "B") == {"weight": 1.0}
+
+    await cached.upsert_edge("A", "B", {"weight": 3.0})
+
+    assert await cached.get_edges([("A", "B")]) == {("A", "B"): {"weight": 3.0}}
+
+
+@pytest.mark.asyncio
+async def test_delete_node_invalidates_node_and_neighbours(tmp_path):
+    cached = make_cached(tmp_path)
+    await cached.upsert_nodes_bulk({"A": {}, "B": {}, "C": {}})
+    await cached.upsert_edges_bulk([("A", "B", {}), ("B", "C", {})])
+    await warm(cached, ["A", "B", "C"])
+    assert await cached.edge_degree("B", "C") == 3
+
+    await cached.delete_node("A")
+
+    assert await cached.get_node("A") is None
+    assert not await cached.has_node("A")
+    assert await cached.node_degree("B") == 1
+    assert await cached.get_node_edges("B") == [("B", "C")]
+    assert await cached.edge_degree("B", "C") == 2
+    assert await cached.get_edge("A", "B") is None
+
+
+@pytest.mark.asyncio
+async def test_ttl_none_keeps_entries_until_invalidated(tmp_path, monkeypatch):
+    cached = make_cached(tmp_path, ttl=None)
+    await cached.upsert_node("A", {"description": "old"})
+    await cached.get_node("A")
+
+    # written behind the cache's back, a day later
+    await cached.storage.upsert_node("A", {"description": "new"})
+    now = cached_graph_impl.time.monotonic()
+    monkeypatch.setattr(cached_graph_impl.time, "monotonic", lambda: now + 86400)
+
+    assert (await cached.get_node("A"))["description"] == "old"
+    assert cached.cache_stats()["node"]["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_ttl_zero_disables_the_cache(tmp_path):
+    cached = make_cached(tmp_path, ttl=0)
+    await cached.upsert_node("A", {"description": "old"})
+    await cached.get_node("A")
+
+    await cached.storage.upsert_node("A", {"description": "new"})
+
+    assert (await cached.get_node("A"))["description"] == "new"
+    assert cached.cache_stats()["total"]["size"] == 0
+    assert cached.cache_stats()["node"]["hits"] == 0
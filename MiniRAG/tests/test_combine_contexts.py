@@ -0,0 +1,117 @@
+import re
+
+import pytest
+
+from minirag.base import (
+    ContextEntity,
+    ContextRelation,
+    ContextSource,
+    QueryContext,
+    QueryParam,
+)
+from minirag.operate import combine_contexts
+from minirag.utils import csv_string_to_list, process_combine_contexts
+
+SECTIONS = ("Entities", "Relationships", "Sources")
+
+
+def sections(context: str) -> dict[str, str]:
+    return {
+        name: re.search(rf"-----{name}-----\s*```csv\s*(.*?)\s*```", context, re.DOTALL).group(1)
+        for name in SECTIONS
+    }
+
+
+def csv_merge(high_level_context: str, low_level_context: str) -> dict[str, str]:
+    """combine_contexts before QueryContext: regex out each CSV section and
+    merge the rows with process_combine_contexts (budgets here never truncate)"""
+    hl, ll = sections(high_level_context), sections(low_level_context)
+    return {name: process_combine_contexts(hl[name], ll[name]) for name in SECTIONS}
+
+
+def rows(table: str) -> list[str]:
+    """Data rows without the id column, in order (the old merge padded fields with tabs)"""
+    return [
+        ",".join(field.strip() for field in row[1:])
+        for row in csv_string_to_list(table.strip())[1:]
+        if row
+    ]
+
+
+def entity(name, rank=1):
+    return ContextEntity(name, "ORGANIZATION", f"about {name}", rank, tokens=10)
+
+
+def relation(src, tgt, rank=1):
+    return ContextRelation(src, tgt, f"{src} to {tgt}", "kw", 1.0, rank, tokens=10)
+
+
+def source(id):
+    return ContextSource(id, f"text of {id}", tokens=10)
+
+
+HIGH = QueryContext(
+    entities=[entity("B"), entity("C")],
+    relations=[relation("A", "B"), relation("B", "C")],
+    sources=[source("chunk-2"), source("chunk-3")],
+)
+LOW = QueryContext(
+    entities=[entity("A"), entity("B")],
+    relations=[relation("B", "C"), relation("C", "D")],
+    sources=[source("chunk-1"), source("chunk-2")],
+)
+
+
+def test_same_rows_as_csv_merge():
+    old = csv_merge(HIGH.render(), LOW.render())
+    new = sections(combine_contexts(HIGH, LOW, QueryParam()).render())
+
+    for name in SECTIONS:
+        # the old merge went through a set, only the row contents compare
+        assert sorted(rows(new[name])) == sorted(rows(old[name]))
+        assert len(rows(new[name])) == 3
+
+
+def test_deterministic_order_and_ids():
+    combined = combine_contexts(HIGH, LOW, QueryParam())
+
+    # each section leads with the side that retrieved it directly
+    assert [e.entity_name for e in combined.entities] == ["A", "B", "C"]
+    assert [r.key for r in combined.relations] == [("A", "B"), ("B", "C"), ("C", "D")]
+    assert [s.id for s in combined.sources] == ["chunk-1", "chunk-2", "chunk-3"]
+    ids = [row[0] for row in csv_string_to_list(sections(combined.render())["Entities"])[1:]]
+    assert ids == ["0", "1", "2"]
+
+
+def test_dedups_rows_the_csv_merge_kept_twice():
+    high = QueryContext(entities=[entity("A", rank=5)], relations=[relation("B", "A")])
+    low = QueryContext(entities=[entity("A", rank=2)], relations=[relation("A", "B")])
+
+    old = csv_merge(high.render(), low.render())
+    combined = combine_contexts(high, low, QueryParam())
+
+    # same entity with another rank, same relation read in the other direction
+    assert len(rows(old["Entities"])) == 2
+    assert len(rows(old["Relationships"])) == 2
+    assert [(e.entity_name, e.rank) for e in combined.entities] == [("A", 2)]
+    assert [(r.src_id, r.tgt_id) for r in combined.relations] == [("B", "A")]
+
+
+def test_truncates_each_section_to_its_budget():
+    param = QueryParam(
+        max_token_for_local_context=25,
+        max_token_for_global_context=10,
+        max_token_for_text_unit=0,
+    )
+    combined = combine_contexts(HIGH, LOW, param)
+
+    assert [e.entity_name for e in combined.entities] == ["A", "B"]
+    assert [r.key for r in combined.relations] == [("A", "B")]
+    assert combined.sources == []
+
+
+def test_missing_side():
+    assert combine_contexts(None, None, QueryParam()) is None
+    with pytest.warns(UserWarning, match="High Level context is None"):
+        combined = combine_contexts(None, LOW, QueryParam())
+    assert combined == QueryContext(LOW.entities, LOW.relations, LOW.sources)
@@ -0,0 +1,55 @@
+from minirag.prompt import GRAPH_FIELD_SEP
+from minirag.utils import compute_mdhash_id
+
+from conftest import StubExtractionLLM
+
+
+def chunk_ids_of(rag, doc_id):
+    return {
+        chunk_id
+        for chunk_id, chunk in rag.text_chunks._data.items()
+        if chunk["full_doc_id"] == doc_id
+    }
+
+
+def test_delete_document_retracts_only_its_contribution(make_rag):
+    kept_doc = " ".join(f"kept{j}" for j in range(80))
+    deleted_doc = " ".join(f"gone{j}" for j in range(80))
+    rag = make_rag(StubExtractionLLM())
+    rag.insert([kept_doc, deleted_doc])
+    kept_id = compute_mdhash_id(kept_doc, prefix="doc-")
+    deleted_id = compute_mdhash_id(deleted_doc, prefix="doc-")
+    kept_chunks = chunk_ids_of(rag, kept_id)
+    deleted_chunks = chunk_ids_of(rag, deleted_id)
+    graph = rag.chunk_entity_relation_graph._graph
+
+    def owned_by(chunk_ids):
+        return {
+            name
+            for name, data in graph.nodes(data=True)
+            if set(data["source_id"].split(GRAPH_FIELD_SEP)) <= chunk_ids
+        }
+
+    kept_nodes = owned_by(kept_chunks)
+    orphaned_nodes = owned_by(deleted_chunks)
+    assert len(kept_nodes) == len(orphaned_nodes) == 2
+    kept_edges = {
+        (src, tgt): dict(data)
+        for src, tgt, data in graph.edges(data=True)
+        if src in kept_nodes or tgt in kept_nodes
+    }
+
+    rag.delete_by_doc_id(deleted_id)
+    graph = rag.chunk_entity_relation_graph._graph
+
+    shared = graph.nodes['"SHARED"']
+    assert set(shared["source_id"].split(GRAPH_FIELD_SEP)) == kept_chunks
+    assert set(graph.nodes) == kept_nodes | {'"SHARED"'}
+    assert {(src, tgt): dict(data) for src, tgt, data in graph.edges(data=True)} == kept_edges
+
+    entity_ids = {compute_mdhash_id(n, prefix="ent-") for n in orphaned_nodes}
+    assert rag.entities_vdb._client.get(list(entity_ids)) == []
+    assert rag.entities_vdb._client.get([compute_mdhash_id('"SHARED"', prefix="ent-")])
+    assert set(rag.extraction_staging._data) == kept_chunks
+    assert set(rag.text_chunks._data) == kept_chunks
+    assert rag.full_docs._data.keys() == {kept_id}
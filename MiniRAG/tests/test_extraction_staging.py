@@ -0,0 +1,93 @@
+import pytest
+
+from minirag.prompt import GRAPH_FIELD_SEP
+
+from conftest import StubExtractionLLM
+
+
+def make_docs(count, words=120):
+    """Documents with no words in common, words // 40 chunks each"""
+    return [" ".join(f"d{i}w{j}" for j in range(words)) for i in range(count)]
+
+
+def graph_snapshot(rag):
+    """Order-insensitive view of the graph, duplicated descriptions stay visible"""
+    graph = rag.chunk_entity_relation_graph._graph
+
+    def split(value):
+        return sorted(value.split(GRAPH_FIELD_SEP))
+
+    nodes = {
+        name: (split(data["description"]), split(data["source_id"]))
+        for name, data in graph.nodes(data=True)
+    }
+    edges = {
+        tuple(sorted((src, tgt))): (data["weight"], split(data["source_id"]))
+        for src, tgt, data in graph.edges(data=True)
+    }
+    return nodes, edges
+
+
+def test_reinsert_does_not_touch_the_graph(make_rag):
+    docs = make_docs(3)
+    llm = StubExtractionLLM()
+    rag = make_rag(llm)
+    rag.insert(docs)
+    first = graph_snapshot(rag)
+    assert llm.calls == 9
+
+    rag = make_rag(llm)
+    rag.insert(docs)
+
+    assert llm.calls == 9
+    assert graph_snapshot(rag) == first
+
+
+def test_resume_after_interrupted_extraction_matches_clean_run(make_rag):
+    docs = make_docs(3)
+    clean = make_rag(StubExtractionLLM(), name="clean")
+    clean.insert(docs)
+    expected_nodes, expected_edges = graph_snapshot(clean)
+
+    crashing = StubExtractionLLM(fail_after=5)
+    with pytest.raises(RuntimeError):
+        make_rag(crashing).insert(docs)
+
+    resumed_llm = StubExtractionLLM()
+    rag = make_rag(resumed_llm)
+    rag.insert(docs)
+    nodes, edges = graph_snapshot(rag)
+
+    # only the chunks the crashed run never extracted go to the LLM again
+    assert resumed_llm.calls == 9 - 5
+    assert nodes == expected_nodes
+    assert edges == expected_edges
+    shared_descriptions, shared_sources = nodes['"SHARED"']
+    assert len(shared_descriptions) == len(set(shared_descriptions)) == 9
+    assert len(shared_sources) == len(set(shared_sources)) == 9
+    assert {weight for weight, _ in edges.values()} == {2.0}
+
+
+def test_remerging_after_crash_before_merged_flag_counts_chunks_once(make_rag):
+    docs = make_docs(2)
+    clean = make_rag(StubExtractionLLM(), name="clean")
+    clean.insert(docs)
+    expected = graph_snapshot(clean)
+
+    llm = StubExtractionLLM()
+    rag = make_rag(llm)
+
+    async def crash(records):
+        raise RuntimeError("killed before the merged flag was written")
+
+    # the first checkpoint reaches the graph but its chunks stay unmerged
+    rag.extraction_staging.replace = crash
+    with pytest.raises(RuntimeError):
+        rag.insert(docs)
+
+    rag = make_rag(llm)
+    rag.insert(docs)
+
+    # staged results are reused, the merge skips chunks already in source_id
+    assert llm.calls == 6
+    assert graph_snapshot(rag) == expected
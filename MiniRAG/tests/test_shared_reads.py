@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from minirag.operate import _SharedChunkReads, _SharedGraphReads
+
+
+class FlakyStorage:
+    """Graph and KV reads that fail while a failing key is in the batch"""
+
+    def __init__(self, failing):
+        self.failing = set(failing)
+        self.batches = []
+
+    async def _read(self, ids):
+        self.batches.append(sorted(ids))
+        await asyncio.sleep(0.01)
+        if self.failing & set(ids):
+            raise ConnectionError(f"lost connection reading {sorted(ids)}")
+        return {id: {"id": id} for id in ids}
+
+    async def get_nodes_bulk(self, node_ids):
+        return await self._read(node_ids)
+
+    async def get_by_ids(self, ids, fields=None):
+        found = await self._read(ids)
+        return [found[id] for id in ids]
+
+
+@pytest.mark.asyncio
+async def test_failed_branch_does_not_poison_shared_graph_reads():
+    storage = FlakyStorage(failing={"A"})
+    reads = _SharedGraphReads(storage)
+
+    failing = asyncio.create_task(reads.get_nodes_bulk(["A", "B"]))
+    await asyncio.sleep(0)
+    # B is in flight in the failing branch, only C is fetched here
+    sharing = asyncio.create_task(reads.get_nodes_bulk(["B", "C"]))
+    independent = asyncio.create_task(reads.get_nodes_bulk(["D"]))
+    results = await asyncio.gather(failing, sharing, independent, return_exceptions=True)
+
+    assert storage.batches == [["A", "B"], ["C"], ["D"]]
+    # the shared key raises the fetch's own error, not a KeyError
+    assert isinstance(results[0], ConnectionError)
+    assert isinstance(results[1], ConnectionError)
+    assert results[2] == {"D": {"id": "D"}}
+
+    # failed keys are fetched again, keys that were read stay memoized
+    storage.failing.clear()
+    assert await reads.get_nodes_bulk(["A", "B", "C", "D"]) == {
+        k: {"id": k} for k in "ABCD"
+    }
+    assert storage.batches[3:] == [["A", "B"]]
+
+
+@pytest.mark.asyncio
+async def test_failed_branch_does_not_poison_shared_chunk_reads():
+    storage = FlakyStorage(failing={"chunk-1"})
+    reads = _SharedChunkReads(storage)
+
+    results = await asyncio.gather(
+        reads.get_by_ids(["chunk-1", "chunk-2"]),
+        reads.get_by_ids(["chunk-3"]),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[0], ConnectionError)
+    assert results[1] == [{"id": "chunk-3"}]
+
+    storage.failing.clear()
+    assert await reads.get_by_ids(["chunk-2", "chunk-3"]) == [
+        {"id": "chunk-2"},
+        {"id": "chunk-3"},
+    ]
+    assert storage.batches == [["chunk-1", "chunk-2"], ["chunk-3"], ["chunk-2"]]
@@ -8,7 +8,9 @@ import sys
 import asyncio
 import json
 import time
-from flask import Flask, request, jsonify, abort, Response, stream_with_context
+import atexit
+import threading
+from flask import Flask, request, jsonify, abort, Response, stream_with_context, g
 from flask_cors import CORS
 from flask_swagger_ui import get_swaggerui_blueprint
 from typing import Optional
@@ -18,6 +20,8 @@ import logging
 # Import bot
 sys.path.append('..')
 from insurance_bot_minirag import InsuranceBotMiniRAG
+from minirag import tracing  # sys.path tới MiniRAG đã được insurance_bot_minirag thêm
+import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -240,9 +244,28 @@ def swagger_ui_index():
         from flask import redirect
         return redirect('/api/docs/index.html?url=/api/spec')
 
-# Global bot instance
+# Global bot instance (None cho tới khi load xong storages, xem start_bot_init)
 bot: Optional[InsuranceBotMiniRAG] = None
 
+# Pre-warm embedding chạy nền sau khi bot ready, tối đa PREWARM_TIMEOUT giây
+PREWARM_ENABLED = os.environ.get('PREWARM_ENABLED', 'true').lower() == 'true'
+PREWARM_TIMEOUT = float(os.environ.get('PREWARM_TIMEOUT', 30))
+
+# Trạng thái khởi động: /health trả lời ngay, /ready trả 200 khi index đã load xong
+#   status:  starting -> loading -> ready | failed
+#   prewarm: pending -> running -> done | failed | cancelled | disabled
+_startup_lock = threading.Lock()
+startup_state = {
+    "status": "starting",
+    "error": None,
+    "started_at": time.time(),
+    "ready_at": None,
+    "load_seconds": None,
+    "prewarm": "pending",
+}
+_prewarm_loop: Optional[asyncio.AbstractEventLoop] = None
+_prewarm_task: Optional[asyncio.Task] = None
+
 # OpenAPI Specification
 OPENAPI_SPEC = {
     "openapi": "3.0.3",
@@ -284,6 +307,35 @@ OPENAPI_SPEC = {
                 "tags": ["Health"]
             }
         },
+        "/ready": {
+            "get": {
+                "summary": "Readiness Check",
+                "description": "200 khi bot đã load xong storages/index và sẵn sàng trả lời, 503 khi đang khởi động hoặc khởi động lỗi",
+                "responses": {
+                    "200": {
+                        "description": "Bot ready",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "$ref": "#/components/schemas/ReadyResponse"
+                                }
+                            }
+                        }
+                    },
+                    "503": {
+                        "description": "Bot đang khởi động hoặc khởi động lỗi",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "$ref": "#/components/schemas/ReadyResponse"
+                                }
+                            }
+                        }
+                    }
+                },
+                "tags": ["Health"]
+            }
+        },
         "/chat": {
             "post": {
                 "summary": "Chat với Bot",
@@ -381,6 +433,75 @@ OPENAPI_SPEC = {
                 "tags": ["Chat"]
             }
         },
+        "/metrics": {
+            "get": {
+                "summary": "Prometheus Metrics",
+                "description": "Metrics dạng Prometheus text format: latency theo route, TTFT, tỉ lệ hit của response/embedding cache, số lần gọi + token + lỗi của LLM/embedding, queue của limiter MiniRAG, kích thước vector store. METRICS_ENABLED=false tắt (trả về rỗng).",
+                "responses": {
+                    "200": {
+                        "description": "Prometheus exposition format 0.0.4",
+                        "content": {
+                            "text/plain": {
+                                "schema": {
+                                    "type": "string"
+                                }
+                            }
+                        }
+                    }
+                },
+                "tags": ["Debug"]
+            }
+        },
+        "/debug/traces": {
+            "get": {
+                "summary": "Recent Traces",
+                "description": "Các trace gần nhất trong ring buffer của process (thời gian từng bước: keyword LLM, embedding, vector query, graph/chunk fetch, truncate, LLM trả lời). format=otlp trả về OTLP/JSON để import vào Jaeger/Tempo.",
+                "security": [
+                    {
+                        "ApiKeyAuth": []
+                    },
+                    {
+                        "BearerAuth": []
+                    }
+                ],
+                "parameters": [
+                    {
+                        "name": "limit",
+                        "in": "query",
+                        "schema": {"type": "integer", "default": 20},
+                        "description": "Số trace trả về, mới nhất trước"
+                    },
+                    {
+                        "name": "format",
+                        "in": "query",
+                        "schema": {"type": "string", "enum": ["summary", "otlp"], "default": "summary"}
+                    }
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Recent traces",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "$ref": "#/components/schemas/TracesResponse"
+                                }
+                            }
+                        }
+                    },
+                    "401": {
+                        "description": "Unauthorized - Missing or invalid API key",
+                        "content": {
+                            "application/json": {
+                                "schema": {
+                                    "$ref": "#/components/schemas/ErrorResponse"
+                                }
+                            }
+                        }
+                    }
+                },
+                "tags": ["Debug"]
+            }
+        },
         "/": {
             "get": {
                 "summary": "API Info",
@@ -418,12 +539,80 @@ OPENAPI_SPEC = {
                         "type": "boolean",
                         "example": True
                     },
+                    "startup": {
+                        "type": "string",
+                        "enum": ["starting", "loading", "ready", "failed"],
+                        "example": "ready"
+                    },
                     "version": {
                         "type": "string",
                         "example": "1.0.0"
                     }
                 }
             },
+            "ReadyResponse": {
+                "type": "object",
+                "properties": {
+                    "ready": {
+                        "type": "boolean",
+                        "example": True
+                    },
+                    "status": {
+                        "type": "string",
+                        "enum": ["starting", "loading", "ready", "failed"],
+                        "example": "ready"
+                    },
+                    "error": {
+                        "type": "string",
+                        "nullable": True,
+                        "example": None
+                    },
+                    "load_seconds": {
+                        "type": "number",
+                        "nullable": True,
+                        "example": 4.2
+                    },
+                    "prewarm": {
+                        "type": "string",
+                        "enum": ["pending", "running", "done", "failed", "cancelled", "disabled"],
+                        "example": "done"
+                    },
+                    "uptime": {
+                        "type": "number",
+                        "example": 12.5
+                    }
+                }
+            },
+            "TracesResponse": {
+                "type": "object",
+                "properties": {
+                    "enabled": {
+                        "type": "boolean",
+                        "example": True
+                    },
+                    "buffered": {
+                        "type": "integer",
+                        "example": 42
+                    },
+                    "traces": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "trace_id": {"type": "string"},
+                                "name": {"type": "string", "example": "bot.chat"},
+                                "start": {"type": "number"},
+                                "duration_ms": {"type": "number", "example": 2350.4},
+                                "error": {"type": "string", "nullable": True},
+                                "spans": {
+                                    "type": "array",
+                                    "items": {"type": "object"}
+                                }
+                            }
+                        }
+                    }
+                }
+            },
             "ChatRequest": {
                 "type": "object",
                 "required": ["message"],
@@ -535,6 +724,10 @@ OPENAPI_SPEC = {
         {
             "name": "Info",
             "description": "Thông tin API"
+        },
+        {
+            "name": "Debug",
+            "description": "Chẩn đoán hiệu năng"
         }
     ]
 }
@@ -561,24 +754,126 @@ def get_or_create_event_loop():
             asyncio.set_event_loop(_global_event_loop)
     return _global_event_loop
 
+def _set_startup_state(**values):
+    with _startup_lock:
+        startup_state.update(values)
+
+def get_startup_state() -> dict:
+    with _startup_lock:
+        return dict(startup_state)
+
 def init_bot():
-    """Initialize bot synchronously"""
+    """Initialize bot synchronously (load toàn bộ storages), pre-warm để riêng"""
     global bot
+    start = time.time()
+    _set_startup_state(status="loading")
     try:
         logger.info("🚀 Initializing Insurance Bot...")
-        loop = get_or_create_event_loop()
-        bot = InsuranceBotMiniRAG()
-        logger.info("✅ Insurance Bot ready!")
+        bot = InsuranceBotMiniRAG(pre_warm=False)
+        load_seconds = time.time() - start
+        _set_startup_state(status="ready", ready_at=time.time(), load_seconds=load_seconds)
+        logger.info(f"✅ Insurance Bot ready! ({load_seconds:.1f}s)")
         return True
     except Exception as e:
+        _set_startup_state(status="failed", error=str(e))
         logger.error(f"❌ Failed to initialize bot: {e}")
         return False
 
+def _run_prewarm():
+    """Chạy bot.pre_warm() trên event loop riêng của thread này (cancel được qua cancel_prewarm)"""
+    global _prewarm_loop, _prewarm_task
+    loop = asyncio.new_event_loop()
+    with _startup_lock:
+        if startup_state["prewarm"] == "cancelled":
+            loop.close()
+            return
+        _prewarm_loop = loop
+        _prewarm_task = loop.create_task(bot.pre_warm(timeout=PREWARM_TIMEOUT))
+        startup_state["prewarm"] = "running"
+    try:
+        ok = loop.run_until_complete(_prewarm_task)
+        _set_startup_state(prewarm="done" if ok else "failed")
+    except asyncio.CancelledError:
+        _set_startup_state(prewarm="cancelled")
+        logger.info("🛑 Pre-warm cancelled")
+    finally:
+        with _startup_lock:
+            _prewarm_loop = _prewarm_task = None
+        loop.close()
+
+def cancel_prewarm():
+    """Hủy pre-warm đang chạy (hoặc chưa chạy), an toàn khi gọi từ thread bất kỳ"""
+    with _startup_lock:
+        if startup_state["prewarm"] in ("pending", "running"):
+            startup_state["prewarm"] = "cancelled"
+        if _prewarm_task is not None and not _prewarm_task.done():
+            _prewarm_loop.call_soon_threadsafe(_prewarm_task.cancel)
+
+atexit.register(cancel_prewarm)
+
+def _init_in_background():
+    if not init_bot():
+        return
+    if not PREWARM_ENABLED:
+        _set_startup_state(prewarm="disabled")
+        return
+    _run_prewarm()
+
+def start_bot_init() -> threading.Thread:
+    """Load bot trong thread nền để server nhận request (/health, /ready) ngay"""
+    thread = threading.Thread(target=_init_in_background, name="bot-init", daemon=True)
+    thread.start()
+    return thread
+
+def _bot_not_ready():
+    """503 + Retry-After khi bot đang load hoặc load lỗi"""
+    state = get_startup_state()
+    response = jsonify({
+        "error": "Bot not initialized" if state["status"] == "failed" else "Bot is starting, please retry",
+        "status": state["status"],
+    })
+    response.status_code = 503
+    if state["status"] != "failed":
+        response.headers['Retry-After'] = '5'
+    return response
+
 @app.route("/api/spec", methods=["GET"])
 def api_spec():
     """OpenAPI specification endpoint"""
     return jsonify(OPENAPI_SPEC)
 
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _observe_request(response):
+    """Histogram latency theo route; response stream được đo khi gửi xong"""
+    start = g.pop("request_start", None)
+    if start is None or not metrics.REGISTRY.enabled:
+        return response
+    # rule thay vì path: 404 với path ngẫu nhiên không làm nổ số label
+    labels = {
+        "route": request.url_rule.rule if request.url_rule else "unmatched",
+        "method": request.method,
+        "status": str(response.status_code),
+    }
+
+    def observe():
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, **labels)
+
+    if response.is_streamed:
+        response.call_on_close(observe)
+    else:
+        observe()
+    return response
+
+def _collect_bot_metrics():
+    if bot is not None:
+        bot.update_metrics()
+
+metrics.REGISTRY.add_collector(_collect_bot_metrics)
+
 @app.after_request
 def inject_swagger_auth(response):
     """Inject JavaScript to auto-set API key in Swagger UI"""
@@ -642,12 +937,49 @@ def inject_swagger_auth(response):
 
 @app.route("/health", methods=["GET"])
 def health_check():
-    """Health check endpoint"""
+    """Liveness: trả lời ngay cả khi bot đang load, 503 chỉ khi load lỗi"""
+    state = get_startup_state()
+    failed = state["status"] == "failed"
     return jsonify({
-        "status": "healthy",
+        "status": "unhealthy" if failed else "healthy",
         "timestamp": time.time(),
         "bot_ready": bot is not None,
+        "startup": state["status"],
         "version": "1.0.0"
+    }), 503 if failed else 200
+
+@app.route("/ready", methods=["GET"])
+def ready_check():
+    """Readiness: 200 khi storages/index đã load xong, 503 khi đang load hoặc lỗi"""
+    state = get_startup_state()
+    ready = state["status"] == "ready" and bot is not None
+    return jsonify({
+        "ready": ready,
+        "timestamp": time.time(),
+        "uptime": time.time() - state["started_at"],
+        **state,
+    }), 200 if ready else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus text format (latency, TTFT, cache, LLM/embedding, limiter, vector store)"""
+    return Response(metrics.REGISTRY.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
+
+@app.route("/debug/traces", methods=["GET"])
+@require_api_key
+def debug_traces():
+    """Trace gần nhất (mới nhất trước), format=otlp để import vào Jaeger/Tempo"""
+    try:
+        limit = max(0, int(request.args.get("limit", 20)))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    traces = tracing.recent_traces(limit)
+    if request.args.get("format") == "otlp":
+        return jsonify(tracing.to_otlp_json(traces))
+    return jsonify({
+        "enabled": tracing.ENABLED,
+        "buffered": len(tracing.buffer),
+        "traces": [tracing.summarize(spans) for spans in traces],
     })
 
 @app.route("/chat", methods=["POST"])
@@ -655,7 +987,7 @@ def health_check():
 def chat_endpoint():
     """Main chat endpoint - Non-streaming"""
     if not bot:
-        return jsonify({"error": "Bot not initialized"}), 503
+        return _bot_not_ready()
 
     try:
         data = request.get_json()
@@ -702,7 +1034,7 @@ def chat_endpoint():
 def chat_stream_endpoint():
     """Streaming chat endpoint - Server-Sent Events (SSE)"""
     if not bot:
-        return jsonify({"error": "Bot not initialized"}), 503
+        return _bot_not_ready()
 
     try:
         data = request.get_json()
@@ -778,26 +1110,26 @@ def root():
         "swagger_ui": f"http://localhost:8001{SWAGGER_URL}",
         "api_spec": f"http://localhost:8001{API_URL}",
         "endpoints": {
-            "GET /health": "Health check",
+            "GET /health": "Health check (liveness)",
+            "GET /ready": "Readiness - 200 khi bot đã load xong",
             "POST /chat": "Chat with bot",
+            "GET /metrics": "Prometheus metrics",
+            "GET /debug/traces": "Thời gian từng bước của các query gần nhất",
             "GET /api/docs": "Swagger UI documentation",
             "GET /api/spec": "OpenAPI specification"
         }
     })
 
 if __name__ == "__main__":
-    # Initialize bot
-    if init_bot():
-        logger.info(f"🚀 Starting server on {API_HOST}:{API_PORT}")
-        logger.info(f"📚 Swagger UI: http://localhost:{API_PORT}/api/docs")
-        logger.info(f"🔗 API Spec: http://localhost:{API_PORT}/api/spec")
-        # Run server
-        app.run(
-            host=API_HOST,
-            port=API_PORT,
-            debug=False,
-            threaded=True
-        )
-    else:
-        logger.error("❌ Cannot start server - bot initialization failed")
-        sys.exit(1)
+    # Load bot trong background, server nhận request ngay (/ready = 503 cho tới khi xong)
+    start_bot_init()
+    logger.info(f"🚀 Starting server on {API_HOST}:{API_PORT}")
+    logger.info(f"📚 Swagger UI: http://localhost:{API_PORT}/api/docs")
+    logger.info(f"🔗 API Spec: http://localhost:{API_PORT}/api/spec")
+    # Run server
+    app.run(
+        host=API_HOST,
+        port=API_PORT,
+        debug=False,
+        threaded=True
+    )
@@ -6,7 +6,10 @@ Insurance Bot sử dụng MiniRAG framework thay vì Neo4J trực tiếp
 import os
 import sys
 import asyncio
+import concurrent.futures
+import contextlib
 import hashlib
+import threading
 import time
 from typing import Dict, List, Optional
 
@@ -31,7 +34,10 @@ from minirag import MiniRAG, QueryParam
 from minirag.llm import gpt_4o_mini_complete
 from minirag.utils import EmbeddingFunc
 from minirag.operate import PROMPTS
+from minirag import tracing
 from openai import AsyncOpenAI
+from shared_cache import create_shared_cache
+import metrics
 
 # Override MiniRAG prompt để sử dụng INSURANCE_BOT_PROMPT tùy chỉnh
 # (sẽ được set sau khi định nghĩa INSURANCE_BOT_PROMPT)
@@ -60,12 +66,12 @@ class EmbeddingCache:
                 del self.cache[cache_key]
         return None
 
-    def set(self, text: str, embedding: List[float]):
-        """Lưu embedding vào cache"""
+    def set(self, text: str, embedding: List[float], timestamp: Optional[float] = None):
+        """Lưu embedding vào cache (timestamp: thời điểm ghi gốc khi nạp từ shared cache)"""
         cache_key = self._get_cache_key(text)
         self.cache[cache_key] = {
             'embedding': embedding,
-            'timestamp': time.time()
+            'timestamp': timestamp if timestamp is not None else time.time()
         }
         print(f"💾 Cached embedding for: {text[:50]}...")
 
@@ -81,31 +87,131 @@ class EmbeddingCache:
         if expired_keys:
             print(f"🗑️ Cleared {len(expired_keys)} expired cache entries")
 
-# Global embedding cache
+class _StreamTee:
+    """Chia một stream đang chạy cho nhiều request cùng câu hỏi.
+
+    Task sinh câu trả lời append() từng chunk, mọi request (kể cả leader) đọc
+    lại từ đầu qua follow(). Mỗi request Flask chạy event loop riêng nên
+    follower được đánh thức bằng call_soon_threadsafe trên loop của chính nó.
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self._lock = threading.Lock()
+        self._waiters = []
+
+    def _notify(self):
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # loop của follower đã đóng (client ngắt kết nối)
+                pass
+
+    def append(self, chunk: str):
+        with self._lock:
+            self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self):
+        with self._lock:
+            self.done = True
+        self._notify()
+
+    async def follow(self):
+        index = 0
+        while True:
+            event = None
+            with self._lock:
+                new_chunks = self.chunks[index:]
+                done = self.done
+                if not new_chunks and not done:
+                    event = asyncio.Event()
+                    self._waiters.append((asyncio.get_running_loop(), event))
+            for chunk in new_chunks:
+                yield chunk
+            index += len(new_chunks)
+            if event is not None:
+                await event.wait()
+            elif done and not new_chunks:
+                return
+
+# Global embedding cache (L1 trong process)
 embedding_cache = EmbeddingCache()
 
-# Singleton OpenAI client để reuse connection (tối ưu performance)
-_openai_client: Optional[AsyncOpenAI] = None
+# Cache dùng chung giữa các replica (Redis), None khi SHARED_CACHE_BACKEND=none
+shared_cache = create_shared_cache(config)
+
+# OpenAI client dùng chung để reuse connection (tối ưu performance), một client
+# cho mỗi event loop: connection pool của httpx gắn với loop tạo ra nó, API chạy
+# asyncio.run() mỗi request nên dùng lại client của loop đã đóng sẽ lỗi "Event loop is closed".
+# Client giữ tham chiếu tới loop nên phải đóng khi loop xong việc: chat/chat_stream/pre_warm
+# mở loop_clients_scope(), scope cuối cùng của loop thoát thì client (và kết nối
+# shared cache của loop đó) được close.
+_openai_clients: Dict[asyncio.AbstractEventLoop, "_LoopOpenAIClient"] = {}
+
+
+class _LoopOpenAIClient:
+    """Client của một event loop và số scope đang dùng nó"""
+
+    def __init__(self):
+        self.client: Optional[AsyncOpenAI] = None
+        self.users = 0
+
+
+def _create_openai_client() -> AsyncOpenAI:
+    api_key = os.environ.get('OPENAI_API_KEY') or config.get('DEFAULT', 'OPENAI_API_KEY', fallback=None)
+    base_url = os.environ.get('OPENAI_BASE_URL') or os.environ.get('OPENAI_API_BASE') or config.get('DEFAULT', 'OPENAI_BASE_URL', fallback=None)
+
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables or config file")
+
+    # Tối ưu: reuse connections, timeout ngắn hơn
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=30.0,  # Timeout 30s thay vì default
+        max_retries=2,  # Giảm retries để fail fast
+    )
+
 
 def get_openai_client() -> AsyncOpenAI:
-    """Get or create singleton OpenAI client với connection pooling"""
-    global _openai_client
-    if _openai_client is None:
-        api_key = os.environ.get('OPENAI_API_KEY') or config.get('DEFAULT', 'OPENAI_API_KEY', fallback=None)
-        base_url = os.environ.get('OPENAI_BASE_URL') or os.environ.get('OPENAI_API_BASE') or config.get('DEFAULT', 'OPENAI_BASE_URL', fallback=None)
-        
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables or config file")
-        
-        # Tối ưu: reuse connections, timeout ngắn hơn
-        _openai_client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            timeout=30.0,  # Timeout 30s thay vì default
-            max_retries=2,  # Giảm retries để fail fast
-        )
-        print("✅ OpenAI client initialized (singleton, connection pooling enabled)")
-    return _openai_client
+    """Get or create OpenAI client (connection pooling) của event loop đang chạy"""
+    loop = asyncio.get_running_loop()
+    entry = _openai_clients.get(loop)
+    if entry is None:
+        # gọi ngoài loop_clients_scope() (hoặc loop bị đóng khi scope chưa thoát):
+        # không ai close được, bỏ tham chiếu khi loop đã đóng
+        for other in [l for l in _openai_clients if l.is_closed()]:
+            del _openai_clients[other]
+        entry = _openai_clients[loop] = _LoopOpenAIClient()
+    if entry.client is None:
+        entry.client = _create_openai_client()
+        if len(_openai_clients) == 1:
+            print("✅ OpenAI client initialized (per event loop, connection pooling enabled)")
+    return entry.client
+
+
+@contextlib.asynccontextmanager
+async def loop_clients_scope():
+    """Giữ client của loop hiện tại; scope cuối cùng của loop thoát thì close
+    OpenAI client và kết nối shared cache của loop"""
+    loop = asyncio.get_running_loop()
+    entry = _openai_clients.setdefault(loop, _LoopOpenAIClient())
+    entry.users += 1
+    try:
+        yield
+    finally:
+        entry.users -= 1
+        if entry.users == 0 and _openai_clients.get(loop) is entry:
+            del _openai_clients[loop]
+            if entry.client is not None:
+                await entry.client.close()
+            if shared_cache is not None:
+                await shared_cache.close_loop()
 
 async def get_openai_embedding_func(texts):
     """Async OpenAI embedding function cho MiniRAG với cache và connection reuse"""
@@ -122,26 +228,61 @@ async def get_openai_embedding_func(texts):
             else:
                 texts_to_fetch.append(text)
                 cache_indices.append(i)
+        metrics.record_cache('embedding', 'l1', len(cached_embeddings), len(texts_to_fetch))
+
+        embedding_model = os.environ.get('EMBEDDING_MODEL') or config.get('DEFAULT', 'EMBEDDING_MODEL', fallback='text-embedding-3-small')
+
+        # L1 miss -> thử shared cache (một round trip cho cả batch)
+        if texts_to_fetch and shared_cache is not None:
+            shared_hits = await shared_cache.get_embeddings(embedding_model, texts_to_fetch)
+            metrics.record_cache('embedding', 'shared', len(shared_hits), len(texts_to_fetch) - len(shared_hits))
+            if shared_hits:
+                now = time.time()
+                remaining_texts, remaining_indices = [], []
+                for text, i in zip(texts_to_fetch, cache_indices):
+                    if text in shared_hits:
+                        embedding, ttl_left = shared_hits[text]
+                        # giữ nguyên thời điểm hết hạn của entry gốc
+                        timestamp = now - (embedding_cache.ttl_seconds - ttl_left) if ttl_left is not None else now
+                        embedding_cache.set(text, embedding, timestamp=timestamp)
+                        cached_embeddings.append((i, embedding))
+                    else:
+                        remaining_texts.append(text)
+                        remaining_indices.append(i)
+                texts_to_fetch, cache_indices = remaining_texts, remaining_indices
 
         # Chỉ gọi API cho texts chưa có trong cache
         if texts_to_fetch:
             print(f"🔍 Fetching embeddings for {len(texts_to_fetch)} texts...")
-            embedding_model = os.environ.get('EMBEDDING_MODEL') or config.get('DEFAULT', 'EMBEDDING_MODEL', fallback='text-embedding-3-small')
             
             # Reuse singleton client (connection pooling)
             client = get_openai_client()
 
             # Batch request với timeout ngắn
-            response = await client.embeddings.create(
-                input=texts_to_fetch,
-                model=embedding_model
-            )
+            try:
+                response = await client.embeddings.create(
+                    input=texts_to_fetch,
+                    model=embedding_model
+                )
+            except Exception:
+                metrics.EMBEDDING_REQUESTS.inc(status='error')
+                raise
+            metrics.EMBEDDING_REQUESTS.inc(status='ok')
+            metrics.EMBEDDING_TEXTS.inc(len(texts_to_fetch))
+            if getattr(response, 'usage', None) is not None:
+                metrics.EMBEDDING_TOKENS.inc(response.usage.total_tokens)
 
             fetched_embeddings = [data.embedding for data in response.data]
 
             # Cache các embeddings mới
             for text, embedding in zip(texts_to_fetch, fetched_embeddings):
                 embedding_cache.set(text, embedding)
+            if shared_cache is not None:
+                await shared_cache.set_embeddings(
+                    embedding_model,
+                    dict(zip(texts_to_fetch, fetched_embeddings)),
+                    embedding_cache.ttl_seconds,
+                )
         else:
             fetched_embeddings = []
 
@@ -163,6 +304,22 @@ async def get_openai_embedding_func(texts):
         # Return dummy embeddings if OpenAI fails
         return [[0.1] * 1536 for _ in texts]
 
+async def insurance_llm_complete(prompt, system_prompt=None, history_messages=[], **kwargs):
+    """gpt_4o_mini_complete + đếm số lần gọi, lỗi và token cho /metrics"""
+    try:
+        result = await gpt_4o_mini_complete(
+            prompt,
+            system_prompt=system_prompt,
+            history_messages=history_messages,
+            token_tracker=metrics.llm_token_tracker,
+            **kwargs,
+        )
+    except Exception:
+        metrics.LLM_REQUESTS.inc(mode='complete', status='error')
+        raise
+    metrics.LLM_REQUESTS.inc(mode='complete', status='ok')
+    return result
+
 # Insurance Bot Prompt
 INSURANCE_BOT_PROMPT = """
 ### VAI TRÒ VÀ BỐI CẢNH 
@@ -373,7 +530,9 @@ Bot (SAI): "Mức phí bảo hiểm xe máy thường được xác định dự
 class InsuranceBotMiniRAG:
     """Bot sử dụng MiniRAG framework"""
 
-    def __init__(self):
+    def __init__(self, pre_warm: bool = True):
+        """pre_warm=False: không tính sẵn embedding trong __init__, caller tự gọi
+        pre_warm() (API chạy nó trong background để không chặn khởi động)"""
         print("🚀 Initializing Insurance Bot with MiniRAG...")
 
         # Ưu tiên đọc từ environment variables
@@ -393,6 +552,8 @@ class InsuranceBotMiniRAG:
         # ✅ GPT-4o-mini: Đảm bảo chất lượng câu trả lời chính xác (quan trọng hơn tốc độ)
         llm_max_tokens = int(os.environ.get('OPENAI_LLM_MAX_TOKENS') or config.get('DEFAULT', 'OPENAI_LLM_MAX_TOKENS', fallback='1200'))
         llm_model = os.environ.get('OPENAI_LLM_MODEL') or config.get('DEFAULT', 'OPENAI_LLM_MODEL', fallback='gpt-4o-mini')
+        # Số thread load storages (KV, vector DB, graph) song song lúc khởi động
+        storage_init_workers = int(os.environ.get('STORAGE_INIT_WORKERS') or config.get('DEFAULT', 'STORAGE_INIT_WORKERS', fallback='4'))
         
         print(f"📁 Working directory: {working_dir}")
 
@@ -425,7 +586,7 @@ class InsuranceBotMiniRAG:
 
         self.rag = MiniRAG(
             working_dir=working_dir,
-            llm_model_func=gpt_4o_mini_complete,
+            llm_model_func=insurance_llm_complete,
             llm_model_max_token_size=llm_max_tokens,
             llm_model_name=llm_model,
             llm_model_kwargs={
@@ -436,54 +597,191 @@ class InsuranceBotMiniRAG:
                 max_token_size=1000,
                 func=get_openai_embedding_func,
             ),
+            storage_init_workers=storage_init_workers,
         )
 
         # Cache cho response với TTL
         self.response_cache: Dict[str, Dict] = {}
         self.cache_ttl = 3600  # 1 giờ
+        # Tầng cache dùng chung giữa các replica (sau response_cache)
+        self.shared_cache = shared_cache
+
+        # Single-flight trong process: câu hỏi giống nhau đang xử lý thì request
+        # sau chờ kết quả của request đầu thay vì gọi lại MiniRAG + LLM
+        self._inflight_lock = threading.Lock()
+        self._inflight_chats: Dict[str, concurrent.futures.Future] = {}
+        self._inflight_streams: Dict[str, _StreamTee] = {}
+        self.coalesced_requests = 0
+        # Loop nền cho stream đang sinh: chạy xong và ghi cache kể cả khi mọi
+        # request đọc stream đã ngắt (loop của request Flask đóng theo request)
+        self._stream_loop: Optional[asyncio.AbstractEventLoop] = None
         
         # Pre-warm cache với common queries (tối ưu tốc độ)
-        self._pre_warm_cache()
+        if pre_warm:
+            self._pre_warm_cache()
         
         print("✅ Insurance Bot with MiniRAG initialized!")
     
+    # Câu hỏi phổ biến, embedding được tính sẵn lúc khởi động
+    COMMON_QUERIES = [
+        "Bảo hiểm xe máy là gì?",
+        "Phí bảo hiểm xe máy bao nhiêu?",
+        "Quy trình mua bảo hiểm xe máy?",
+        "Bảo hiểm sức khỏe là gì?",
+        "Bảo hiểm bắt buộc là gì?",
+        "Bảo hiểm ô tô là gì?",
+        "Quy trình nộp hồ sơ bồi thường?",
+        "Bảo hiểm y tế là gì?",
+    ]
+
+    async def pre_warm(self, timeout: Optional[float] = None) -> bool:
+        """Tính sẵn embedding cho COMMON_QUERIES (batch một lần).
+
+        True khi xong; False khi lỗi hoặc quá timeout (giây). Bị cancel thì
+        CancelledError được ném lại cho caller.
+        """
+        try:
+            print(f"🔥 Pre-warming cache với {len(self.COMMON_QUERIES)} common queries...")
+            async with loop_clients_scope():
+                await asyncio.wait_for(get_openai_embedding_func(self.COMMON_QUERIES), timeout)
+            print(f"✅ Pre-warmed cache với {len(self.COMMON_QUERIES)} common queries")
+            return True
+        except asyncio.TimeoutError:
+            print(f"⚠️ Pre-warm cache timeout sau {timeout}s")
+        except Exception as e:
+            print(f"⚠️ Pre-warm cache error: {e}")
+        return False
+
     def _pre_warm_cache(self):
         """Pre-warm cache với common queries để tăng tốc độ (tối ưu như các ông lớn)"""
-        common_queries = [
-            "Bảo hiểm xe máy là gì?",
-            "Phí bảo hiểm xe máy bao nhiêu?",
-            "Quy trình mua bảo hiểm xe máy?",
-            "Bảo hiểm sức khỏe là gì?",
-            "Bảo hiểm bắt buộc là gì?",
-            "Bảo hiểm ô tô là gì?",
-            "Quy trình nộp hồ sơ bồi thường?",
-            "Bảo hiểm y tế là gì?",
-        ]
-        
-        # Pre-compute embeddings cho common queries (async, không block)
-        # Tối ưu: Batch embeddings để tăng tốc (như các ông lớn)
-        async def pre_warm_embeddings():
-            try:
-                print(f"🔥 Pre-warming cache với {len(common_queries)} common queries...")
-                # Batch embeddings để tăng tốc (thay vì từng cái một)
-                await get_openai_embedding_func(common_queries)
-                print(f"✅ Pre-warmed cache với {len(common_queries)} common queries")
-            except Exception as e:
-                print(f"⚠️ Pre-warm cache error: {e}")
-        
-        # Chạy pre-warm trong background (không block initialization)
         try:
             loop = asyncio.get_event_loop()
             if loop.is_running():
                 # Nếu loop đang chạy, schedule task
-                asyncio.create_task(pre_warm_embeddings())
+                asyncio.create_task(self.pre_warm())
             else:
                 # Nếu không, chạy sync
-                loop.run_until_complete(pre_warm_embeddings())
+                loop.run_until_complete(self.pre_warm())
         except Exception:
             # Nếu không có event loop, bỏ qua pre-warm
             pass
 
+    def _remember_response(self, cache_key: str, answer: str, ttl_left: Optional[float] = None):
+        """Ghi vào L1; ttl_left (từ shared cache) giữ nguyên thời điểm hết hạn gốc"""
+        now = time.time()
+        self.response_cache[cache_key] = {
+            'answer': answer,
+            'timestamp': now - (self.cache_ttl - ttl_left) if ttl_left is not None else now
+        }
+
+        # Cleanup expired cache entries (keep cache size manageable)
+        if len(self.response_cache) > 100:
+            expired_keys = [
+                key for key, entry in self.response_cache.items()
+                if now - entry['timestamp'] >= self.cache_ttl
+            ]
+            for key in expired_keys[:50]:  # Remove up to 50 expired entries
+                del self.response_cache[key]
+
+    async def _store_response(self, cache_key: str, answer: str):
+        """Ghi câu trả lời vào L1 và shared cache"""
+        self._remember_response(cache_key, answer)
+        if self.shared_cache is not None:
+            await self.shared_cache.set_response(cache_key, answer, self.cache_ttl)
+
+    async def _get_cached_response(self, cache_key: str) -> Optional[str]:
+        """Tra L1 rồi tới shared cache"""
+        entry = self.response_cache.get(cache_key)
+        if entry is not None:
+            age = time.time() - entry['timestamp']
+            if age < self.cache_ttl:
+                print(f"📋 Using cached response (saved {age:.1f}s ago)")
+                metrics.record_cache('response', 'l1', 1, 0)
+                return entry['answer']
+            # Cache expired
+            del self.response_cache[cache_key]
+        metrics.record_cache('response', 'l1', 0, 1)
+
+        if self.shared_cache is None:
+            return None
+        cached = await self.shared_cache.get_response(cache_key)
+        metrics.record_cache('response', 'shared', int(cached is not None), int(cached is None))
+        if cached is None:
+            return None
+        answer, ttl_left = cached
+        self._remember_response(cache_key, answer, ttl_left)
+        print("📋 Using shared cached response")
+        return answer
+
+    async def _acquire_or_wait(self, cache_key: str):
+        """Single-flight giữa các replica.
+
+        Trả về (token, None) nếu replica này phải tự tính (token None khi không
+        có shared cache hoặc hết thời gian chờ), (None, answer) nếu replica khác
+        đã tính xong.
+        """
+        if self.shared_cache is None:
+            return None, None
+        token = await self.shared_cache.acquire(cache_key)
+        if token is not None:
+            return token, None
+        print("⏳ Replica khác đang trả lời câu hỏi này, chờ kết quả...")
+        cached = await self.shared_cache.wait_for_response(cache_key)
+        if cached is None:
+            return None, None
+        answer, ttl_left = cached
+        self._remember_response(cache_key, answer, ttl_left)
+        return None, answer
+
+    def _join_inflight(self, inflight: Dict, cache_key: str, factory):
+        """(entry, is_leader): tạo entry mới nếu chưa ai xử lý cache_key"""
+        with self._inflight_lock:
+            entry = inflight.get(cache_key)
+            if entry is not None:
+                self.coalesced_requests += 1
+                return entry, False
+            entry = inflight[cache_key] = factory()
+            return entry, True
+
+    def _leave_inflight(self, inflight: Dict, cache_key: str):
+        with self._inflight_lock:
+            inflight.pop(cache_key, None)
+
+    def _get_stream_loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop chạy trong daemon thread riêng, tạo khi cần lần đầu"""
+        with self._inflight_lock:
+            if self._stream_loop is None:
+                self._stream_loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._stream_loop.run_forever, name="bot-stream", daemon=True
+                ).start()
+            return self._stream_loop
+
+    def stats(self) -> Dict:
+        """Số liệu cache/coalescing của bot"""
+        with self._inflight_lock:
+            stats = {
+                'response_cache_size': len(self.response_cache),
+                'embedding_cache_size': len(embedding_cache.cache),
+                'coalesced_requests': self.coalesced_requests,
+                'inflight_requests': len(self._inflight_chats) + len(self._inflight_streams),
+            }
+        if self.shared_cache is not None:
+            stats['shared_cache'] = self.shared_cache.stats()
+        return stats
+
+    def update_metrics(self):
+        """Cập nhật gauge của /metrics (gọi lúc scrape, không nằm trên đường request)"""
+        metrics.CACHE_ENTRIES.set(len(self.response_cache), cache='response')
+        metrics.CACHE_ENTRIES.set(len(embedding_cache.cache), cache='embedding')
+        metrics.record_limiter('llm', getattr(self.rag.llm_model_func, 'stats', lambda: None)())
+        metrics.record_limiter('embedding', getattr(self.rag.embedding_func, 'stats', lambda: None)())
+        for vdb in (self.rag.entities_vdb, self.rag.entity_name_vdb, self.rag.relationships_vdb, self.rag.chunks_vdb):
+            # NanoVectorDB giữ vector trong process; backend remote không đếm lúc scrape
+            storage = getattr(vdb, 'client_storage', None)
+            if storage is not None:
+                metrics.VECTOR_STORE_SIZE.set(len(storage['data']), namespace=vdb.namespace)
+
     def extract_keywords(self, question: str):
         """Trích xuất từ khóa từ câu hỏi"""
         stop_words = ['là', 'cái', 'đó', 'đây', 'ở', 'tại', 'và', 'hoặc', 'như', 'thế nào', 'gì', 'được', 'có', 'không']
@@ -508,20 +806,69 @@ class InsuranceBotMiniRAG:
 
     async def chat_stream(self, question: str):
         """Chat với bot sử dụng streaming - Trả về async generator (công nghệ mới nhất)"""
+        async with loop_clients_scope():
+            async for content in self._chat_stream(question):
+                yield content
+
+    async def _chat_stream(self, question: str):
+        """chat_stream() trong scope client của loop"""
         print(f"👤 Question (streaming): {question}")
         start_time = time.time()
         
         # Check cache first (không stream cached responses)
         cache_key = question.lower().strip()
-        if cache_key in self.response_cache:
-            entry = self.response_cache[cache_key]
-            if time.time() - entry['timestamp'] < self.cache_ttl:
-                print(f"📋 Using cached response (streaming disabled for cache)")
-                # Trả về cached response như một chunk
-                yield entry['answer']
-                return
-        
+        cached = await self._get_cached_response(cache_key)
+        if cached is not None:
+            # Trả về cached response như một chunk
+            yield cached
+            return
+
+        tee, is_leader = self._join_inflight(self._inflight_streams, cache_key, _StreamTee)
+        if is_leader:
+            # Sinh câu trả lời trên loop nền, stream của leader cũng chỉ là một follower:
+            # leader ngắt giữa chừng thì follower vẫn nhận đủ và câu trả lời vẫn được cache
+            asyncio.run_coroutine_threadsafe(
+                self._produce_stream(tee, question, cache_key, start_time),
+                self._get_stream_loop(),
+            )
+        else:
+            print("🔗 Coalesced: câu hỏi đang được trả lời, dùng chung stream")
+        async for content in tee.follow():
+            yield content
+
+    async def _produce_stream(self, tee: _StreamTee, question: str, cache_key: str, start_time: float):
+        """Chạy trọn stream của leader vào tee, không phụ thuộc request nào còn đọc"""
+        try:
+            async with loop_clients_scope():
+                async for content in self._stream_leader(question, cache_key, start_time):
+                    tee.append(content)
+        except Exception as e:
+            print(f"❌ Streaming error: {e}")
+        finally:
+            self._leave_inflight(self._inflight_streams, cache_key)
+            tee.finish()
+
+    async def _stream_leader(self, question: str, cache_key: str, start_time: float):
+        """Stream của request dẫn đầu (single-flight giữa các replica nếu có shared cache)"""
+        token, answer = await self._acquire_or_wait(cache_key)
+        if answer is not None:
+            yield answer
+            return
+
+        try:
+            async for content in self._stream_answer(question, cache_key, start_time):
+                yield content
+        finally:
+            if token is not None:
+                await self.shared_cache.release(cache_key, token)
+
+    async def _stream_answer(self, question: str, cache_key: str, start_time: float):
+        """Stream câu trả lời mới (không qua cache)"""
         print("🔍 Querying MiniRAG with streaming (latest tech)...")
+        # span bắt đầu/kết thúc thủ công: generator bị resume qua nhiều task khác nhau
+        root_span = tracing.start_span("bot.chat_stream", root=True)
+        llm_span = tracing.NOOP_SPAN
+        llm_running = False
         
         try:
             # Bước 1: Lấy context từ MiniRAG (nhanh, không stream)
@@ -538,7 +885,8 @@ class InsuranceBotMiniRAG:
             
             # Lấy context (nhanh)
             context_start = time.time()
-            context = await self.rag.aquery(question, param=query_param_context)
+            with tracing.use_span(root_span):
+                context = await self.rag.aquery(question, param=query_param_context)
             context_time = time.time() - context_start
             print(f"⏱️ Context retrieval: {context_time:.2f}s")
             print(f"📄 Context length: {len(context) if context else 0} chars")
@@ -604,18 +952,23 @@ class InsuranceBotMiniRAG:
             ]
             
             # Stream từ OpenAI
+            llm_span = tracing.start_span("llm.stream", parent=root_span, model=llm_model)
+            llm_running = True
             stream = await client.chat.completions.create(
                 model=llm_model,
                 messages=messages,
                 max_tokens=llm_max_tokens,
                 temperature=0.7,
-                stream=True  # Enable streaming
+                stream=True,  # Enable streaming
+                stream_options={"include_usage": True},  # chunk cuối có usage (token cho /metrics)
             )
             
             full_response = ""
             first_token_time = None
             
             async for chunk in stream:
+                if getattr(chunk, 'usage', None) is not None:
+                    metrics.llm_token_tracker.add_usage(chunk.usage.model_dump())
                 if chunk.choices and len(chunk.choices) > 0:
                     delta = chunk.choices[0].delta
                     if hasattr(delta, 'content') and delta.content:
@@ -626,14 +979,16 @@ class InsuranceBotMiniRAG:
                         if first_token_time is None:
                             first_token_time = time.time() - start_time
                             print(f"⚡ TTFT (Time To First Token): {first_token_time:.2f}s")
+                            root_span.set(ttft_ms=first_token_time * 1000)
+                            metrics.TTFT_SECONDS.observe(first_token_time)
                         
                         yield content
             
+            tracing.end_span(llm_span)
+            llm_running = False
+            metrics.LLM_REQUESTS.inc(mode='stream', status='ok')
             # Cache full response
-            self.response_cache[cache_key] = {
-                'answer': full_response,
-                'timestamp': time.time()
-            }
+            await self._store_response(cache_key, full_response)
             
             total_time = time.time() - start_time
             print(f"⏱️ Total streaming time: {total_time:.2f}s, TTFT: {first_token_time:.2f}s")
@@ -642,24 +997,72 @@ class InsuranceBotMiniRAG:
             print(f"❌ Streaming error: {e}")
             import traceback
             traceback.print_exc()
+            if llm_running:
+                metrics.LLM_REQUESTS.inc(mode='stream', status='error')
+            tracing.end_span(llm_span, error=e)
+            tracing.end_span(root_span, error=e)
             yield f"Xin lỗi, hiện tại hệ thống đang gặp sự cố kỹ thuật. Anh/chị vui lòng thử lại sau hoặc liên hệ hotline 0385 10 10 18 để được hỗ trợ ạ."
+        finally:
+            # client ngắt giữa chừng (GeneratorExit) cũng đóng span
+            tracing.end_span(llm_span)
+            tracing.end_span(root_span)
     
     async def chat(self, question: str) -> str:
         """Chat với bot sử dụng MiniRAG - Tối ưu cho tốc độ < 15s"""
+        async with loop_clients_scope():
+            return await self._chat(question)
+
+    async def _chat(self, question: str) -> str:
+        """chat() trong scope client của loop: cache -> single-flight -> MiniRAG"""
         start_time = time.time()
         print(f"👤 Question: {question}")
 
         # Check cache first
         cache_key = question.lower().strip()
-        if cache_key in self.response_cache:
-            entry = self.response_cache[cache_key]
-            if time.time() - entry['timestamp'] < self.cache_ttl:
-                print(f"📋 Using cached response (saved {time.time() - entry['timestamp']:.1f}s ago)")
-                return entry['answer']
-            else:
-                # Cache expired
-                del self.response_cache[cache_key]
+        cached = await self._get_cached_response(cache_key)
+        if cached is not None:
+            return cached
+
+        future, is_leader = self._join_inflight(
+            self._inflight_chats, cache_key, concurrent.futures.Future
+        )
+        if not is_leader:
+            print("🔗 Coalesced: câu hỏi đang được trả lời, chờ kết quả")
+            # shield: follower bị hủy không được hủy future của leader
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            with tracing.trace("bot.chat"):
+                answer = await self._chat_leader(question, cache_key, start_time)
+        except asyncio.CancelledError as e:
+            # CancelledError đặt lên future chung sẽ hủy luôn các follower
+            error = RuntimeError("Leader request was cancelled before answering")
+            error.__cause__ = e
+            future.set_exception(error)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(answer)
+            return answer
+        finally:
+            self._leave_inflight(self._inflight_chats, cache_key)
+
+    async def _chat_leader(self, question: str, cache_key: str, start_time: float) -> str:
+        """Trả lời của request dẫn đầu (single-flight giữa các replica nếu có shared cache)"""
+        token, answer = await self._acquire_or_wait(cache_key)
+        if answer is not None:
+            return answer
 
+        try:
+            return await self._answer(question, cache_key, start_time)
+        finally:
+            if token is not None:
+                await self.shared_cache.release(cache_key, token)
+
+    async def _answer(self, question: str, cache_key: str, start_time: float) -> str:
+        """Truy vấn MiniRAG cho câu hỏi chưa có trong cache"""
         print("🔍 Querying MiniRAG (optimized for speed + accuracy)...")
 
         try:
@@ -729,21 +1132,8 @@ class InsuranceBotMiniRAG:
             print(f"⏱️ Query time: {query_time:.2f}s, Total time: {total_time:.2f}s")
             print(f"📄 Answer length: {len(answer)} chars")
 
-            # Cache response với timestamp
-            self.response_cache[cache_key] = {
-                'answer': answer,
-                'timestamp': time.time()
-            }
-
-            # Cleanup expired cache entries (keep cache size manageable)
-            if len(self.response_cache) > 100:
-                current_time = time.time()
-                expired_keys = [
-                    key for key, entry in self.response_cache.items()
-                    if current_time - entry['timestamp'] >= self.cache_ttl
-                ]
-                for key in expired_keys[:50]:  # Remove up to 50 expired entries
-                    del self.response_cache[key]
+            # Cache response với timestamp (L1 + shared cache)
+            await self._store_response(cache_key, answer)
 
             print(f"💬 MiniRAG Answer: {answer[:100]}...")
             return answer
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Metrics kiểu Prometheus cho insurance_api_simple.py (endpoint GET /metrics)
+
+Không cần prometheus_client: Counter / Gauge / Histogram tối giản, xuất text
+exposition format 0.0.4 để Prometheus scrape trực tiếp.
+
+- Counter / Histogram ghi ngay trên đường request: một lock + vài phép cộng
+  (~1-2 µs mỗi lần, request chat tốn hàng trăm ms -> overhead << 1%)
+- Gauge đắt hơn (kích thước cache, queue limiter, vector store) chỉ được tính
+  lúc scrape qua collector (REGISTRY.add_collector)
+- No-op: METRICS_ENABLED=false hoặc metrics.disable() (cho test) -> mọi lệnh
+  ghi bỏ qua ngay, /metrics trả về rỗng
+
+    from metrics import HTTP_REQUEST_SECONDS
+    HTTP_REQUEST_SECONDS.observe(0.42, route="/chat", method="POST", status="200")
+"""
+
+import os
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# giây, chat qua LLM thường 1-15s
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60)
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not self._registry.enabled or not amount:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        # số đếm riêng từng bucket (không cộng dồn), vị trí cuối là +Inf
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Tập metrics + collector chạy lúc scrape"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(self, name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """collector() được gọi trước mỗi lần render để cập nhật gauge"""
+        self._collectors.append(collector)
+
+    def clear(self):
+        for metric in self._metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        if not self.enabled:
+            return ""
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                print(f"⚠️ Metrics collector error: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry(enabled=os.environ.get('METRICS_ENABLED', 'true').lower() == 'true')
+
+
+def enable():
+    REGISTRY.enabled = True
+
+
+def disable():
+    """No-op mode (test): bỏ qua mọi lệnh ghi"""
+    REGISTRY.enabled = False
+
+
+# ---------------- HTTP ----------------
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "insurance_http_request_duration_seconds",
+    "Thời gian xử lý request theo route (stream tính tới khi gửi xong)",
+    ("route", "method", "status"),
+)
+TTFT_SECONDS = REGISTRY.histogram(
+    "insurance_ttft_seconds",
+    "Time to first token của /chat/stream",
+    buckets=TTFT_BUCKETS,
+)
+
+# ---------------- cache ----------------
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "insurance_cache_requests_total",
+    "Số lần tra cache theo cache (response, embedding), tầng (l1, shared) và kết quả (hit, miss)",
+    ("cache", "layer", "result"),
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "insurance_cache_hit_ratio",
+    "hit / (hit + miss) kể từ lúc khởi động",
+    ("cache", "layer"),
+)
+CACHE_ENTRIES = REGISTRY.gauge(
+    "insurance_cache_entries",
+    "Số entry đang giữ trong cache",
+    ("cache",),
+)
+
+# ---------------- LLM / embedding ----------------
+
+LLM_REQUESTS = REGISTRY.counter(
+    "insurance_llm_requests_total",
+    "Số lần gọi LLM theo mode (complete, stream) và status (ok, error)",
+    ("mode", "status"),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "insurance_llm_tokens_total",
+    "Token LLM theo usage trả về (prompt, completion)",
+    ("type",),
+)
+EMBEDDING_REQUESTS = REGISTRY.counter(
+    "insurance_embedding_requests_total",
+    "Số lần gọi API embedding theo status (ok, error)",
+    ("status",),
+)
+EMBEDDING_TEXTS = REGISTRY.counter(
+    "insurance_embedding_texts_total",
+    "Số text gửi lên API embedding (sau cache)",
+)
+EMBEDDING_TOKENS = REGISTRY.counter(
+    "insurance_embedding_tokens_total",
+    "Token embedding theo usage trả về",
+)
+
+# ---------------- MiniRAG ----------------
+
+LIMITER_QUEUE_DEPTH = REGISTRY.gauge(
+    "insurance_limiter_queue_depth",
+    "Số call đang chạy / đang chờ slot trong limit_async_func_call của MiniRAG",
+    ("func", "state"),
+)
+VECTOR_STORE_SIZE = REGISTRY.gauge(
+    "insurance_vector_store_size",
+    "Số vector trong từng vector store",
+    ("namespace",),
+)
+
+
+def _update_hit_ratios():
+    totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for (cache, layer, result), value in CACHE_REQUESTS.samples().items():
+        totals.setdefault((cache, layer), {})[result] = value
+    for (cache, layer), counts in totals.items():
+        hits, misses = counts.get("hit", 0), counts.get("miss", 0)
+        CACHE_HIT_RATIO.set(hits / (hits + misses) if hits + misses else 0.0, cache=cache, layer=layer)
+
+
+REGISTRY.add_collector(_update_hit_ratios)
+
+
+class LLMTokenTracker:
+    """token_tracker cho openai_complete_if_cache: cộng usage vào LLM_TOKENS"""
+
+    def add_usage(self, usage: Dict[str, int]):
+        LLM_TOKENS.inc(usage.get("prompt_tokens", 0), type="prompt")
+        LLM_TOKENS.inc(usage.get("completion_tokens", 0), type="completion")
+
+
+llm_token_tracker = LLMTokenTracker()
+
+
+def record_cache(cache: str, layer: str, hits: int, misses: int):
+    CACHE_REQUESTS.inc(hits, cache=cache, layer=layer, result="hit")
+    CACHE_REQUESTS.inc(misses, cache=cache, layer=layer, result="miss")
+
+
+def record_limiter(func: str, stats: Optional[Dict[str, int]]):
+    if stats:
+        LIMITER_QUEUE_DEPTH.set(stats["running"], func=func, state="running")
+        LIMITER_QUEUE_DEPTH.set(stats["waiting"], func=func, state="waiting")
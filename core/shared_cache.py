@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Cache dùng chung giữa các replica của insurance_api_simple.py (Redis hoặc bản local)
+
+Mỗi container giữ response_cache / embedding_cache riêng thì hit rate bị chia
+cho số replica. Tầng này nằm sau cache trong process (L1) của
+InsuranceBotMiniRAG:
+
+    L1 (dict trong process) -> SharedCache (Redis) -> MiniRAG + LLM
+
+- Cùng TTL với L1: entry ghi lúc t hết hạn lúc t + ttl ở mọi replica
+  (L1 nạp từ Redis chỉ giữ phần TTL còn lại)
+- Embedding lưu dạng float32 nhị phân (1536 chiều = 6KB thay vì ~30KB JSON)
+- Single-flight giữa các replica: replica đầu tiên giữ lock (SET NX PX) và tính,
+  các replica khác chờ kết quả thay vì gọi lại MiniRAG + LLM
+- Redis lỗi thì chỉ log cảnh báo và coi như miss, bot vẫn chạy với L1
+
+Cấu hình (env hoặc config/insurance_config.ini):
+    SHARED_CACHE_BACKEND=none|local|redis   (mặc định none = chỉ L1 như cũ)
+    SHARED_CACHE_REDIS_URI=redis://redis:6379/0   (mặc định lấy REDIS_URI)
+    SHARED_CACHE_PREFIX=insurance
+    SHARED_CACHE_LOCK_TTL=60     # giây, lock tự hết hạn nếu replica giữ lock chết
+    SHARED_CACHE_LOCK_WAIT=30    # giây, replica chờ tối đa rồi tự tính
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import threading
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Xóa lock chỉ khi còn đúng token của mình (không xóa lock của replica khác
+# khi lock cũ đã hết hạn và bị chiếm lại)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def encode_embedding(embedding) -> bytes:
+    """Embedding -> float32 bytes"""
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def decode_embedding(data: bytes) -> List[float]:
+    """float32 bytes -> list[float]"""
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+class LocalCacheBackend:
+    """Bản thay thế Redis trong process (dev/test, một replica), cùng semantics TTL và lock"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+
+    def _get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value, expires_at
+
+    async def mget(self, keys: List[str]) -> List[Tuple[Optional[bytes], Optional[float]]]:
+        """[(value, số giây TTL còn lại)] theo thứ tự keys"""
+        results = []
+        now = time.time()
+        for key in keys:
+            entry = self._get(key)
+            results.append((entry[0], entry[1] - now) if entry else (None, None))
+        return results
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float):
+        expires_at = time.time() + ttl
+        for key, value in items.items():
+            self._data[key] = (value, expires_at)
+
+    async def set_nx(self, key: str, value: bytes, ttl: float) -> bool:
+        if self._get(key) is not None:
+            return False
+        self._data[key] = (value, time.time() + ttl)
+        return True
+
+    async def exists(self, key: str) -> bool:
+        return self._get(key) is not None
+
+    async def delete_if_equals(self, key: str, value: bytes):
+        entry = self._get(key)
+        if entry is not None and entry[0] == value:
+            del self._data[key]
+
+    async def close_loop(self):
+        pass
+
+    async def close(self):
+        self._data.clear()
+
+
+class RedisCacheBackend:
+    """Redis qua redis.asyncio, giá trị nhị phân (decode_responses=False)
+
+    Connection của redis.asyncio gắn với event loop tạo ra nó, API chạy
+    asyncio.run() mỗi request nên mỗi loop có client riêng (giống OpenAI client
+    của insurance_bot_minirag). close_loop() đóng client của loop đang chạy,
+    client của loop đã đóng mà chưa ai close thì bỏ tham chiếu.
+    """
+
+    def __init__(self, url: str):
+        try:
+            from redis.asyncio import Redis
+        except ImportError as e:
+            raise ImportError(
+                "SHARED_CACHE_BACKEND=redis cần package redis: pip install 'redis>=5.0.1'"
+            ) from e
+        self._url = url
+        self._redis_cls = Redis
+        self._clients: Dict[asyncio.AbstractEventLoop, tuple] = {}
+        # mỗi thread Flask chạy loop riêng
+        self._clients_lock = threading.Lock()
+
+    def _client(self):
+        """(Redis, script release lock) của event loop đang chạy"""
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            entry = self._clients.get(loop)
+            if entry is None:
+                for other in [l for l in self._clients if l.is_closed()]:
+                    del self._clients[other]
+                redis = self._redis_cls.from_url(self._url, decode_responses=False)
+                entry = self._clients[loop] = (redis, redis.register_script(_RELEASE_LOCK_SCRIPT))
+        return entry
+
+    @property
+    def _redis(self):
+        return self._client()[0]
+
+    async def mget(self, keys: List[str]) -> List[Tuple[Optional[bytes], Optional[float]]]:
+        if not keys:
+            return []
+        # GET + PTTL trong một round trip để L1 biết TTL còn lại
+        pipe = self._redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+            pipe.pttl(key)
+        raw = await pipe.execute()
+        results = []
+        for value, pttl in zip(raw[::2], raw[1::2]):
+            if value is None:
+                results.append((None, None))
+            else:
+                # pttl = -1 khi key không có TTL
+                results.append((value, pttl / 1000 if pttl and pttl > 0 else None))
+        return results
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float):
+        if not items:
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(key, value, px=int(ttl * 1000))
+        await pipe.execute()
+
+    async def set_nx(self, key: str, value: bytes, ttl: float) -> bool:
+        return bool(await self._redis.set(key, value, nx=True, px=int(ttl * 1000)))
+
+    async def exists(self, key: str) -> bool:
+        return bool(await self._redis.exists(key))
+
+    async def delete_if_equals(self, key: str, value: bytes):
+        await self._client()[1](keys=[key], args=[value])
+
+    async def close_loop(self):
+        with self._clients_lock:
+            entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].aclose()
+
+    async def close(self):
+        await self.close_loop()
+        with self._clients_lock:
+            self._clients.clear()
+
+
+class SharedCache:
+    """Tầng cache dùng chung cho response và embedding của InsuranceBotMiniRAG"""
+
+    def __init__(
+        self,
+        backend,
+        prefix: str = "insurance",
+        lock_ttl: float = 60,
+        lock_wait: float = 30,
+        poll_interval: float = 0.05,
+    ):
+        self.backend = backend
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self.poll_interval = poll_interval
+        self._stats: Dict[str, int] = defaultdict(int)
+
+    # ---------------- keys ----------------
+
+    def _response_key(self, cache_key: str) -> str:
+        return f"{self.prefix}:resp:{hashlib.sha1(cache_key.encode('utf-8')).hexdigest()}"
+
+    def _lock_key(self, cache_key: str) -> str:
+        return f"{self.prefix}:lock:{hashlib.sha1(cache_key.encode('utf-8')).hexdigest()}"
+
+    def _embedding_key(self, model: str, text: str) -> str:
+        # model nằm trong key: replica đổi EMBEDDING_MODEL không đọc nhầm vector cũ
+        return f"{self.prefix}:emb:{model}:{hashlib.md5(text.encode('utf-8')).hexdigest()}"
+
+    # ---------------- responses ----------------
+
+    async def get_response(self, cache_key: str) -> Optional[Tuple[str, Optional[float]]]:
+        """(answer, TTL còn lại) hoặc None"""
+        try:
+            [(value, remaining)] = await self.backend.mget([self._response_key(cache_key)])
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"⚠️ Shared cache get error: {e}")
+            return None
+        if value is None:
+            self._stats["response_misses"] += 1
+            return None
+        self._stats["response_hits"] += 1
+        return value.decode("utf-8"), remaining
+
+    async def set_response(self, cache_key: str, answer: str, ttl: float):
+        try:
+            await self.backend.set_many(
+                {self._response_key(cache_key): answer.encode("utf-8")}, ttl
+            )
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"⚠️ Shared cache set error: {e}")
+
+    # ---------------- embeddings ----------------
+
+    async def get_embeddings(
+        self, model: str, texts: List[str]
+    ) -> Dict[str, Tuple[List[float], Optional[float]]]:
+        """{text: (embedding, TTL còn lại)} cho các text có trong cache, một round trip"""
+        if not texts:
+            return {}
+        try:
+            results = await self.backend.mget([self._embedding_key(model, t) for t in texts])
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"⚠️ Shared cache get error: {e}")
+            return {}
+        found = {
+            text: (decode_embedding(value), remaining)
+            for text, (value, remaining) in zip(texts, results)
+            if value is not None
+        }
+        self._stats["embedding_hits"] += len(found)
+        self._stats["embedding_misses"] += len(texts) - len(found)
+        return found
+
+    async def set_embeddings(self, model: str, embeddings: Dict[str, List[float]], ttl: float):
+        try:
+            await self.backend.set_many(
+                {self._embedding_key(model, t): encode_embedding(e) for t, e in embeddings.items()},
+                ttl,
+            )
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"⚠️ Shared cache set error: {e}")
+
+    # ---------------- single-flight giữa các replica ----------------
+
+    async def acquire(self, cache_key: str) -> Optional[bytes]:
+        """Token nếu replica này được tính câu trả lời, None nếu replica khác đang tính"""
+        token = uuid.uuid4().hex.encode()
+        try:
+            if await self.backend.set_nx(self._lock_key(cache_key), token, self.lock_ttl):
+                return token
+        except Exception as e:
+            # Redis lỗi: tự tính, không chờ ai cả
+            self._stats["errors"] += 1
+            print(f"⚠️ Shared cache lock error: {e}")
+            return token
+        return None
+
+    async def release(self, cache_key: str, token: bytes):
+        try:
+            await self.backend.delete_if_equals(self._lock_key(cache_key), token)
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"⚠️ Shared cache unlock error: {e}")
+
+    async def wait_for_response(self, cache_key: str) -> Optional[Tuple[str, Optional[float]]]:
+        """Chờ replica giữ lock ghi kết quả.
+
+        None khi hết lock_wait hoặc lock biến mất mà không có kết quả (replica kia
+        lỗi, câu trả lời lỗi không được cache) - khi đó caller tự tính.
+        """
+        deadline = time.monotonic() + self.lock_wait
+        response_key, lock_key = self._response_key(cache_key), self._lock_key(cache_key)
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                [(value, remaining)] = await self.backend.mget([response_key])
+                if value is not None:
+                    self._stats["coalesced_remote"] += 1
+                    return value.decode("utf-8"), remaining
+                if not await self.backend.exists(lock_key):
+                    break
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"⚠️ Shared cache wait error: {e}")
+        self._stats["lock_wait_fallbacks"] += 1
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+    async def close_loop(self):
+        """Đóng kết nối của event loop đang chạy (gọi trước khi loop kết thúc)"""
+        try:
+            await self.backend.close_loop()
+        except Exception as e:
+            print(f"⚠️ Shared cache close error: {e}")
+
+    async def close(self):
+        await self.backend.close()
+
+
+def create_shared_cache(config=None) -> Optional[SharedCache]:
+    """SharedCache theo SHARED_CACHE_BACKEND, None khi tắt (mặc định)"""
+
+    def setting(name: str, default: str) -> str:
+        value = os.environ.get(name)
+        if value is None and config is not None:
+            value = config.get('DEFAULT', name, fallback=None)
+        return value if value is not None else default
+
+    backend_name = setting('SHARED_CACHE_BACKEND', 'none').lower()
+    if backend_name in ('', 'none', 'off'):
+        return None
+    if backend_name == 'local':
+        backend = LocalCacheBackend()
+    elif backend_name == 'redis':
+        url = setting('SHARED_CACHE_REDIS_URI', '') or setting('REDIS_URI', 'redis://localhost:6379')
+        backend = RedisCacheBackend(url)
+    else:
+        raise ValueError(f"SHARED_CACHE_BACKEND must be none, local or redis, got {backend_name}")
+
+    shared_cache = SharedCache(
+        backend,
+        prefix=setting('SHARED_CACHE_PREFIX', 'insurance'),
+        lock_ttl=float(setting('SHARED_CACHE_LOCK_TTL', '60')),
+        lock_wait=float(setting('SHARED_CACHE_LOCK_WAIT', '30')),
+    )
+    print(f"✅ Shared cache enabled ({backend_name}, prefix={shared_cache.prefix})")
+    return shared_cache
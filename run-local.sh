@@ -86,8 +86,8 @@ wait_for_services() {
     local attempt=1
 
     while [ $attempt -le $max_attempts ]; do
-        if curl -f http://localhost:8001/health &> /dev/null; then
-            echo -e "${GREEN}✅ API is healthy${NC}"
+        if curl -f http://localhost:8001/ready &> /dev/null; then
+            echo -e "${GREEN}✅ API is ready${NC}"
             return 0
         fi
 
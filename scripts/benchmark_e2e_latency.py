@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Benchmark độ trễ end-to-end offline: InsuranceBotMiniRAG và HTTP API với
+LLM/embedding giả lập (scripts/stub_openai_server.py).
+
+Khác tests/test_thoi_gian_phan_hoi_v2.py (4 câu hỏi tuần tự vào OpenAI thật):
+- Không gọi mạng: stub OpenAI chạy local, độ trễ và tốc độ token cố định
+  -> kết quả lặp lại được giữa các lần chạy / các commit
+- Index MiniRAG được build mới trong thư mục tạm từ --docs (mặc định văn bản
+  trong logs/insurance_rag/kv_store_full_docs.json) qua chính stub, không đụng index thật.
+  Index thật chỉ có chunk với vector OpenAI, không dùng được cho mode light + embedding stub
+- Replay corpus JSONL ({"id": ..., "question": ...} mỗi dòng) với concurrency cố định
+- Report JSON: p50/p95/p99, throughput, TTFT (mode stream) cho từng target/mode
+- --baseline: so với report cũ, exit 1 khi p95 chậm hơn --max-regression
+
+Cache response/embedding của bot bị tắt (mỗi request đi hết pipeline) trừ khi --warm-cache.
+COSINE_THRESHOLD=-1: vector stub là ngẫu nhiên nên bỏ ngưỡng, retrieval luôn trả đủ top_k.
+Stub chạy ở process riêng để không tranh GIL với bot đang đo.
+api.stream cần nest_asyncio (/chat/stream import lúc chạy), thiếu thì mọi request tính là lỗi.
+
+    python scripts/benchmark_e2e_latency.py
+    python scripts/benchmark_e2e_latency.py --target api --mode stream --concurrency 8 --requests 200
+    python scripts/benchmark_e2e_latency.py --chat-latency 0.8 --tokens-per-sec 40 --output before.json
+    python scripts/benchmark_e2e_latency.py --baseline before.json --max-regression 0.1
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import glob
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from dataclasses import asdict
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPTS_DIR)
+sys.path.append(os.path.join(BASE_DIR, "core"))
+sys.path.append(os.path.join(BASE_DIR, "MiniRAG"))
+
+from stub_openai_server import StubConfig, add_stub_arguments, start_stub_process, stub_config_from_args
+
+# câu trả lời khi bot bắt exception (bot.chat không raise) -> tính là lỗi
+ERROR_ANSWER_PREFIX = "Xin lỗi, hiện tại hệ thống đang gặp sự cố"
+
+
+def load_corpus(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                item = json.loads(line)
+                questions.append(item["question"] if isinstance(item, dict) else str(item))
+    if not questions:
+        raise ValueError(f"Corpus {path} không có câu hỏi nào")
+    return questions
+
+
+def summarize(latencies, ttfts, errors, wall_seconds):
+    """p50/p95/p99 (ms), throughput của một target/mode"""
+
+    def percentiles(values):
+        if not values:
+            return None
+        ms = np.asarray(values) * 1000
+        return {
+            "p50": float(np.percentile(ms, 50)),
+            "p95": float(np.percentile(ms, 95)),
+            "p99": float(np.percentile(ms, 99)),
+            "mean": float(ms.mean()),
+            "min": float(ms.min()),
+            "max": float(ms.max()),
+        }
+
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "wall_seconds": wall_seconds,
+        "throughput_rps": len(latencies) / wall_seconds if wall_seconds > 0 else 0.0,
+        "latency_ms": percentiles(latencies),
+        "ttft_ms": percentiles(ttfts),
+    }
+
+
+def load_documents(path):
+    """kv_store_full_docs.json của MiniRAG, một file text, hoặc thư mục .txt/.md"""
+    if os.path.isdir(path):
+        files = sorted(glob.glob(os.path.join(path, "*.txt")) + glob.glob(os.path.join(path, "*.md")))
+    else:
+        files = [path]
+    documents = []
+    for file in files:
+        with open(file, encoding="utf-8") as f:
+            if file.endswith(".json"):
+                documents.extend(doc["content"] for doc in json.load(f).values())
+            else:
+                documents.append(f.read())
+    documents = [d for d in documents if d.strip()]
+    if not documents:
+        raise ValueError(f"Không có văn bản nào trong {path}")
+    return documents
+
+
+# ---------------- bot (in-process) ----------------
+
+async def bot_request(bot, question, stream):
+    """(latency, ttft, ok)"""
+    start = time.perf_counter()
+    if not stream:
+        answer = await bot.chat(question)
+        return time.perf_counter() - start, None, not answer.startswith(ERROR_ANSWER_PREFIX)
+    ttft, answer = None, ""
+    async for chunk in bot.chat_stream(question):
+        if ttft is None and chunk:
+            ttft = time.perf_counter() - start
+        answer += chunk
+    return time.perf_counter() - start, ttft, not answer.startswith(ERROR_ANSWER_PREFIX)
+
+
+async def run_bot(bot, questions, concurrency, stream):
+    """concurrency worker lấy câu hỏi từ hàng đợi chung"""
+    pending = asyncio.Queue()
+    for q in questions:
+        pending.put_nowait(q)
+    latencies, ttfts, errors = [], [], 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                question = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                latency, ttft, ok = await bot_request(bot, question, stream)
+            except Exception as e:
+                print(f"   ❌ {question[:40]}: {e}")
+                errors += 1
+                continue
+            if not ok:
+                errors += 1
+                continue
+            latencies.append(latency)
+            if ttft is not None:
+                ttfts.append(ttft)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, ttfts, errors, time.perf_counter() - start
+
+
+# ---------------- HTTP API ----------------
+
+def api_request(session, base_url, headers, question, stream):
+    start = time.perf_counter()
+    if not stream:
+        resp = session.post(f"{base_url}/chat", json={"message": question}, headers=headers, timeout=120)
+        ok = resp.status_code == 200 and not resp.json().get("response", "").startswith(ERROR_ANSWER_PREFIX)
+        return time.perf_counter() - start, None, ok
+
+    ttft, ok = None, False
+    with session.post(f"{base_url}/chat/stream", json={"message": question}, headers=headers,
+                      stream=True, timeout=120) as resp:
+        if resp.status_code != 200:
+            return time.perf_counter() - start, None, False
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            event = json.loads(line[len("data:"):])
+            if event.get("error"):
+                break
+            if ttft is None and event.get("chunk"):
+                ttft = time.perf_counter() - start
+            if event.get("done"):
+                ok = not event.get("full_response", "").startswith(ERROR_ANSWER_PREFIX)
+                break
+    return time.perf_counter() - start, ttft, ok
+
+
+def run_api(base_url, headers, questions, concurrency, stream):
+    import requests
+
+    pending = queue.Queue()
+    for q in questions:
+        pending.put(q)
+    lock = threading.Lock()
+    latencies, ttfts, errors = [], [], 0
+
+    def worker():
+        nonlocal errors
+        with requests.Session() as session:
+            while True:
+                try:
+                    question = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    latency, ttft, ok = api_request(session, base_url, headers, question, stream)
+                except Exception as e:
+                    print(f"   ❌ {question[:40]}: {e}")
+                    ok, ttft = False, None
+                with lock:
+                    if not ok:
+                        errors += 1
+                        continue
+                    latencies.append(latency)
+                    if ttft is not None:
+                        ttfts.append(ttft)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    return latencies, ttfts, errors, time.perf_counter() - start
+
+
+def start_api_server(api_module, bot):
+    """Flask app của insurance_api_simple trên port ngẫu nhiên, thread nền"""
+    from werkzeug.serving import make_server
+
+    api_module.bot = bot
+    api_module._set_startup_state(status="ready", prewarm="disabled")
+    server = make_server("127.0.0.1", 0, api_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="benchmark-api", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# ---------------- report ----------------
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare_with_baseline(report, baseline_path, max_regression):
+    """Danh sách (key, p95 cũ, p95 mới) chậm hơn max_regression"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    for key, result in report["results"].items():
+        old = baseline.get("results", {}).get(key)
+        if not old or not old.get("latency_ms") or not result.get("latency_ms"):
+            continue
+        before, after = old["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        if before > 0 and (after - before) / before > max_regression:
+            regressions.append((key, before, after))
+    return regressions
+
+
+def print_result(key, result):
+    latency, ttft = result["latency_ms"], result["ttft_ms"]
+    if latency is None:
+        print(f"   {key:18s} ❌ {result['errors']}/{result['requests']} lỗi")
+        return
+    line = (
+        f"   {key:18s} p50 {latency['p50']:8.1f}ms  p95 {latency['p95']:8.1f}ms  "
+        f"p99 {latency['p99']:8.1f}ms  {result['throughput_rps']:6.2f} req/s"
+    )
+    if ttft is not None:
+        line += f"  TTFT p50 {ttft['p50']:.1f}ms p95 {ttft['p95']:.1f}ms"
+    if result["errors"]:
+        line += f"  ⚠️ {result['errors']} lỗi"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end latency benchmark (bot + HTTP API)")
+    parser.add_argument("--corpus", default=os.path.join(SCRIPTS_DIR, "benchmark_questions.jsonl"),
+                        help="JSONL, mỗi dòng {\"question\": ...}")
+    parser.add_argument("--target", choices=["bot", "api", "both"], default="both")
+    parser.add_argument("--mode", choices=["chat", "stream", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=None, help="số request đo (mặc định: cả corpus), corpus được lặp vòng")
+    parser.add_argument("--warmup", type=int, default=2, help="request chạy trước, không tính vào kết quả")
+    parser.add_argument("--warm-cache", action="store_true", help="giữ response/embedding cache của bot")
+    parser.add_argument("--docs", default=os.path.join(BASE_DIR, "logs", "insurance_rag", "kv_store_full_docs.json"),
+                        help="văn bản để build index: kv_store_full_docs.json, file .txt/.md hoặc thư mục chứa chúng")
+    parser.add_argument("--max-docs", type=int, default=None, help="chỉ index N văn bản đầu")
+    parser.add_argument("--output", default="benchmark_e2e_latency.json")
+    parser.add_argument("--baseline", help="report JSON cũ để so p95")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="tỉ lệ p95 được phép chậm hơn baseline")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    questions = load_corpus(args.corpus)
+    total = args.requests or len(questions)
+    measured = [questions[i % len(questions)] for i in range(total)]
+    warmup = [questions[i % len(questions)] for i in range(args.warmup)]
+    targets = ["bot", "api"] if args.target == "both" else [args.target]
+    modes = ["chat", "stream"] if args.mode == "both" else [args.mode]
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    stub_config = stub_config_from_args(args)
+    documents = load_documents(args.docs)[: args.max_docs]
+    workdir = tempfile.mkdtemp(prefix="benchmark_e2e_")
+    os.makedirs(os.path.join(workdir, "insurance_rag"))
+
+    # stub không độ trễ để build index, stub đo (stub_config) chạy sau đó
+    stub, base_url = start_stub_process(
+        StubConfig(chat_latency=0, tokens_per_sec=0, embedding_latency=0, dim=stub_config.dim)
+    )
+
+    # phải set trước khi import bot/API (module đọc env lúc import)
+    stub_env = {
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_BASE": base_url,
+        "WORKING_DIR": "./insurance_rag",
+        "SHARED_CACHE_BACKEND": "none",
+        "PREWARM_ENABLED": "false",
+        # embedding stub ngẫu nhiên (cosine ~0) -> bỏ ngưỡng để retrieval luôn
+        # trả top_k và request đi hết pipeline tới LLM
+        "COSINE_THRESHOLD": "-1",
+    }
+    os.environ.update(stub_env)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    api_server = None
+    try:
+        import insurance_bot_minirag
+
+        init_start = time.perf_counter()
+        bot = insurance_bot_minirag.InsuranceBotMiniRAG(pre_warm=False)
+        init_seconds = time.perf_counter() - init_start
+
+        print(f"📚 Build index: {len(documents)} văn bản")
+        index_start = time.perf_counter()
+        asyncio.run(bot.rag.ainsert(documents))
+        index_seconds = time.perf_counter() - index_start
+        stub.terminate()
+
+        # client OpenAI của bot gắn với event loop, mỗi asyncio.run sau đây đọc lại env
+        stub, base_url = start_stub_process(stub_config)
+        stub_env.update(OPENAI_BASE_URL=base_url, OPENAI_API_BASE=base_url)
+        os.environ.update(stub_env)
+        print(f"🧪 Stub OpenAI: {base_url}")
+        if not args.warm_cache:
+            bot.cache_ttl = 0
+            insurance_bot_minirag.embedding_cache.ttl_seconds = 0
+
+        results = {}
+        for target in targets:
+            if target == "api":
+                import insurance_api_simple
+
+                # insurance_api_simple ghi đè env bằng config/insurance_config.ini lúc import
+                os.environ.update(stub_env)
+                api_server, api_url = start_api_server(insurance_api_simple, bot)
+                headers = {"X-API-Key": insurance_api_simple.API_SECRET_KEY}
+            for mode in modes:
+                stream = mode == "stream"
+                key = f"{target}.{mode}"
+                print(f"⏱️ {key}: {len(measured)} request, concurrency {args.concurrency}")
+                if target == "bot":
+                    asyncio.run(run_bot(bot, warmup, args.concurrency, stream))
+                    latencies, ttfts, errors, wall = asyncio.run(run_bot(bot, measured, args.concurrency, stream))
+                else:
+                    run_api(api_url, headers, warmup, args.concurrency, stream)
+                    latencies, ttfts, errors, wall = run_api(api_url, headers, measured, args.concurrency, stream)
+                results[key] = summarize(latencies, ttfts, errors, wall)
+        with urllib.request.urlopen(f"{base_url}/stats", timeout=10) as resp:
+            stub_requests = json.load(resp)["requests"]
+    finally:
+        if api_server is not None:
+            api_server.shutdown()
+        stub.terminate()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "e2e_latency",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "corpus": os.path.relpath(os.path.abspath(args.corpus), BASE_DIR),
+            "questions": len(questions),
+            "documents": len(documents),
+            "requests": total,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "warm_cache": args.warm_cache,
+            "stub": asdict(stub_config),
+        },
+        "bot_init_seconds": init_seconds,
+        "index_build_seconds": index_seconds,
+        "stub_requests": stub_requests,
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"📊 Kết quả ({total} request, concurrency {args.concurrency}, bot init {init_seconds:.2f}s)")
+    for key, result in results.items():
+        print_result(key, result)
+    print(f"💾 Report: {output}")
+
+    failed = any(r["latency_ms"] is None for r in results.values())
+    if baseline:
+        regressions = compare_with_baseline(report, baseline, args.max_regression)
+        for key, before, after in regressions:
+            print(f"❌ {key}: p95 {before:.1f}ms -> {after:.1f}ms (> {args.max_regression:.0%} chậm hơn baseline)")
+        if not regressions:
+            print(f"✅ Không chậm hơn baseline quá {args.max_regression:.0%}")
+        failed |= bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
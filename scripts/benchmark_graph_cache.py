@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Đo hiệu quả của CachedGraphStorage so với gọi thẳng graph storage "remote".
+
+Remote được giả lập bằng một graph trong bộ nhớ, mỗi lần gọi chờ thêm
+--latency-ms (mô phỏng round trip tới Neo4J/PG). Workload lặp lại các lookup
+mà light/global query thực hiện (get_nodes_bulk, node_degrees, get_node_edges,
+get_edges, edge_degrees) với phân phối lệch về một số entity "hot".
+
+    python scripts/benchmark_graph_cache.py --entities 5000 --queries 300
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MiniRAG"))
+
+from minirag.base import BaseGraphStorage
+from minirag.kg.cached_graph_impl import CachedGraphStorage
+
+
+@dataclass
+class FakeRemoteGraphStorage(BaseGraphStorage):
+    """Graph trong bộ nhớ, mỗi round trip tốn latency giây"""
+
+    latency: float = 0.002
+    nodes: dict = field(default_factory=dict)
+    adjacency: dict = field(default_factory=dict)
+    edges: dict = field(default_factory=dict)
+    round_trips: int = 0
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+
+    async def get_types(self):
+        await self._round_trip()
+        types = list({n["entity_type"] for n in self.nodes.values()})
+        return types, types
+
+    async def get_node(self, node_id):
+        await self._round_trip()
+        return self.nodes.get(node_id)
+
+    async def get_edge(self, source_node_id, target_node_id):
+        await self._round_trip()
+        return self.edges.get((source_node_id, target_node_id))
+
+    async def node_degree(self, node_id):
+        await self._round_trip()
+        return len(self.adjacency.get(node_id, ()))
+
+    async def edge_degree(self, src_id, tgt_id):
+        await self._round_trip()
+        return len(self.adjacency.get(src_id, ())) + len(self.adjacency.get(tgt_id, ()))
+
+    async def get_node_edges(self, source_node_id):
+        await self._round_trip()
+        return [(source_node_id, t) for t in self.adjacency.get(source_node_id, ())]
+
+    async def get_nodes_bulk(self, node_ids):
+        await self._round_trip()
+        return {n: self.nodes[n] for n in node_ids if n in self.nodes}
+
+    async def node_degrees(self, node_ids):
+        await self._round_trip()
+        return {n: len(self.adjacency.get(n, ())) for n in node_ids}
+
+    async def get_edges(self, pairs):
+        await self._round_trip()
+        return {tuple(p): self.edges[tuple(p)] for p in pairs if tuple(p) in self.edges}
+
+    async def upsert_node(self, node_id, node_data):
+        await self._round_trip()
+        self.nodes.setdefault(node_id, {}).update(node_data)
+
+    async def upsert_edge(self, source_node_id, target_node_id, edge_data):
+        await self._round_trip()
+        self.edges[(source_node_id, target_node_id)] = dict(edge_data)
+        self.edges[(target_node_id, source_node_id)] = self.edges[(source_node_id, target_node_id)]
+        self.adjacency.setdefault(source_node_id, set()).add(target_node_id)
+        self.adjacency.setdefault(target_node_id, set()).add(source_node_id)
+
+
+def build_graph(storage, entities, rng):
+    for i in range(entities):
+        storage.nodes[f'"E{i}"'] = {
+            "entity_type": '"ORG"',
+            "description": f"entity {i}",
+            "source_id": "chunk-bench",
+        }
+    for i in range(entities):
+        for j in {(i + 1) % entities, rng.randrange(entities)} - {i}:
+            a, b = f'"E{i}"', f'"E{j}"'
+            storage.edges[(a, b)] = storage.edges[(b, a)] = {"weight": 1.0, "description": "rel"}
+            storage.adjacency.setdefault(a, set()).add(b)
+            storage.adjacency.setdefault(b, set()).add(a)
+
+
+async def light_query(graph, entity_names):
+    """Các lookup graph của _build_local_query_context"""
+    nodes, _ = await asyncio.gather(
+        graph.get_nodes_bulk(entity_names), graph.node_degrees(entity_names)
+    )
+    related = await asyncio.gather(*[graph.get_node_edges(n) for n in nodes])
+    pairs = list({tuple(sorted(e)) for edges in related for e in edges or []})
+    await asyncio.gather(graph.get_edges(pairs), graph.edge_degrees(pairs))
+
+
+async def run(graph, workload):
+    latencies = []
+    for entity_names in workload:
+        start = time.perf_counter()
+        await light_query(graph, entity_names)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark CachedGraphStorage")
+    parser.add_argument("--entities", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--ttl", type=float, default=300)
+    parser.add_argument("--max-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    remote = FakeRemoteGraphStorage(
+        namespace="chunk_entity_relation", global_config={}, latency=args.latency_ms / 1000
+    )
+    build_graph(remote, args.entities, rng)
+
+    # phân phối Zipf: một số entity (ví dụ "BẢO HIỂM BẮT BUỘC") xuất hiện ở hầu hết câu hỏi
+    weights = [1 / (i + 1) for i in range(args.entities)]
+    workload = [
+        list(dict.fromkeys(f'"E{i}"' for i in rng.choices(range(args.entities), weights, k=args.top_k)))
+        for _ in range(args.queries)
+    ]
+
+    remote.round_trips = 0
+    p50, p95 = await run(remote, workload)
+    direct_round_trips = remote.round_trips
+    print(f"🐢 không cache : p50={p50:.1f}ms p95={p95:.1f}ms round trips={direct_round_trips}")
+
+    cached = CachedGraphStorage(
+        namespace="chunk_entity_relation",
+        global_config={"graph_cache_params": {"ttl": args.ttl, "max_size": args.max_size}},
+        storage=remote,
+    )
+    remote.round_trips = 0
+    p50, p95 = await run(cached, workload)
+    print(f"⚡ có cache    : p50={p50:.1f}ms p95={p95:.1f}ms round trips={remote.round_trips}")
+
+    for kind, stats in cached.cache_stats().items():
+        print(f"   {kind:<12} hit rate {stats['hit_rate']:.1%} ({stats['hits']}/{stats['hits'] + stats['misses']})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Đo thời gian `import minirag` bằng `python -X importtime` và kiểm tra ngân sách.
+
+Mỗi lần đo chạy một process Python mới (không dùng lại sys.modules), lấy
+median của --runs lần. Script báo lỗi (exit 1) khi:
+- thời gian import vượt --budget-ms
+- một dependency nặng (torch, sentence_transformers, sklearn, nltk, rouge...)
+  bị import ngay lúc khởi động thay vì lúc dùng
+
+    python scripts/benchmark_import_time.py
+    python scripts/benchmark_import_time.py --module minirag --module minirag.llm --budget-ms 800
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+MINIRAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MiniRAG")
+
+# chỉ được import khi calculate_similarity dùng method "bert" / "rouge" / "bleu"
+HEAVY_MODULES = ["torch", "sentence_transformers", "transformers", "sklearn", "nltk", "rouge"]
+
+
+def measure(module):
+    """{module: (self_us, cumulative_us)} của một lần import trong process mới"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [MINIRAG_DIR, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    timings = {}
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import time của minirag")
+    parser.add_argument("--module", action="append", help="module cần đo (mặc định: minirag)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=500)
+    parser.add_argument("--top", type=int, default=10, help="số module chậm nhất in ra")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.module or ["minirag"]:
+        runs = [measure(module) for _ in range(args.runs)]
+        totals = [run[module][1] / 1000 for run in runs]
+        median = statistics.median(totals)
+        ok = median <= args.budget_ms
+        failed |= not ok
+        print(
+            f"{'✅' if ok else '❌'} import {module}: median {median:.0f}ms "
+            f"(min {min(totals):.0f}ms, max {max(totals):.0f}ms, budget {args.budget_ms:.0f}ms)"
+        )
+
+        last = runs[-1]
+        heavy = sorted({name.split(".")[0] for name in last} & set(HEAVY_MODULES))
+        if heavy:
+            failed = True
+            print(f"   ❌ dependency nặng bị import lúc khởi động: {', '.join(heavy)}")
+
+        print(f"   {args.top} module tự tốn thời gian nhiều nhất (self):")
+        for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda x: -x[1][0])[: args.top]:
+            print(f"     {self_us / 1000:7.1f}ms self {cumulative_us / 1000:8.1f}ms cumulative  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
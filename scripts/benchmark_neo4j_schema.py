@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+So sánh độ trễ mỗi lookup của Neo4JStorage giữa hai layout:
+  - label : tên entity làm label (mặc định)
+  - entity: một label :Entity + entity_id có unique index
+
+Script tạo node/edge giả (property bench=true), đo has_node / get_node /
+node_degree / get_edge rồi xoá dữ liệu giả. Cần một Neo4J đang chạy (NEO4J_*).
+
+    python scripts/benchmark_neo4j_schema.py --sizes 10000 100000 --lookups 500
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import configparser
+import random
+import statistics
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Load config
+config = configparser.ConfigParser()
+config.read(os.path.join(ROOT_DIR, "config", "insurance_config.ini"))
+
+# Set environment variables
+for key in config['DEFAULT']:
+    os.environ.setdefault(key.upper(), str(config['DEFAULT'][key]))
+
+# Add MiniRAG path
+sys.path.append(os.path.join(ROOT_DIR, "MiniRAG"))
+
+from minirag.kg.neo4j_impl import Neo4JStorage
+
+BENCH_PREFIX = "BENCH_ENTITY_"
+
+
+def entity_name(i):
+    return f'"{BENCH_PREFIX}{i}"'
+
+
+async def seed(storage, size):
+    nodes = {
+        entity_name(i): {
+            "entity_type": '"BENCH"',
+            "description": f"benchmark entity {i}",
+            "source_id": "bench",
+            "bench": True,
+        }
+        for i in range(size)
+    }
+    await storage.upsert_nodes_bulk(nodes)
+    # mỗi node nối tới node kế tiếp và một node ngẫu nhiên
+    rng = random.Random(size)
+    edges = []
+    for i in range(size):
+        for j in {(i + 1) % size, rng.randrange(size)} - {i}:
+            edges.append((entity_name(i), entity_name(j), {
+                "weight": 1.0,
+                "description": "bench",
+                "keywords": "bench",
+                "source_id": "bench",
+                "bench": True,
+            }))
+    await storage.upsert_edges_bulk(edges)
+    return edges
+
+
+async def cleanup(storage):
+    async with storage._driver.session(database=storage._DATABASE) as session:
+        while True:
+            result = await session.run("""
+                MATCH (n) WHERE n.bench = true
+                WITH n LIMIT 10000
+                DETACH DELETE n
+                RETURN count(*) AS deleted
+            """)
+            record = await result.single()
+            if not record or record["deleted"] == 0:
+                break
+
+
+async def measure(func, args_list):
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        await func(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "mean": statistics.fmean(latencies),
+    }
+
+
+async def run_mode(mode, size, lookups):
+    os.environ["NEO4J_SCHEMA_MODE"] = mode
+    storage = Neo4JStorage(namespace="chunk_entity_relation", global_config={}, embedding_func=None)
+    try:
+        await cleanup(storage)
+        start = time.perf_counter()
+        edges = await seed(storage, size)
+        print(f"   🌱 seed {size} node / {len(edges)} edge: {time.perf_counter() - start:.1f}s")
+
+        rng = random.Random(lookups)
+        node_args = [(entity_name(rng.randrange(size)),) for _ in range(lookups)]
+        edge_args = [edge[:2] for edge in rng.sample(edges, min(lookups, len(edges)))]
+
+        results = {}
+        for name, func, args_list in (
+            ("has_node", storage.has_node, node_args),
+            ("get_node", storage.get_node, node_args),
+            ("node_degree", storage.node_degree, node_args),
+            ("get_edge", storage.get_edge, edge_args),
+        ):
+            # warm up plan cache
+            await func(*args_list[0])
+            results[name] = await measure(func, args_list)
+        return results
+    finally:
+        await cleanup(storage)
+        await storage.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark layout graph Neo4J")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        print(f"\n📊 {size} entity")
+        report = {}
+        for mode in ("label", "entity"):
+            print(f"🔧 mode={mode}")
+            report[mode] = await run_mode(mode, size, args.lookups)
+
+        print(f"{'lookup':<12} {'label p50':>10} {'label p95':>10} {'entity p50':>11} {'entity p95':>11}")
+        for name in report["label"]:
+            label, entity = report["label"][name], report["entity"][name]
+            print(
+                f"{name:<12} {label['p50']:>8.2f}ms {label['p95']:>8.2f}ms "
+                f"{entity['p50']:>9.2f}ms {entity['p95']:>9.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Đo throughput ghi vector vào PostgreSQL (pgvector): từng dòng một
+(cách cũ, mỗi dòng một round trip) so với PGVectorStorage.upsert
+(executemany + codec nhị phân của pgvector).
+
+Cần một PostgreSQL có extension vector, ví dụ:
+    docker run -d -p 5432:5432 -e POSTGRES_PASSWORD=postgres pgvector/pgvector:pg16
+
+    POSTGRES_PASSWORD=postgres python scripts/benchmark_pg_upsert.py --rows 5000
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MiniRAG"))
+
+from minirag.kg.postgres_impl import PostgreSQLDB, PGVectorStorage, SQL_TEMPLATES, TABLES
+from minirag.utils import EmbeddingFunc
+
+WORKSPACE = "benchmark_pg_upsert"
+
+
+def make_embedding_func(dim):
+    rng = np.random.default_rng(0)
+
+    async def embed(texts):
+        return rng.random((len(texts), dim), dtype=np.float32)
+
+    return EmbeddingFunc(embedding_dim=dim, max_token_size=8192, func=embed)
+
+
+async def cleanup(db):
+    await db.execute(
+        "DELETE FROM LIGHTRAG_VDB_ENTITY WHERE workspace=$1", {"workspace": WORKSPACE}
+    )
+
+
+async def row_by_row(db, data, embedding_func):
+    """Cách cũ: mỗi entity một lần execute, vector gửi dạng text"""
+    vectors = await embedding_func([v["content"] for v in data.values()])
+    for (k, v), vector in zip(data.items(), vectors):
+        await db.execute(
+            SQL_TEMPLATES["upsert_entity"],
+            {
+                "workspace": WORKSPACE,
+                "id": k,
+                "entity_name": v["entity_name"],
+                "content": v["content"],
+                "content_vector": "[" + ",".join(map(str, vector)) + "]",
+            },
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark ghi vector vào PostgreSQL")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--batch", type=int, default=32, help="embedding_batch_num")
+    args = parser.parse_args()
+
+    db = PostgreSQLDB({
+        "host": os.environ.get("POSTGRES_HOST", "localhost"),
+        "port": int(os.environ.get("POSTGRES_PORT", 5432)),
+        "user": os.environ.get("POSTGRES_USER", "postgres"),
+        "password": os.environ.get("POSTGRES_PASSWORD"),
+        "database": os.environ.get("POSTGRES_DATABASE", "postgres"),
+        "workspace": WORKSPACE,
+    })
+    await db.initdb()
+    await db.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    try:
+        await db.query("SELECT 1 FROM LIGHTRAG_VDB_ENTITY LIMIT 1")
+    except Exception:
+        await db.execute(TABLES["LIGHTRAG_VDB_ENTITY"]["ddl"])
+    # pool được mở trước khi có extension thì tạo lại để đăng ký codec
+    await db.pool.expire_connections()
+
+    embedding_func = make_embedding_func(args.dim)
+    data = {
+        f"ent-bench-{i}": {"entity_name": f'"BENCH {i}"', "content": f"BENCH {i} description"}
+        for i in range(args.rows)
+    }
+    storage = PGVectorStorage(
+        namespace="entities",
+        global_config={"embedding_batch_num": args.batch},
+        embedding_func=embedding_func,
+        db=db,
+    )
+
+    try:
+        await cleanup(db)
+        start = time.perf_counter()
+        await row_by_row(db, data, embedding_func)
+        elapsed = time.perf_counter() - start
+        print(f"🐢 từng dòng  : {args.rows / elapsed:,.0f} dòng/s ({elapsed:.2f}s)")
+
+        await cleanup(db)
+        start = time.perf_counter()
+        await storage.upsert(data)
+        elapsed = time.perf_counter() - start
+        print(
+            f"⚡ executemany: {args.rows / elapsed:,.0f} dòng/s ({elapsed:.2f}s, "
+            f"codec nhị phân={'có' if db.vector_codec else 'không'})"
+        )
+
+        start = time.perf_counter()
+        for i in range(100):
+            await storage.query(f"BENCH {i}", top_k=10)
+        print(f"🔎 query      : {(time.perf_counter() - start) * 10:.2f}ms/lần")
+    finally:
+        await cleanup(db)
+        await db.pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Đo overhead của global_config mỗi query: asdict(self) (trước) so với
+snapshot MiniRAG.global_config (sau).
+
+aquery trước đây gọi asdict(self) mỗi request, deep-copy toàn bộ field
+(llm_model_kwargs chứa cả system prompt, addon_params, node2vec_params...).
+Script dựng một MiniRAG thật trong thư mục tạm với prompt dài cỡ
+INSURANCE_BOT_PROMPT rồi đo từng cách lấy config.
+
+    python scripts/benchmark_query_config.py
+    python scripts/benchmark_query_config.py --prompt-chars 20000 --iterations 20000
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import timeit
+from dataclasses import asdict
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MiniRAG"))
+
+from minirag import MiniRAG
+from minirag.utils import EmbeddingFunc
+
+
+async def fake_llm(prompt, **kwargs):
+    return ""
+
+
+async def fake_embedding(texts):
+    return np.zeros((len(texts), 8))
+
+
+def per_call_us(func, iterations):
+    """median của 5 lần đo, microgiây mỗi lần gọi"""
+    runs = timeit.repeat(func, number=iterations, repeat=5)
+    return sorted(runs)[2] / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark global_config per query")
+    parser.add_argument("--prompt-chars", type=int, default=6000, help="độ dài system prompt trong llm_model_kwargs")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as working_dir:
+        rag = MiniRAG(
+            working_dir=working_dir,
+            llm_model_func=fake_llm,
+            llm_model_kwargs={"system_prompt": "Bảo hiểm " * (args.prompt_chars // 9)},
+            embedding_func=EmbeddingFunc(embedding_dim=8, max_token_size=1000, func=fake_embedding),
+            addon_params={"example_number": 3, "language": "Vietnamese"},
+        )
+
+        before = per_call_us(lambda: asdict(rag), args.iterations)
+        after = per_call_us(lambda: rag.global_config, args.iterations)
+
+        def changed_then_read():
+            rag.chunk_token_size = rag.chunk_token_size  # gán lại field -> dựng lại snapshot
+            return rag.global_config
+
+        rebuild = per_call_us(changed_then_read, max(1, args.iterations // 10))
+
+    print(f"📊 global_config mỗi query ({len(asdict(rag))} field, prompt {args.prompt_chars} ký tự)")
+    print(f"   asdict(self) mỗi query : {before:9.2f} µs")
+    print(f"   snapshot (không đổi)   : {after:9.2f} µs  ({before / after:,.0f}x nhanh hơn)")
+    print(f"   snapshot sau khi đổi   : {rebuild:9.2f} µs  (dựng lại một lần)")
+
+
+if __name__ == "__main__":
+    main()
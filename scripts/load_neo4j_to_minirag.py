@@ -19,21 +19,39 @@ for key in config['DEFAULT']:
 # Add MiniRAG path
 sys.path.append('/Volumes/data/MINIRAG/MiniRAG')
 
+import time
+
 from neo4j import AsyncGraphDatabase
 from minirag import MiniRAG
 from minirag.llm import gpt_4o_mini_complete
 from minirag.utils import EmbeddingFunc
-from openai import OpenAI
+from openai import AsyncOpenAI
 
-async def async_embedding_func(texts):
-    """Async OpenAI embedding function"""
-    try:
-        client = OpenAI(
+# Số record Neo4J lấy về mỗi lần (cursor sẽ tự lấy trang tiếp theo khi cần)
+NEO4J_PAGE_SIZE = int(os.environ.get('NEO4J_PAGE_SIZE', 100))
+# Số document gom lại cho mỗi lần rag.ainsert
+INSERT_BATCH_SIZE = int(os.environ.get('MINIRAG_INSERT_BATCH_SIZE', 16))
+# Giới hạn queue giữa các stage để bộ nhớ không tăng theo số document
+PIPELINE_QUEUE_SIZE = int(os.environ.get('MINIRAG_PIPELINE_QUEUE_SIZE', 64))
+
+_embedding_client = None
+
+
+def get_embedding_client():
+    """AsyncOpenAI client dùng chung cho mọi lần gọi embedding"""
+    global _embedding_client
+    if _embedding_client is None:
+        _embedding_client = AsyncOpenAI(
             api_key=config.get('DEFAULT', 'OPENAI_API_KEY'),
             base_url=config.get('DEFAULT', 'OPENAI_BASE_URL')
         )
+    return _embedding_client
 
-        response = client.embeddings.create(
+
+async def async_embedding_func(texts):
+    """Async OpenAI embedding function"""
+    try:
+        response = await get_embedding_client().embeddings.create(
             input=texts,
             model=config.get('DEFAULT', 'EMBEDDING_MODEL', fallback='text-embedding-3-small')
         )
@@ -43,8 +61,108 @@ async def async_embedding_func(texts):
         # Return dummy embeddings if OpenAI fails
         return [[0.1] * 1536 for _ in texts]
 
+
+def create_rag(working_dir):
+    """Khởi tạo MiniRAG với async embedding function"""
+    return MiniRAG(
+        working_dir=working_dir,
+        llm_model_func=gpt_4o_mini_complete,
+        llm_model_max_token_size=int(config.get('DEFAULT', 'OPENAI_LLM_MAX_TOKENS', fallback='1000')),
+        llm_model_name=config.get('DEFAULT', 'OPENAI_LLM_MODEL', fallback='gpt-4o-mini'),
+        embedding_func=EmbeddingFunc(
+            embedding_dim=1536,  # OpenAI text-embedding-3-small dimension
+            max_token_size=1000,
+            func=async_embedding_func,
+        ),
+    )
+
+
+def clean_document(doc):
+    """Bỏ YAML frontmatter và thêm title/filename vào đầu nội dung"""
+    content = doc['content']
+
+    # Clean YAML frontmatter nếu có
+    if content.startswith('---'):
+        lines = content.split('\n')
+        try:
+            end_yaml = lines[1:].index('---') + 1
+            content = '\n'.join(lines[end_yaml:]).strip()
+        except ValueError:
+            print(f"   ⚠️  Could not find YAML end marker: {doc['title'][:50]}")
+
+    # Add title và filename metadata
+    return f"Tiêu đề: {doc['title']}\nFile: {doc['filename']}\n\n{content}"
+
+
+async def stream_documents(neo4j_driver, raw_queue):
+    """Stage 1: đọc documents từ Neo4J theo từng trang bằng async cursor"""
+    count = 0
+    async with neo4j_driver.session(fetch_size=NEO4J_PAGE_SIZE) as session:
+        result = await session.run("""
+            MATCH (d)
+            WHERE (d:LegalDocument OR d:InsuranceRulesDocument OR d:InsuranceDocument)
+            AND d.full_content IS NOT NULL
+            RETURN d.title as title, d.full_content as content, d.filename as filename
+            ORDER BY d.title
+        """)
+        async for record in result:
+            # put() chờ khi queue đầy, cursor cũng ngừng kéo trang mới
+            await raw_queue.put({
+                'title': record['title'] or 'Unknown',
+                'content': record['content'] or '',
+                'filename': record['filename'] or 'unknown.md'
+            })
+            count += 1
+    print(f"📄 Streamed {count} documents from Neo4J")
+    return count
+
+
+async def clean_documents(raw_queue, text_queue):
+    """Stage 2: làm sạch nội dung trước khi insert"""
+    while True:
+        doc = await raw_queue.get()
+        if doc is None:
+            await text_queue.put(None)
+            return
+        await text_queue.put((doc['title'], clean_document(doc)))
+
+
+async def insert_documents(rag, text_queue, stats):
+    """Stage 3: gom batch và insert; chunking + embedding chạy song song bên trong ainsert"""
+    finished = False
+    while not finished:
+        batch = []
+        item = await text_queue.get()
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= INSERT_BATCH_SIZE or text_queue.empty():
+                break
+            item = await text_queue.get()
+        finished = item is None
+        if not batch:
+            continue
+
+        titles = [title for title, _ in batch]
+        try:
+            await rag.ainsert([text for _, text in batch])
+            stats['inserted'] += len(batch)
+        except Exception as e:
+            stats['failed'] += len(batch)
+            print(f"❌ Error inserting batch starting at {titles[0][:40]}: {e}")
+            import traceback
+            traceback.print_exc()
+            # Continue with next batch instead of breaking
+            continue
+
+        elapsed = time.perf_counter() - stats['started']
+        print(
+            f"✅ Inserted {stats['inserted']} docs "
+            f"({stats['inserted'] / elapsed:.2f} docs/sec), last: {titles[-1][:40]}..."
+        )
+
+
 async def load_documents_from_neo4j():
-    """Load tất cả documents từ Neo4J vào MiniRAG"""
+    """Load tất cả documents từ Neo4J vào MiniRAG theo kiểu streaming"""
     print("🚀 Loading documents from Neo4J to MiniRAG...")
 
     # Khởi tạo Neo4J driver
@@ -62,97 +180,43 @@ async def load_documents_from_neo4j():
 
     print(f"📁 Working directory: {working_dir}")
 
-    rag = MiniRAG(
-        working_dir=working_dir,
-        llm_model_func=gpt_4o_mini_complete,
-        llm_model_max_token_size=int(config.get('DEFAULT', 'OPENAI_LLM_MAX_TOKENS', fallback='1000')),
-        llm_model_name=config.get('DEFAULT', 'OPENAI_LLM_MODEL', fallback='gpt-4o-mini'),
-        embedding_func=EmbeddingFunc(
-            embedding_dim=1536,  # OpenAI text-embedding-3-small dimension
-            max_token_size=1000,
-            func=async_embedding_func,
-        ),
-    )
+    rag = create_rag(working_dir)
 
-    try:
-        # Query tất cả documents từ Neo4J
-        async with neo4j_driver.session() as session:
-            result = await session.run("""
-                MATCH (d)
-                WHERE (d:LegalDocument OR d:InsuranceRulesDocument OR d:InsuranceDocument)
-                AND d.full_content IS NOT NULL
-                RETURN d.title as title, d.full_content as content, d.filename as filename
-                ORDER BY d.title
-            """)
-
-            documents = []
-            async for record in result:
-                documents.append({
-                    'title': record['title'] or 'Unknown',
-                    'content': record['content'] or '',
-                    'filename': record['filename'] or 'unknown.md'
-                })
-
-            print(f"📄 Found {len(documents)} documents in Neo4J")
-
-            # Insert từng document vào MiniRAG
-            for i, doc in enumerate(documents):
-                print(f"📥 [{i+1}/{len(documents)}] Inserting: {doc['title'][:50]}...")
-                print(f"   Content length: {len(doc['content'])} chars")
-
-                # Tạo text content để insert
-                content = doc['content']
-
-                # Clean YAML frontmatter nếu có
-                if content.startswith('---'):
-                    lines = content.split('\n')
-                    try:
-                        end_yaml = lines[1:].index('---') + 1
-                        content = '\n'.join(lines[end_yaml:]).strip()
-                        print(f"   🧹 Cleaned YAML frontmatter, reduced to {len(content)} chars")
-                    except:
-                        print("   ⚠️  Could not find YAML end marker")
-                        pass
-
-                # Add title và filename metadata
-                full_text = f"Tiêu đề: {doc['title']}\nFile: {doc['filename']}\n\n{content}"
-                print(f"   Final text length: {len(full_text)} chars")
-                print(f"   Sample text: {full_text[:200]}...")
-
-                try:
-                    # Insert vào MiniRAG (async)
-                    await rag.ainsert(full_text)
-                    print(f"✅ Successfully inserted: {doc['title'][:40]}...")
-                except Exception as e:
-                    print(f"❌ Error inserting {doc['title']}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    # Continue with next document instead of breaking
-                    continue
-
-            print(f"🎉 Successfully loaded {len(documents)} documents into MiniRAG!")
-            print(f"📁 MiniRAG working directory: {working_dir}")
+    raw_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    text_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stats = {'inserted': 0, 'failed': 0, 'started': time.perf_counter()}
 
+    cleaner = asyncio.create_task(clean_documents(raw_queue, text_queue))
+    inserter = asyncio.create_task(insert_documents(rag, text_queue, stats))
+    try:
+        try:
+            await stream_documents(neo4j_driver, raw_queue)
+        finally:
+            # Báo cho các stage sau là đã hết dữ liệu
+            await raw_queue.put(None)
+        await asyncio.gather(cleaner, inserter)
+    except BaseException:
+        cleaner.cancel()
+        inserter.cancel()
+        raise
     finally:
         await neo4j_driver.close()
 
+    elapsed = time.perf_counter() - stats['started']
+    print(
+        f"🎉 Loaded {stats['inserted']} documents into MiniRAG "
+        f"({stats['failed']} failed) in {elapsed:.1f}s "
+        f"- {stats['inserted'] / max(elapsed, 1e-9):.2f} docs/sec"
+    )
+    print(f"📁 MiniRAG working directory: {working_dir}")
+
 async def test_minirag_query():
     """Test query MiniRAG sau khi load data"""
     print("\\n🧪 Testing MiniRAG query...")
 
     working_dir = config.get('DEFAULT', 'WORKING_DIR', fallback='./insurance_rag')
 
-    rag = MiniRAG(
-        working_dir=working_dir,
-        llm_model_func=gpt_4o_mini_complete,
-        llm_model_max_token_size=int(config.get('DEFAULT', 'OPENAI_LLM_MAX_TOKENS', fallback='1000')),
-        llm_model_name=config.get('DEFAULT', 'OPENAI_LLM_MODEL', fallback='gpt-4o-mini'),
-        embedding_func=EmbeddingFunc(
-            embedding_dim=1536,
-            max_token_size=1000,
-            func=async_embedding_func,
-        ),
-    )
+    rag = create_rag(working_dir)
 
     # Test query
     test_question = "Bảo hiểm xe máy là gì?"
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Chuyển graph MiniRAG trong Neo4J từ layout "label" (tên entity làm label)
+sang layout "entity" (một label :Entity + property entity_id có unique index).
+
+Sau khi migrate xong, chạy MiniRAG với NEO4J_SCHEMA_MODE=entity.
+
+    python scripts/migrate_neo4j_entity_schema.py --dry-run
+    python scripts/migrate_neo4j_entity_schema.py --batch-size 500
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import configparser
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Load config
+config = configparser.ConfigParser()
+config.read(os.path.join(ROOT_DIR, "config", "insurance_config.ini"))
+
+# Set environment variables
+for key in config['DEFAULT']:
+    os.environ.setdefault(key.upper(), str(config['DEFAULT'][key]))
+
+# Add MiniRAG path
+sys.path.append(os.path.join(ROOT_DIR, "MiniRAG"))
+
+from neo4j import AsyncGraphDatabase
+
+# Node của MiniRAG (layout cũ) luôn có entity_type và source_id, node khác trong
+# database (document, v.v.) không bị động tới
+PENDING_NODES_QUERY = """
+    MATCH (n)
+    WHERE n.entity_type IS NOT NULL AND n.source_id IS NOT NULL
+      AND NOT n:Entity AND size(labels(n)) = 1
+    RETURN elementId(n) AS id, labels(n)[0] AS label
+    LIMIT $limit
+"""
+
+
+def build_batch_query(batch):
+    """Label không truyền được bằng parameter nên mỗi node có một subquery riêng"""
+    parts = []
+    for idx, (_, label) in enumerate(batch):
+        escaped = label.replace("`", "``")
+        parts.append(
+            f"CALL {{ MATCH (n) WHERE elementId(n) = $ids[{idx}] "
+            f"SET n:Entity, n.entity_id = $names[{idx}] REMOVE n:`{escaped}` }}"
+        )
+    return "\n".join(parts) + "\nRETURN count(*) AS migrated"
+
+
+async def find_duplicate_labels(session):
+    """Các label xuất hiện ở nhiều node sẽ vi phạm unique constraint"""
+    result = await session.run("""
+        MATCH (n)
+        WHERE n.entity_type IS NOT NULL AND n.source_id IS NOT NULL
+          AND NOT n:Entity AND size(labels(n)) = 1
+        WITH labels(n)[0] AS label, count(*) AS total
+        WHERE total > 1
+        RETURN label, total
+    """)
+    return [(record["label"], record["total"]) async for record in result]
+
+
+async def count_pending(session):
+    result = await session.run("""
+        MATCH (n)
+        WHERE n.entity_type IS NOT NULL AND n.source_id IS NOT NULL
+          AND NOT n:Entity AND size(labels(n)) = 1
+        RETURN count(n) AS total
+    """)
+    record = await result.single()
+    return record["total"]
+
+
+async def ensure_schema(session):
+    await session.run(
+        "CREATE CONSTRAINT entity_id_unique IF NOT EXISTS "
+        "FOR (n:Entity) REQUIRE n.entity_id IS UNIQUE"
+    )
+    await session.run(
+        "CREATE INDEX entity_type_index IF NOT EXISTS "
+        "FOR (n:Entity) ON (n.entity_type)"
+    )
+
+
+async def migrate(batch_size, dry_run):
+    driver = AsyncGraphDatabase.driver(
+        os.environ["NEO4J_URI"],
+        auth=(os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"])
+    )
+    database = os.environ.get("NEO4J_DATABASE")
+
+    try:
+        async with driver.session(database=database) as session:
+            total = await count_pending(session)
+            print(f"📊 Có {total} node cần chuyển sang :Entity")
+
+            duplicates = await find_duplicate_labels(session)
+            if duplicates:
+                print("❌ Các label sau có nhiều node, cần gộp trước khi migrate:")
+                for label, count in duplicates[:20]:
+                    print(f"   - {label}: {count} node")
+                return False
+
+            if dry_run or total == 0:
+                print("ℹ️ Không thay đổi dữ liệu")
+                return True
+
+            # Tạo constraint trước để MERGE của MiniRAG không tạo trùng trong lúc chạy
+            await ensure_schema(session)
+
+            migrated = 0
+            start = time.perf_counter()
+            while True:
+                result = await session.run(PENDING_NODES_QUERY, limit=batch_size)
+                batch = [(record["id"], record["label"]) async for record in result]
+                if not batch:
+                    break
+
+                async def _do_migrate(tx):
+                    result = await tx.run(
+                        build_batch_query(batch),
+                        ids=[node_id for node_id, _ in batch],
+                        names=[label for _, label in batch],
+                    )
+                    await result.consume()
+
+                await session.execute_write(_do_migrate)
+                migrated += len(batch)
+                elapsed = time.perf_counter() - start
+                print(f"✅ {migrated}/{total} node ({migrated / elapsed:.0f} node/s)")
+
+            print(f"🎉 Migrate xong {migrated} node trong {time.perf_counter() - start:.1f}s")
+            print("👉 Đặt NEO4J_SCHEMA_MODE=entity trước khi khởi động MiniRAG")
+            return True
+    finally:
+        await driver.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Chuyển graph MiniRAG trong Neo4J sang layout :Entity"
+    )
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="Số node migrate trong mỗi transaction")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Chỉ kiểm tra, không thay đổi dữ liệu")
+    args = parser.parse_args()
+
+    ok = asyncio.run(migrate(args.batch_size, args.dry_run))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
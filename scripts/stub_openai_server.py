@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Server giả lập API OpenAI (chat + embedding) chạy local, dùng cho benchmark offline.
+
+Độ trễ và tốc độ sinh token cấu hình được, kết quả tất định (embedding sinh
+từ md5 của text, câu trả lời cố định) nên đo nhiều lần cho cùng kết quả,
+không phụ thuộc mạng hay tải của OpenAI.
+
+- POST /v1/chat/completions: chờ --chat-latency (TTFT) rồi sinh
+  --completion-tokens token với tốc độ --tokens-per-sec, hỗ trợ stream=True (SSE)
+  và stream_options.include_usage. Prompt trích keyword của MiniRAG nhận JSON keyword,
+  prompt trích entity nhận entity/relationship tất định (đủ để build index offline).
+- POST /v1/embeddings: chờ --embedding-latency (+ --embedding-latency-per-text mỗi text),
+  trả vector --dim chiều đã chuẩn hóa.
+- GET /v1/stats: số request đã nhận theo loại và cấu hình hiện tại.
+
+    python scripts/stub_openai_server.py --port 9100 --chat-latency 0.3 --tokens-per-sec 80
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_BASE=http://127.0.0.1:9100/v1 OPENAI_API_KEY=stub ...
+"""
+
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from collections import Counter
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ANSWER_TEXT = (
+    "Dạ, theo quy tắc bảo hiểm hiện hành, quyền lợi bảo hiểm được chi trả theo "
+    "điều khoản hợp đồng. Phí bảo hiểm phụ thuộc vào số tiền bảo hiểm, thời hạn "
+    "và đối tượng được bảo hiểm. Khi xảy ra sự kiện bảo hiểm, anh/chị cần nộp hồ "
+    "sơ yêu cầu bồi thường trong thời hạn quy định để được giải quyết nhanh nhất. "
+)
+
+
+@dataclass
+class StubConfig:
+    chat_latency: float = 0.3  # giây tới token đầu tiên
+    tokens_per_sec: float = 80.0
+    completion_tokens: int = 120
+    embedding_latency: float = 0.05
+    embedding_latency_per_text: float = 0.0
+    dim: int = 1536
+    jitter: float = 0.0  # ±tỉ lệ ngẫu nhiên của mọi độ trễ (0 = tất định)
+    seed: int = 0
+
+
+def stub_embedding(text: str, dim: int) -> list:
+    """Vector tất định, chuẩn hóa, cùng text -> cùng vector"""
+    seed = int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _count_tokens(text: str) -> int:
+    # ước lượng ~4 ký tự / token, đủ cho số liệu usage
+    return max(1, len(text) // 4)
+
+
+def _extract_entities(text: str, limit: int = 8) -> str:
+    """Output đúng format entity_extraction của MiniRAG: các cụm 2 từ xuất hiện
+    nhiều nhất trong chunk là entity, cụm liền kề nhau có relationship"""
+    words = [w.lower() for w in re.findall(r"\w+", text) if not w.isdigit()]
+    phrases = [" ".join(pair) for pair in zip(words, words[1:])]
+    top = [p for p, _ in Counter(phrases).most_common(limit)]
+    types = ["organization", "person", "location", "event"]
+    records = [
+        f'("entity"<|>"{p}"<|>"{types[i % len(types)]}"<|>"{p} được nhắc tới trong điều khoản bảo hiểm")'
+        for i, p in enumerate(top)
+    ]
+    records += [
+        f'("relationship"<|>"{a}"<|>"{b}"<|>"{a} liên quan tới {b}"<|>"{a}, {b}"<|>5)'
+        for a, b in zip(top, top[1:])
+    ]
+    return "##".join(records) + "<|COMPLETE|>"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubOpenAIServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            self._json(200, {"requests": self.server.stats(), "config": asdict(self.server.config)})
+        else:
+            self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._json(400, {"error": {"message": "invalid JSON body"}})
+            return
+        path = self.path.rstrip("/")
+        if path.endswith("/chat/completions"):
+            self.server.count("chat")
+            self._chat(payload)
+        elif path.endswith("/embeddings"):
+            self.server.count("embeddings")
+            self._embeddings(payload)
+        else:
+            self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    # ---------------- embeddings ----------------
+
+    def _embeddings(self, payload: dict):
+        texts = payload.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        cfg = self.server.config
+        time.sleep(self.server.delay(cfg.embedding_latency + cfg.embedding_latency_per_text * len(texts)))
+        tokens = sum(_count_tokens(t) for t in texts)
+        self._json(200, {
+            "object": "list",
+            "model": payload.get("model", "stub-embedding"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": stub_embedding(t, cfg.dim)}
+                for i, t in enumerate(texts)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    # ---------------- chat ----------------
+
+    def _answer(self, payload: dict) -> str:
+        messages = payload.get("messages", [])
+        last = str(messages[-1].get("content", "")) if messages else ""
+        if "-Real Data-" in last and "Text:" in last:
+            # prompt entity_extraction lúc insert (cũng nhắc tới high_level_keywords, kiểm tra trước)
+            return _extract_entities(last.split("Text:")[-1].split("######")[0])
+        if "high_level_keywords" in last or payload.get("response_format"):
+            # prompt keywords_extraction của MiniRAG (mode light)
+            query = last.split("Query:")[-1].split("#")[0]
+            words = [w for w in re.findall(r"\w+", query) if len(w) > 2]
+            return json.dumps({
+                "high_level_keywords": words[:3] or ["bảo hiểm"],
+                "low_level_keywords": words[3:8] or ["phí bảo hiểm"],
+            }, ensure_ascii=False)
+        if last.startswith("MANY entities were missed"):
+            return "<|COMPLETE|>"
+        if "Answer YES | NO" in last:
+            return "NO"
+        if "Description List:" in last:
+            # summarize_entity_descriptions: giữ nguyên danh sách mô tả
+            return last.split("Description List:")[-1].split("#######")[0].strip()
+        words = (ANSWER_TEXT * (self.server.config.completion_tokens // 60 + 1)).split()
+        return " ".join(words[: self.server.config.completion_tokens])
+
+    def _chat(self, payload: dict):
+        cfg = self.server.config
+        content = self._answer(payload)
+        tokens = content.split(" ")
+        prompt_tokens = sum(_count_tokens(str(m.get("content", ""))) for m in payload.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        model = payload.get("model", "stub-chat")
+        created = int(time.time())
+        token_interval = 1.0 / cfg.tokens_per_sec if cfg.tokens_per_sec > 0 else 0.0
+
+        time.sleep(self.server.delay(cfg.chat_latency))
+        if not payload.get("stream"):
+            time.sleep(self.server.delay(token_interval * len(tokens)))
+            self._json(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        # chunked + keep-alive như API thật, connection được client dùng lại
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def send(choices, extra=None):
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+                **(extra or {}),
+            }
+            write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        try:
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(self.server.delay(token_interval))
+                text = token if i == 0 else " " + token
+                send([{"index": 0, "delta": {"content": text}, "finish_reason": None}])
+            send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                send([], {"usage": usage})
+            write(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # client ngắt giữa chừng
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    """Server chạy trong thread nền: start() / stop(), base_url cho OPENAI_BASE_URL"""
+
+    daemon_threads = True
+    request_queue_size = 128  # mặc định 5, benchmark mở nhiều connection cùng lúc
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: StubConfig = None):
+        super().__init__((host, port), _Handler)
+        self.config = config or StubConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.requests = {"chat": 0, "embeddings": 0}
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def delay(self, seconds: float) -> float:
+        if not self.config.jitter or seconds <= 0:
+            return max(0.0, seconds)
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.config.jitter, self.config.jitter)
+        return max(0.0, seconds * factor)
+
+    def count(self, kind: str):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.requests)
+
+    def start(self) -> "StubOpenAIServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _serve(config: StubConfig, ready):
+    server = StubOpenAIServer(config=config)
+    ready.put(server.base_url)
+    server.serve_forever()
+
+
+def start_stub_process(config: StubConfig, timeout: float = 10.0):
+    """Chạy stub ở process riêng -> (process, base_url).
+
+    Benchmark nên dùng cách này thay vì start(): stub trong cùng process tranh
+    GIL với code đang đo và làm sai lệch độ trễ.
+    """
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(config, ready), name="stub-openai", daemon=True)
+    process.start()
+    return process, ready.get(timeout=timeout)
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """Tham số cấu hình stub, dùng chung với scripts/benchmark_e2e_latency.py"""
+    defaults = StubConfig()
+    parser.add_argument("--chat-latency", type=float, default=defaults.chat_latency, help="giây tới token đầu tiên")
+    parser.add_argument("--tokens-per-sec", type=float, default=defaults.tokens_per_sec)
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens)
+    parser.add_argument("--embedding-latency", type=float, default=defaults.embedding_latency, help="giây mỗi request embedding")
+    parser.add_argument("--embedding-latency-per-text", type=float, default=defaults.embedding_latency_per_text)
+    parser.add_argument("--dim", type=int, default=defaults.dim, help="số chiều embedding")
+    parser.add_argument("--jitter", type=float, default=defaults.jitter, help="±tỉ lệ dao động độ trễ, 0 = tất định")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def stub_config_from_args(args) -> StubConfig:
+    return StubConfig(**{k: getattr(args, k) for k in asdict(StubConfig())})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible chat + embedding server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubOpenAIServer(args.host, args.port, stub_config_from_args(args))
+    print(f"🧪 Stub OpenAI server: {server.base_url} ({asdict(server.config)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test SharedCache với Redis (fakeredis TCP server + client redis.asyncio thật)
+
+API chạy asyncio.run() mỗi request: kết nối tạo ở loop trước không dùng được
+ở loop sau, shared cache phải vẫn hit qua nhiều loop.
+
+Chạy: python -m pytest tests/test_shared_cache.py
+"""
+
+import os
+import sys
+import asyncio
+import threading
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "core"))
+
+from shared_cache import SharedCache, RedisCacheBackend
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def redis_url():
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    yield f"redis://{host}:{port}/0"
+    server.shutdown()
+    server.server_close()
+
+
+def test_response_hits_across_event_loops(redis_url):
+    cache = SharedCache(RedisCacheBackend(redis_url))
+
+    asyncio.run(cache.set_response("phí bảo hiểm xe máy", "66.000đ", 60))
+    cached = asyncio.run(cache.get_response("phí bảo hiểm xe máy"))
+
+    assert cached is not None
+    assert cached[0] == "66.000đ"
+    assert cache.stats() == {"response_hits": 1}
+
+
+def test_embeddings_and_lock_across_event_loops(redis_url):
+    cache = SharedCache(RedisCacheBackend(redis_url))
+
+    asyncio.run(cache.set_embeddings("m", {"a": [0.5, 1.0]}, 60))
+    found = asyncio.run(cache.get_embeddings("m", ["a", "b"]))
+    assert found["a"][0] == [0.5, 1.0]
+    assert "b" not in found
+
+    # lock SET NX của loop trước vẫn thấy ở loop sau (release chạy Lua script,
+    # fakeredis TCP server không chạy được nên không test ở đây)
+    assert asyncio.run(cache.acquire("q")) is not None
+    assert asyncio.run(cache.acquire("q")) is None
+    assert "errors" not in cache.stats()
+
+
+def test_close_loop_drops_client_of_that_loop(redis_url):
+    backend = RedisCacheBackend(redis_url)
+    cache = SharedCache(backend)
+
+    async def request():
+        await cache.set_response("q", "a", 60)
+        assert len(backend._clients) == 1
+        await cache.close_loop()
+        assert backend._clients == {}
+        # dùng lại sau close_loop thì tạo client mới
+        return await cache.get_response("q")
+
+    assert asyncio.run(request())[0] == "a"
+    # client tạo sau close_loop ở loop đã đóng được bỏ ở lần lấy client kế tiếp
+    asyncio.run(cache.get_response("q"))
+    assert len(backend._clients) == 1
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test single-flight của chat_stream với LLM giả (không gọi OpenAI)
+
+Hai request cùng câu hỏi dùng chung một stream: leader ngắt giữa chừng thì
+follower vẫn nhận đủ câu trả lời và LLM chỉ được gọi một lần.
+
+Chạy: python -m pytest tests/test_stream_coalescing.py
+"""
+
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "core"))
+# chỉ L1 trong process, không cần Redis
+os.environ["SHARED_CACHE_BACKEND"] = "none"
+
+import insurance_bot_minirag
+from insurance_bot_minirag import InsuranceBotMiniRAG
+
+ANSWER_CHUNKS = ["Phí bảo hiểm ", "xe máy ", "là ", "66.000đ ", "mỗi năm."]
+CONTEXT = "Bảo hiểm bắt buộc trách nhiệm dân sự xe máy: phí 66.000đ/năm. " * 3
+
+
+class FakeLLMClient:
+    """Thay AsyncOpenAI: trả từng chunk chậm để request khác kịp join"""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        return self.stream()
+
+    async def stream(self):
+        for content in ANSWER_CHUNKS:
+            await asyncio.sleep(0.05)
+            delta = SimpleNamespace(content=content)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "insurance_rag").mkdir()
+    monkeypatch.setenv("WORKING_DIR", "./insurance_rag")
+    llm = FakeLLMClient()
+    monkeypatch.setattr(insurance_bot_minirag, "get_openai_client", lambda: llm)
+    bot = InsuranceBotMiniRAG(pre_warm=False)
+
+    async def context_only(question, param=None):
+        return CONTEXT
+
+    monkeypatch.setattr(bot.rag, "aquery", context_only)
+    bot.llm = llm
+    return bot
+
+
+def test_follower_gets_full_answer_when_leader_cancelled(bot):
+    question = "Phí bảo hiểm xe máy bao nhiêu?"
+
+    async def run():
+        first_chunk = asyncio.Event()
+
+        async def leader():
+            async for _ in bot.chat_stream(question):
+                first_chunk.set()
+                await asyncio.sleep(3600)
+
+        async def follower():
+            return "".join([c async for c in bot.chat_stream(question)])
+
+        leader_task = asyncio.create_task(leader())
+        await first_chunk.wait()
+        follower_task = asyncio.create_task(follower())
+        await asyncio.sleep(0)
+        leader_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader_task
+        return await follower_task
+
+    answer = asyncio.run(run())
+
+    assert answer == "".join(ANSWER_CHUNKS)
+    assert bot.llm.calls == 1
+    assert bot.coalesced_requests == 1
+    # stream chạy trọn trên loop nền nên câu trả lời vẫn được cache
+    cached = asyncio.run(bot._get_cached_response(question.lower().strip()))
+    assert cached == "".join(ANSWER_CHUNKS)